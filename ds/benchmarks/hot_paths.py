@@ -0,0 +1,353 @@
+# Micro-benchmarks for the pipeline hot paths on synthetic inputs of several sizes.
+# Records wall time and peak (python) memory for each function and size, saves
+# the results as json and compares them with a baseline run
+#
+# Usage:
+#   python benchmarks/hot_paths.py --label my_change [--quick] [--only make_lq]
+#   python benchmarks/hot_paths.py --compare benchmarks/results/baseline.json
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+WORDS = np.array(
+    [
+        "virus",
+        "network",
+        "learning",
+        "protein",
+        "vaccine",
+        "model",
+        "data",
+        "cell",
+        "neural",
+        "the",
+        "of",
+        "and",
+        "analysis",
+        "infection",
+        "deep",
+        "patients",
+        "transmission",
+        "graph",
+        "sequence",
+        "treatment",
+    ]
+)
+
+
+def make_texts(n_docs: int, rng, n_words: int = 100) -> list:
+    """Random abstracts with punctuation and digits"""
+
+    tokens = rng.choice(WORDS, size=(n_docs, n_words))
+    return [" ".join(doc) + ", 2020." for doc in tokens]
+
+
+def make_vectors(n_docs: int, rng, dims: int = 50) -> pd.DataFrame:
+    """Random document vectors indexed by document id"""
+
+    return pd.DataFrame(
+        rng.normal(size=(n_docs, dims)),
+        index=[f"doc_{n}" for n in range(n_docs)],
+    )
+
+
+# Each setup function creates the inputs for a size and returns the call to time
+
+
+def setup_pre_process(size, rng):
+    from eurito_indicators.pipeline.text_processing import pre_process
+
+    texts = make_texts(size, rng)
+    pre_process(texts[0])  # loads NLTK data outside of the timed call
+
+    return lambda: [pre_process(text) for text in texts]
+
+
+def setup_build_cluster_graph(size, rng):
+    from sklearn.cluster import KMeans
+
+    from eurito_indicators.pipeline.clustering_naming import build_cluster_graph
+
+    vectors = make_vectors(size, rng, dims=10)
+    algorithms = [[KMeans, ["n_clusters", [5, 10]]]]
+
+    return lambda: build_cluster_graph(vectors, algorithms, n_runs=2)
+
+
+def setup_make_distance_to_clusters(size, rng):
+    from scipy.spatial.distance import cosine
+
+    from eurito_indicators.pipeline.clustering_naming import make_distance_to_clusters
+
+    vectors = make_vectors(size, rng)
+    cluster_ids = {
+        cl: list(ids)
+        for cl, ids in vectors.index.to_series().groupby(rng.integers(0, 20, size))
+    }
+
+    return lambda: make_distance_to_clusters(vectors, cosine, cluster_ids)
+
+
+def setup_count_terms(size, rng):
+    from eurito_indicators.pipeline.find_ai_papers import count_terms
+
+    arx_df = pd.DataFrame(
+        {"tokenised": [text.split(" ") for text in make_texts(size, rng, 50)]},
+        index=[f"doc_{n}" for n in range(size)],
+    )
+    paper_ids = arx_df.index[: size // 2]
+    terms = list(WORDS[:10])
+
+    return lambda: count_terms(arx_df, paper_ids, terms)
+
+
+def setup_make_lq(size, rng):
+    from eurito_indicators.pipeline.processing_utils import make_lq
+
+    table = pd.DataFrame(rng.integers(0, 100, size=(size, max(size // 10, 10))))
+
+    return lambda: make_lq(table)
+
+
+def setup_reverse_geocode_table(size, rng):
+    import geopandas as gp
+    from shapely.geometry import box
+
+    import eurito_indicators.indicators.make_articles_final as articles
+
+    # A 20 x 20 grid of square regions over Europe saved as a NUTS shapefile
+    tmp_dir = tempfile.TemporaryDirectory()
+    shape_path = tmp_dir.name
+    os.makedirs(f"{shape_path}/2016")
+    cells = [(lng, lat) for lng in range(-10, 30, 2) for lat in range(35, 75, 2)]
+    gp.GeoDataFrame(
+        {
+            "NUTS_ID": [f"R{n}" for n in range(len(cells))],
+            "LEVL_CODE": 2,
+            "geometry": [box(lng, lat, lng + 2, lat + 2) for lng, lat in cells],
+        },
+        crs=4326,
+    ).to_file(f"{shape_path}/2016/NUTS_RG_10M_2016_4326.geojson", driver="GeoJSON")
+    articles.NUTS_SHAPE_PATH = shape_path
+
+    table = pd.DataFrame(
+        {
+            "article_id": [str(n) for n in range(size)],
+            "year": rng.integers(2016, 2021, size),
+            "lat": rng.uniform(35, 75, size),
+            "lng": rng.uniform(-10, 30, size),
+            "article_source": rng.choice(["arxiv", "cord"], size),
+            "cluster": rng.choice(["a", "b"], size),
+            "artificial_intelligence": rng.random(size) > 0.9,
+            "deep_learning": rng.random(size) > 0.95,
+            "ai_covid": rng.random(size) > 0.99,
+        }
+    )
+
+    def call():
+        return articles.reverse_geocode_table(table, "2016")
+
+    # The shapes are removed when the call is discarded
+    call.tmp_dir = tmp_dir
+
+    return call
+
+
+def setup_make_network_from_doc_term_matrix(size, rng):
+    from eurito_indicators.pipeline.networks import make_network_from_doc_term_matrix
+
+    mat = pd.DataFrame(
+        rng.dirichlet(np.ones(100) * 0.1, size=size),
+        columns=[f"topic_{n}" for n in range(100)],
+    )
+    mat.insert(0, "doc_id", range(size))
+
+    return lambda: make_network_from_doc_term_matrix(mat, 0.05, "doc_id")
+
+
+# Function: (setup, sizes, quick sizes)
+BENCHMARKS = {
+    "pre_process": (setup_pre_process, [100, 1000, 10000], [100]),
+    "build_cluster_graph": (setup_build_cluster_graph, [100, 300, 1000], [100]),
+    "make_distance_to_clusters": (
+        setup_make_distance_to_clusters,
+        [1000, 10000, 50000],
+        [1000],
+    ),
+    "count_terms": (setup_count_terms, [1000, 10000, 100000], [1000]),
+    "make_lq": (setup_make_lq, [100, 1000, 5000], [100]),
+    "reverse_geocode_table": (
+        setup_reverse_geocode_table,
+        [1000, 10000, 100000],
+        [1000],
+    ),
+    "make_network_from_doc_term_matrix": (
+        setup_make_network_from_doc_term_matrix,
+        [1000, 10000, 100000],
+        [1000],
+    ),
+}
+
+
+def measure(call, repeat: int = 3) -> dict:
+    """Times a call and measures its peak memory
+
+    Args:
+        call: function without arguments
+        repeat: number of timed runs
+
+    Returns:
+        best and median wall time (seconds) and peak memory allocated
+        by python during the call (MB)
+    """
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+
+    # Memory is traced in a separate run as tracing slows the call down
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "time_best": min(times),
+        "time_median": statistics.median(times),
+        "peak_mb": peak / 1e6,
+    }
+
+
+def run_benchmarks(
+    only: list = None, quick: bool = False, repeat: int = 3, seed: int = 123
+) -> dict:
+    """Runs the benchmarks
+
+    Args:
+        only: benchmarks to run (all if None)
+        quick: whether to run only the smallest size
+        repeat: number of timed runs for each size
+        seed: random seed for the synthetic inputs
+
+    Returns:
+        A lookup between benchmarks and results (or errors) by size, or skip
+        reasons for benchmarks with missing dependencies
+    """
+
+    results = {}
+
+    for name, (setup, sizes, quick_sizes) in BENCHMARKS.items():
+        if only is not None and name not in only:
+            continue
+
+        results[name] = {}
+        for size in quick_sizes if quick else sizes:
+            rng = np.random.default_rng(seed)
+            try:
+                results[name][str(size)] = measure(setup(size, rng), repeat)
+            except (ImportError, LookupError) as e:
+                # Missing optional dependencies or NLTK data
+                print(f"skip {name}: {e.__class__.__name__}: {e}".splitlines()[0])
+                results[name] = {"skipped": str(e).splitlines()[0]}
+                break
+            except Exception as e:
+                # Other failures are recorded for the size and the suite goes on
+                error = f"{e.__class__.__name__}: {e}".splitlines()[0]
+                print(f"{name:35} {size:>7} failed: {error}")
+                results[name][str(size)] = {"error": error}
+                continue
+
+            res = results[name][str(size)]
+            print(
+                f"{name:35} {size:>7} {res['time_best']:9.4f}s "
+                f"{res['peak_mb']:9.1f}MB"
+            )
+
+    return results
+
+
+def environment() -> dict:
+    """Describes the machine and library versions of a run"""
+
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 1.2) -> list:
+    """Compares results with a baseline run
+
+    Args:
+        results: results of this run
+        baseline: results of the baseline run
+        tolerance: ratio of the baseline time above which we flag a regression
+
+    Returns:
+        The benchmarks and sizes that are slower than the tolerance
+    """
+
+    regressions = []
+
+    for name, sizes in results.items():
+        for size, res in sizes.items():
+            base = baseline.get(name, {}).get(size)
+            if not all(isinstance(r, dict) and "time_best" in r for r in [res, base]):
+                continue
+
+            ratio = res["time_best"] / base["time_best"]
+            flag = "SLOWER" if ratio > tolerance else ""
+            print(
+                f"{name:35} {size:>7} {base['time_best']:9.4f}s -> "
+                f"{res['time_best']:9.4f}s ({ratio:5.2f}x) {flag}"
+            )
+            if ratio > tolerance:
+                regressions.append((name, size))
+
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Pipeline hot path benchmarks")
+    parser.add_argument("--label", default=None, help="name of the results file")
+    parser.add_argument("--only", nargs="*", default=None, help="benchmarks to run")
+    parser.add_argument("--quick", action="store_true", help="smallest sizes only")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--compare", default=None, help="baseline results file")
+    parser.add_argument("--tolerance", type=float, default=1.2)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only, args.quick, args.repeat)
+
+    label = args.label or datetime.now().strftime("%Y%m%d_%H%M%S")
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    with open(f"{RESULTS_PATH}/{label}.json", "w") as outfile:
+        json.dump({"environment": environment(), "results": results}, outfile, indent=2)
+    print(f"Saved results in {RESULTS_PATH}/{label}.json")
+
+    if args.compare is not None:
+        with open(args.compare, "r") as infile:
+            baseline = json.load(infile)["results"]
+
+        sys.exit(1 if compare(results, baseline, args.tolerance) else 0)
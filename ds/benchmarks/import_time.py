@@ -0,0 +1,81 @@
+# Checks that importing the package's core modules stays fast. Each import is
+# timed in a fresh interpreter and the script fails if any module is over budget
+#
+# Usage: python benchmarks/import_time.py [--repeat 5] [--scale 1]
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+# Budgets in seconds (the median import time over several fresh interpreters)
+IMPORT_BUDGETS = {
+    "eurito_indicators": 0.5,
+    "eurito_indicators.getters.arxiv_getters": 1.0,
+    "eurito_indicators.pipeline.processing_utils": 1.0,
+    "eurito_indicators.pipeline.text_processing": 1.0,
+    # Modules that import tomotopy, statsmodels, altair, geopandas or
+    # sentence_transformers only in the functions that use them
+    "eurito_indicators.pipeline.topic_utils": 1.0,
+    "eurito_indicators.pipeline.geo_utils": 1.0,
+    "eurito_indicators.pipeline.altair_network": 1.0,
+    "eurito_indicators.pipeline.networks": 1.0,
+    "eurito_indicators.pipeline.embed_specter": 1.0,
+    "eurito_indicators.indicators.make_ai_indicators": 1.0,
+}
+
+TIMER = (
+    "import time; start = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def time_import(module: str, repeat: int = 5) -> float:
+    """Median time to import a module in a fresh interpreter"""
+
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", TIMER.format(module=module)],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+
+    return statistics.median(times)
+
+
+def main(repeat: int = 5, scale: float = 1) -> bool:
+    """Times the imports and reports which ones are over budget
+
+    Args:
+        repeat: number of fresh interpreters per module
+        scale: factor to apply to the budgets (e.g. for slow CI machines)
+
+    Returns:
+        Whether all the imports are within budget
+    """
+
+    within_budget = True
+
+    for module, budget in IMPORT_BUDGETS.items():
+        elapsed = time_import(module, repeat)
+        ok = elapsed <= budget * scale
+        within_budget &= ok
+        print(
+            f"{'ok' if ok else 'SLOW':4} {module}: {elapsed:.3f}s "
+            f"(budget {budget * scale:.2f}s)"
+        )
+
+    return within_budget
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1)
+    args = parser.parse_args()
+
+    sys.exit(0 if main(args.repeat, args.scale) else 1)
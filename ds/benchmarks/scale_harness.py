@@ -0,0 +1,358 @@
+# Runs the getters -> indicators chain on synthetic projects of several scales
+# (see synthetic_data.py) and records the wall time and peak RSS of each stage.
+# Each stage runs in a fresh interpreter so that its peak memory is its own.
+#
+# Usage:
+#   python benchmarks/scale_harness.py --scales 0.1 1 10 --label scaling
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime
+
+from hot_paths import RESULTS_PATH, environment
+from synthetic_data import DS_PATH, write_synthetic_project
+
+# ru_maxrss is in kilobytes in linux and in bytes in macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+# Each stage runs a step of the chain and returns the number of rows it outputs.
+# Stages read their inputs from disk, building the intermediate tables they need
+# the first time (as the pipeline does)
+
+
+def stage_arxiv_articles():
+    from eurito_indicators.getters.arxiv_getters import get_arxiv_articles
+
+    return len(get_arxiv_articles(text=False))
+
+
+def stage_covid_papers():
+    from eurito_indicators.getters.arxiv_getters import get_covid_papers
+
+    return len(get_covid_papers())
+
+
+def stage_arxiv_institutes():
+    from eurito_indicators.getters.arxiv_getters import query_arxiv_institute
+
+    return len(query_arxiv_institute())
+
+
+def stage_article_categories():
+    from eurito_indicators.getters.arxiv_getters import get_article_categories
+
+    return len(get_article_categories())
+
+
+def stage_article_indicators():
+    import runpy
+
+    import geopandas  # noqa: F401 (fail early if the geo dependencies are missing)
+
+    runpy.run_module(
+        "eurito_indicators.indicators.make_articles_final", run_name="__main__"
+    )
+    from eurito_indicators import PROJECT_DIR
+
+    return len(os.listdir(f"{PROJECT_DIR}/outputs/data/processed/articles"))
+
+
+def stage_cordis_projects():
+    from eurito_indicators.getters.cordis_getters import get_cordis_projects
+
+    return len(get_cordis_projects())
+
+
+def stage_cordis_organisations():
+    from eurito_indicators.getters.cordis_getters import get_cordis_organisations
+
+    return len(get_cordis_organisations())
+
+
+def stage_org_signatures():
+    from eurito_indicators.getters.cordis_getters import (
+        get_cordis_organisations,
+        get_cordis_projects,
+        get_specter,
+    )
+    from eurito_indicators.pipeline.org_signatures import make_org_signatures
+
+    return len(
+        make_org_signatures(
+            get_cordis_organisations(),
+            get_specter(),
+            projects=get_cordis_projects(),
+            start_date="2018/01/01",
+            end_date="2020/01/01",
+        )
+    )
+
+
+def cordis_distances() -> tuple:
+    """Projects, covid clusters and the distances between the projects and the
+    cluster centroids, as in the CORDIS relatedness analysis
+    """
+    from scipy.spatial.distance import cityblock
+
+    from eurito_indicators.getters.cordis_getters import (
+        get_cordis_clusters,
+        get_cordis_projects,
+        get_specter,
+    )
+    from eurito_indicators.pipeline.clustering_naming import (
+        make_distance_to_clusters,
+    )
+
+    cluster_assignments, _ = get_cordis_clusters()
+    dist_to_clusters = make_distance_to_clusters(
+        get_specter(), cityblock, cluster_assignments
+    )
+
+    return get_cordis_projects(), cluster_assignments, dist_to_clusters
+
+
+def stage_cordis_distances():
+    return len(cordis_distances()[2])
+
+
+# The specialisation and preparedness stages include the distances stage
+
+
+def stage_cordis_specialisation():
+    from eurito_indicators.pipeline.clustering_naming import (
+        make_proximity_index,
+        specialisation_robust,
+    )
+
+    projs, cluster_assignments, dist_to_clusters = cordis_distances()
+
+    return len(
+        specialisation_robust(
+            dist_to_clusters,
+            [1.5, 2.5],
+            cluster_assignments=cluster_assignments,
+            projects=projs,
+            proximity_index=make_proximity_index(dist_to_clusters, cluster_assignments),
+        )
+    )
+
+
+def stage_cordis_preparedness():
+    from eurito_indicators.pipeline.clustering_naming import (
+        make_pre_post_table,
+        make_proximity_index,
+    )
+
+    projs, cluster_assignments, dist_to_clusters = cordis_distances()
+
+    return len(
+        make_pre_post_table(
+            projs,
+            cluster_assignments,
+            dist_to_clusters,
+            sd=2,
+            proximity_index=make_proximity_index(dist_to_clusters, cluster_assignments),
+        )
+    )
+
+
+STAGES = {
+    "arxiv_articles": stage_arxiv_articles,
+    "covid_papers": stage_covid_papers,
+    "arxiv_institutes": stage_arxiv_institutes,
+    "article_categories": stage_article_categories,
+    "article_indicators": stage_article_indicators,
+    "cordis_projects": stage_cordis_projects,
+    "cordis_organisations": stage_cordis_organisations,
+    "org_signatures": stage_org_signatures,
+    "cordis_distances": stage_cordis_distances,
+    "cordis_specialisation": stage_cordis_specialisation,
+    "cordis_preparedness": stage_cordis_preparedness,
+}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process so far (MB)"""
+
+    # In linux ru_maxrss is inherited from the parent process (the harness), while
+    # the high water mark in /proc only counts this process
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status", "r") as infile:
+            for line in infile:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024 / 1e6
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT / 1e6
+
+
+def run_stage(name: str) -> dict:
+    """Runs a stage in this process
+
+    Returns:
+        The wall and CPU time of the stage, the peak RSS of the process before
+        and after it (MB) and the rows it outputs, or the error it raised
+    """
+
+    # The package is imported outside of the timed stage
+    import eurito_indicators  # noqa: F401
+
+    rss_before = peak_rss_mb()
+    start, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        rows = STAGES[name]()
+    except Exception as e:
+        traceback.print_exc()
+        return {"error": f"{e.__class__.__name__}: {e}".splitlines()[0]}
+
+    return {
+        "seconds": time.perf_counter() - start,
+        "cpu_seconds": time.process_time() - start_cpu,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_before_mb": rss_before,
+        "rows": rows,
+    }
+
+
+def run_stage_subprocess(name: str, project_dir: str, timeout: int = None) -> dict:
+    """Runs a stage in a fresh interpreter pointing the package to a project"""
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        result_path = f"{tmp_dir}/result.json"
+        report_path = f"{tmp_dir}/report.json"
+        proc = subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--run-stage",
+                name,
+                "--output",
+                result_path,
+            ],
+            cwd=DS_PATH,
+            env={
+                **os.environ,
+                "EURITO_PROJECT_DIR": project_dir,
+                # Breakdown of the stage by the functions it instruments
+                "EURITO_INSTRUMENT": "1",
+                "EURITO_INSTRUMENT_REPORT": report_path,
+                "PYTHONPATH": os.pathsep.join(
+                    [DS_PATH, os.environ.get("PYTHONPATH", "")]
+                ),
+            },
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+        if proc.returncode != 0:
+            return {"error": proc.stderr.strip().splitlines()[-1]}
+
+        with open(result_path, "r") as infile:
+            result = json.load(infile)
+        if os.path.exists(report_path):
+            with open(report_path, "r") as infile:
+                result["substages"] = json.load(infile)["stages"]
+
+        return result
+
+
+def run_scales(
+    scales: list,
+    stages: list = None,
+    work_dir: str = None,
+    seed: int = 123,
+    dims: int = None,
+    timeout: int = None,
+) -> dict:
+    """Generates a synthetic project for each scale and runs the stages on it
+
+    Args:
+        scales: data scales (see synthetic_data.BASE_SIZES)
+        stages: stages to run (all if None)
+        work_dir: directory for the synthetic projects (a temporary one if None)
+        seed: random seed for the synthetic data
+        dims: dimensions of the synthetic embeddings (SPECTER's if None)
+        timeout: seconds after which a stage is stopped
+
+    Returns:
+        A lookup between scales and the table sizes and stage results
+    """
+
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for scale in scales:
+            project_dir = f"{work_dir or tmp_dir}/scale_{scale}"
+            # Start from scratch so that stages build their intermediate tables
+            shutil.rmtree(project_dir, ignore_errors=True)
+            print(f"Generating synthetic data at scale {scale} in {project_dir}")
+
+            start = time.perf_counter()
+            sizes = write_synthetic_project(
+                project_dir, scale, seed, **({"dims": dims} if dims else {})
+            )
+            results[str(scale)] = {
+                "generate_seconds": time.perf_counter() - start,
+                "sizes": sizes,
+                "stages": {},
+                # Stages without measurements at this scale
+                "failed": {},
+            }
+
+            for name in stages or STAGES.keys():
+                res = run_stage_subprocess(name, project_dir, timeout)
+                if "error" in res:
+                    results[str(scale)]["failed"][name] = res["error"]
+                    print(f"{scale:>6} {name:25} failed: {res['error']}")
+                    continue
+
+                results[str(scale)]["stages"][name] = res
+                print(
+                    f"{scale:>6} {name:25} {res['seconds']:9.2f}s "
+                    f"{res['peak_rss_mb']:9.1f}MB {res['rows']:>10} rows"
+                )
+
+    return results
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Pipeline scaling harness")
+    parser.add_argument("--scales", nargs="*", type=float, default=[0.1, 1])
+    parser.add_argument("--only", nargs="*", default=None, help="stages to run")
+    parser.add_argument("--label", default=None, help="name of the results file")
+    parser.add_argument("--work-dir", default=None, help="keep synthetic data here")
+    parser.add_argument("--seed", type=int, default=123)
+    parser.add_argument("--dims", type=int, default=None)
+    parser.add_argument("--timeout", type=int, default=None)
+    parser.add_argument("--run-stage", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--output", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage is not None:
+        # Inside the subprocess for a stage
+        with open(args.output, "w") as outfile:
+            json.dump(run_stage(args.run_stage), outfile)
+        sys.exit(0)
+
+    results = run_scales(
+        args.scales, args.only, args.work_dir, args.seed, args.dims, args.timeout
+    )
+
+    failed = sorted({n for res in results.values() for n in res["failed"]})
+    if len(failed) > 0:
+        print(f"No scaling data for the stages that failed: {', '.join(failed)}")
+
+    label = args.label or datetime.now().strftime("scaling_%Y%m%d_%H%M%S")
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    with open(f"{RESULTS_PATH}/{label}.json", "w") as outfile:
+        json.dump({"environment": environment(), "scales": results}, outfile, indent=2)
+    print(f"Saved results in {RESULTS_PATH}/{label}.json")
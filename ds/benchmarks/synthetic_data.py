@@ -0,0 +1,518 @@
+# Generates a synthetic project tree (inputs/ and the outputs the indicators read)
+# with the schema of the arXiv, GRID, CORD and CORDIS inputs at a configurable
+# scale, so that we can run the pipeline on more data than we have.
+# Point the package to it with EURITO_PROJECT_DIR.
+#
+# Usage:
+#   python benchmarks/synthetic_data.py /tmp/eurito_x10 --scale 10
+
+import argparse
+import json
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from hot_paths import WORDS
+
+DS_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Sizes at scale 1 (roughly a tenth of our current arXiv / CORDIS volumes)
+BASE_SIZES = {
+    "articles": 200000,
+    "grid_institutes": 10000,
+    "cordis_projects": 3500,
+}
+# Every other table is sized relative to the tables above
+INSTITUTES_PER_ARTICLE = 1.2
+CATEGORIES_PER_ARTICLE = 1.8
+ORGS_PER_PROJECT = 8
+SPECTER_DIMS = 768
+
+ARTICLE_SOURCES = ["arxiv", "cord", "medrxiv", "biorxiv"]
+SOURCE_SHARES = [0.8, 0.15, 0.03, 0.02]
+CATEGORIES = [
+    "cs.LG",
+    "cs.AI",
+    "cs.NE",
+    "cs.CV",
+    "cs.CL",
+    "stat.ML",
+    "q-bio.PE",
+    "physics.soc-ph",
+]
+GRID_TYPES = [
+    "Education",
+    "Company",
+    "Healthcare",
+    "Government",
+    "Nonprofit",
+    "Facility",
+]
+CLUSTERS = ["epidemiology", "clinical_trials", "genomics", "mental_health", "policy"]
+
+COVID_WORDS = np.array(["covid-19", "coronavirus", "sars-cov-2"])
+NAMES = np.array(["Smith", "Garcia", "Müller", "Rossi", "Nowak", "Dubois", "Silva"])
+
+# Countries of the synthetic NUTS regions (a 5 x 5 grid of 8 degree squares)
+COUNTRIES = (
+    "PT ES FR BE NL IE UK LU DE DK IT AT CZ PL SE EL SI HU SK FI CY HR RO LT EE"
+).split()
+LNG_MIN, LAT_MIN, CELL = -10, 35, 8
+NUTS_VERSIONS = ["2010", "2013", "2016", "2021"]
+
+
+def make_sizes(scale: float) -> dict:
+    """Number of records of each main table at a scale"""
+
+    return {k: max(int(v * scale), 10) for k, v in BASE_SIZES.items()}
+
+
+def make_texts(n: int, rng, n_words: int, covid_share: float = 0) -> np.ndarray:
+    """Random texts, a share of them mentioning covid"""
+
+    tokens = rng.choice(WORDS, size=(n, n_words))
+    has_covid = rng.random(n) < covid_share
+    tokens[has_covid, 0] = rng.choice(COVID_WORDS, size=has_covid.sum())
+
+    return np.array([" ".join(doc) for doc in tokens])
+
+
+def make_dates(n: int, rng, start: str, end: str) -> pd.Series:
+    """Random dates between two dates"""
+
+    start, end = pd.Timestamp(start).value, pd.Timestamp(end).value
+
+    return pd.Series(pd.to_datetime(rng.integers(start, end, n))).dt.normalize()
+
+
+def make_locations(n: int, rng) -> pd.DataFrame:
+    """Random coordinates in the synthetic NUTS grid with their regions"""
+
+    col = rng.integers(0, 5, n)
+    row = rng.integers(0, 5, n)
+    lng = LNG_MIN + col * CELL + rng.uniform(0.1, CELL - 0.1, n)
+    lat = LAT_MIN + row * CELL + rng.uniform(0.1, CELL - 0.1, n)
+    country = np.array(COUNTRIES)[row * 5 + col]
+
+    # Regions at each level are the quarters of the regions in the level above
+    nuts1 = ((lng - LNG_MIN) % CELL // 4 * 2 + (lat - LAT_MIN) % CELL // 4 + 1).astype(
+        int
+    )
+    nuts2 = ((lng - LNG_MIN) % 4 // 2 * 2 + (lat - LAT_MIN) % 4 // 2 + 1).astype(int)
+    nuts3 = ((lng - LNG_MIN) % 2 // 1 * 2 + (lat - LAT_MIN) % 2 // 1 + 1).astype(int)
+
+    codes = pd.DataFrame({"country_code": country})
+    codes["nuts_level1_code"] = codes["country_code"] + nuts1.astype(str)
+    codes["nuts_level2_code"] = codes["nuts_level1_code"] + nuts2.astype(str)
+    codes["nuts_level3_code"] = codes["nuts_level2_code"] + nuts3.astype(str)
+
+    return codes.assign(lat=lat, lng=lng)
+
+
+def make_nuts_shapes() -> dict:
+    """NUTS-like geojson with the regions in `make_locations` (levels 0 to 3)"""
+
+    features = []
+
+    def add_regions(nuts_id, lng, lat, size, level):
+        features.append(
+            {
+                "type": "Feature",
+                "properties": {"NUTS_ID": nuts_id, "LEVL_CODE": level},
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": [
+                        [
+                            [lng, lat],
+                            [lng + size, lat],
+                            [lng + size, lat + size],
+                            [lng, lat + size],
+                            [lng, lat],
+                        ]
+                    ],
+                },
+            }
+        )
+        if level < 3:
+            for n, (dx, dy) in enumerate([(0, 0), (0, 1), (1, 0), (1, 1)]):
+                half = size / 2
+                add_regions(
+                    f"{nuts_id}{n + 1}",
+                    lng + dx * half,
+                    lat + dy * half,
+                    half,
+                    level + 1,
+                )
+
+    for n, country in enumerate(COUNTRIES):
+        add_regions(
+            country, LNG_MIN + (n % 5) * CELL, LAT_MIN + (n // 5) * CELL, CELL, 0
+        )
+
+    return {"type": "FeatureCollection", "features": features}
+
+
+def make_arxiv_articles(n: int, rng) -> pd.DataFrame:
+    """Articles with the schema of arxiv_articles_v2"""
+
+    source = rng.choice(ARTICLE_SOURCES, size=n, p=SOURCE_SHARES)
+    ids = np.where(
+        source == "arxiv",
+        [f"{1000 + k % 9000}.{k:05d}" for k in range(n)],
+        [f"{s}-{k:08x}" for s, k in zip(source, range(n))],
+    )
+    has_journal = rng.random(n) < 0.3
+
+    return pd.DataFrame(
+        {
+            "id": ids,
+            "created": make_dates(n, rng, "2000-01-01", "2021-12-31"),
+            "title": make_texts(n, rng, 8, covid_share=0.05),
+            "journal_ref": np.where(
+                source == "arxiv",
+                np.where(
+                    has_journal, rng.choice(["Phys. Rev.", "JMLR", "Nature"], n), None
+                ),
+                source,
+            ),
+            "doi": np.where(
+                has_journal, [f"10.{k % 9999}/{k}" for k in range(n)], None
+            ),
+            "authors": [
+                ", ".join(rng.choice(NAMES, size=k)) for k in rng.integers(1, 6, n)
+            ],
+            "abstract": make_texts(n, rng, 150, covid_share=0.1),
+            "mag_id": np.where(
+                rng.random(n) < 0.7, rng.integers(10**9, 4 * 10**9, n), np.nan
+            ),
+            "citation_count": np.where(rng.random(n) < 0.7, rng.poisson(5, n), np.nan),
+            "article_source": source,
+        }
+    )
+
+
+def make_grid_tables(n: int, rng) -> dict:
+    """GRID institutes, addresses, types and geonames tables"""
+
+    grid_ids = [f"grid.{k}.{k % 97}" for k in range(n)]
+    locations = make_locations(n, rng)
+    # About ten institutes per city
+    city_ids = rng.integers(0, max(n // 10, 1), n)
+
+    geonames = (
+        pd.DataFrame(
+            {"geonames_city_id": city_ids, "city": [f"city_{c}" for c in city_ids]}
+        )
+        .join(locations.drop(columns=["lat", "lng", "country_code"]))
+        .drop_duplicates("geonames_city_id")
+    )
+    for level in [1, 2, 3]:
+        geonames[f"nuts_level{level}_name"] = geonames[f"nuts_level{level}_code"]
+    # Institutes in the same city share its (first) nuts codes
+    locations = locations.drop(
+        columns=[f"nuts_level{level}_code" for level in [1, 2, 3]]
+    )
+
+    return {
+        "institutes": pd.DataFrame(
+            {
+                "grid_id": grid_ids,
+                "name": [f"Institute {k}" for k in range(n)],
+                "wikipedia_url": None,
+                "email_address": None,
+                "established": rng.integers(1400, 2020, n),
+            }
+        ),
+        "addresses": pd.DataFrame(
+            {
+                "grid_id": grid_ids,
+                "line_1": None,
+                "lat": locations["lat"],
+                "lng": locations["lng"],
+                "postcode": None,
+                "primary": True,
+                "city": [f"city_{c}" for c in city_ids],
+                "country": "Country " + locations["country_code"],
+                "country_code": locations["country_code"],
+                "geonames_city_id": city_ids,
+            }
+        ),
+        "types": pd.DataFrame({"grid_id": grid_ids, "type": rng.choice(GRID_TYPES, n)}),
+        "geonames": geonames,
+    }
+
+
+def make_article_institutes(article_ids, grid_ids, rng) -> pd.DataFrame:
+    """Article - institute lookup with INSTITUTES_PER_ARTICLE on average"""
+
+    n = int(len(article_ids) * INSTITUTES_PER_ARTICLE)
+
+    return pd.DataFrame(
+        {
+            "article_id": rng.choice(article_ids, n),
+            "institute_id": rng.choice(grid_ids, n),
+            "is_multinational": rng.random(n) < 0.05,
+        }
+    ).drop_duplicates(["article_id", "institute_id"])
+
+
+def make_article_categories(article_ids, rng) -> pd.DataFrame:
+    """Article - category lookup with CATEGORIES_PER_ARTICLE on average"""
+
+    n = int(len(article_ids) * CATEGORIES_PER_ARTICLE)
+
+    return pd.DataFrame(
+        {
+            "article_id": rng.choice(article_ids, n),
+            "category_id": rng.choice(CATEGORIES, n),
+        }
+    ).drop_duplicates()
+
+
+def make_cord_metadata(cord_articles: pd.DataFrame, rng) -> pd.DataFrame:
+    """CORD metadata (some papers only have a publication year)"""
+
+    dates = cord_articles["created"].dt.strftime("%Y-%m-%d")
+    only_year = rng.random(len(dates)) < 0.1
+
+    return pd.DataFrame(
+        {
+            "cord_uid": cord_articles["id"].str.replace("cord-", "", regex=False),
+            "title": cord_articles["title"],
+            "publish_time": dates.where(~only_year, dates.str[:4]),
+        }
+    )
+
+
+def make_cordis_projects(n: int, rng) -> pd.DataFrame:
+    """Projects with the schema of the processed cordis_projects table"""
+
+    contribution = rng.lognormal(13, 1, n).round(2)
+    cost = contribution * rng.uniform(1, 1.5, n)
+    objective = make_texts(n, rng, 200, covid_share=0.02)
+
+    return pd.DataFrame(
+        {
+            "project_id": np.arange(100000, 100000 + n),
+            "acronym": [f"PROJ{k}" for k in range(n)],
+            "status": "SIGNED",
+            "title": make_texts(n, rng, 8),
+            "start_date": make_dates(n, rng, "2014-01-01", "2021-06-30"),
+            "total_cost": [f"{x:.2f}".replace(".", ",") for x in cost],
+            "ec_max_contribution": [f"{x:.2f}".replace(".", ",") for x in contribution],
+            "objective": objective,
+            "coordinator_country": rng.choice(COUNTRIES, n),
+            "cost_num": cost.astype(int),
+            "eu_contr": contribution.astype(int),
+            "covid_level": np.where(
+                rng.random(n) < 0.02, "l1_health_emergency", "non_covid"
+            ),
+            "has_covid_term": pd.Series(objective).str.contains("covid|corona|sars"),
+        }
+    )
+
+
+def make_cordis_organisations(project_ids, rng) -> pd.DataFrame:
+    """Project participations with the schema of the geocoded cordis_organisations"""
+
+    n = len(project_ids) * ORGS_PER_PROJECT
+    # Participations are concentrated in a few organisations
+    org_ids = (rng.pareto(1.2, n) * 100).astype(int) % max(len(project_ids), 100)
+    locations = make_locations(max(len(project_ids), 100), rng).iloc[org_ids]
+
+    return pd.DataFrame(
+        {
+            "project_id": rng.choice(project_ids, n),
+            "role": rng.choice(["coordinator", "participant"], n, p=[0.15, 0.85]),
+            "id": 900000000 + org_ids,
+            "name": [f"ORGANISATION {k}" for k in org_ids],
+            "activity_type": rng.choice(["HES", "PRC", "REC", "PUB", "OTH"], n),
+            "ec_contribution": [
+                f"{x:.2f}".replace(".", ",") for x in rng.lognormal(12, 1, n)
+            ],
+            "country": locations["country_code"].to_numpy(),
+            "city": [f"city_{k % 1000}" for k in org_ids],
+            "post_code": [f"{k % 99999:05d}" for k in org_ids],
+            "postcode": [f"{k % 99999:05d}" for k in org_ids],
+            "nuts3": locations["nuts_level3_code"].to_numpy(),
+            "nuts2": locations["nuts_level2_code"].to_numpy(),
+            "nuts1": locations["nuts_level1_code"].to_numpy(),
+        }
+    ).drop_duplicates(["project_id", "id"])
+
+
+def make_specter_embeddings(project_ids, rng, dims: int = SPECTER_DIMS) -> pd.DataFrame:
+    """SPECTER-like project embeddings: clustered dense vectors"""
+
+    centres = rng.normal(size=(20, dims)).astype("float32")
+    vectors = centres[rng.integers(0, 20, len(project_ids))] + rng.normal(
+        scale=0.5, size=(len(project_ids), dims)
+    ).astype("float32")
+
+    return pd.DataFrame(vectors, index=pd.Index(project_ids, name="project_id"))
+
+
+def make_cordis_clusters(project_ids, rng, share: float = 0.05) -> tuple:
+    """Covid research clusters of projects with the structure saved by
+    build_cordis_clusters: a lookup between clusters and their project ids and
+    a lookup between clusters and their names
+    """
+
+    n = max(int(len(project_ids) * share), 2 * len(CLUSTERS))
+    clustered = rng.choice(project_ids, min(n, len(project_ids)), replace=False)
+    assignments = {
+        k: clustered[k :: len(CLUSTERS)].tolist() for k in range(len(CLUSTERS))
+    }
+
+    return assignments, dict(enumerate(CLUSTERS))
+
+
+def make_reference_snapshots(project_dir: str):
+    """Reference data snapshots for the synthetic countries"""
+
+    with open(f"{DS_PATH}/eurito_indicators/config/base.yaml", "r") as infile:
+        sources = yaml.safe_load(infile)["reference_data"]
+    path = f"{project_dir}/inputs/data/reference"
+    os.makedirs(path, exist_ok=True)
+
+    iso = sources["iso_countries"]
+    with open(f"{path}/iso_countries_{iso['version']}.{iso['format']}", "w") as outfile:
+        json.dump(
+            {"3166-1": [{"alpha_2": c, "name": f"Country {c}"} for c in COUNTRIES]},
+            outfile,
+        )
+
+    nuts = sources["nuts_countries"]
+    with open(
+        f"{path}/nuts_countries_{nuts['version']}.{nuts['format']}", "w"
+    ) as outfile:
+        yaml.safe_dump({int(v): COUNTRIES for v in NUTS_VERSIONS}, outfile)
+
+
+def write_synthetic_project(
+    project_dir: str, scale: float = 1, seed: int = 123, dims: int = SPECTER_DIMS
+) -> dict:
+    """Writes a synthetic project tree
+
+    Args:
+        project_dir: directory for the project tree (inputs/ and outputs/)
+        scale: size of the data relative to BASE_SIZES
+        seed: random seed
+        dims: dimensions of the SPECTER-like embeddings
+
+    Returns:
+        A lookup between the synthetic tables and their number of rows
+    """
+
+    rng = np.random.default_rng(seed)
+    sizes = make_sizes(scale)
+    inputs = f"{project_dir}/inputs/data"
+    for path in [
+        f"{inputs}/grid/full_tables",
+        f"{project_dir}/outputs/data/aux",
+        f"{project_dir}/outputs/data/processed/articles",
+        f"{project_dir}/outputs/models",
+    ]:
+        os.makedirs(path, exist_ok=True)
+
+    arts = make_arxiv_articles(sizes["articles"], rng)
+    arts.to_csv(f"{inputs}/arxiv_articles_v2.csv", index=False)
+
+    cord = make_cord_metadata(arts.loc[arts["article_source"] == "cord"], rng)
+    cord.to_csv(
+        f"{inputs}/metadata.csv.zip",
+        index=False,
+        compression={"method": "zip", "archive_name": "metadata.csv"},
+    )
+
+    grid = make_grid_tables(sizes["grid_institutes"], rng)
+    for name, table in grid.items():
+        table.to_csv(f"{inputs}/grid/full_tables/{name}.csv", index=False)
+
+    inst = make_article_institutes(arts["id"], grid["institutes"]["grid_id"], rng)
+    inst.to_csv(f"{inputs}/arxiv_article_institutes_updated.csv", index=False)
+
+    cats = make_article_categories(arts["id"], rng)
+    cats.to_csv(f"{inputs}/arxiv_article_categories.csv", index=False)
+
+    projs = make_cordis_projects(sizes["cordis_projects"], rng)
+    projs.to_csv(f"{inputs}/cordis_projects.csv", index=False)
+
+    orgs = make_cordis_organisations(projs["project_id"], rng)
+    orgs.to_csv(f"{inputs}/cordis_organisations.csv", index=False)
+
+    specter = make_specter_embeddings(projs["project_id"], rng, dims)
+    specter.to_csv(f"{inputs}/specter_embeddings.csv", float_format="%.5f")
+
+    # Outputs of earlier (modelling) steps that the article indicators read
+    covid_ids = arts.loc[
+        arts["abstract"].str.contains("covid|corona|sars"), "id"
+    ].tolist()
+    with open(f"{inputs}/arxiv_cluster_lookup.json", "w") as outfile:
+        json.dump(
+            dict(
+                zip(covid_ids, rng.integers(0, len(CLUSTERS), len(covid_ids)).tolist())
+            ),
+            outfile,
+        )
+    with open(
+        f"{project_dir}/outputs/data/aux/arxiv_cluster_names.json", "w"
+    ) as outfile:
+        json.dump(dict(enumerate(CLUSTERS)), outfile)
+
+    ai_ids = arts.loc[rng.random(len(arts)) < 0.05, "id"].tolist()
+    with open(f"{inputs}/ai_lookups.p", "wb") as outfile:
+        pickle.dump([ai_ids, ai_ids[: len(ai_ids) // 2], covid_ids], outfile)
+
+    # And the ones that the CORDIS indicators read
+    cordis_clusters = make_cordis_clusters(projs["project_id"], rng)
+    with open(f"{project_dir}/outputs/models/cordis_clusters.p", "wb") as outfile:
+        pickle.dump(cordis_clusters, outfile)
+    with open(f"{inputs}/cluster_labels.json", "w") as outfile:
+        json.dump(cordis_clusters[1], outfile)
+
+    shapes = make_nuts_shapes()
+    for version in NUTS_VERSIONS:
+        os.makedirs(f"{inputs}/nuts/{version}", exist_ok=True)
+        with open(
+            f"{inputs}/nuts/{version}/NUTS_RG_10M_{version}_4326.geojson", "w"
+        ) as outfile:
+            json.dump(shapes, outfile)
+
+    make_reference_snapshots(project_dir)
+
+    shutil.copytree(
+        f"{DS_PATH}/outputs/data/schema",
+        f"{project_dir}/outputs/data/schema",
+        dirs_exist_ok=True,
+    )
+
+    return {
+        "arxiv_articles": len(arts),
+        "cord_metadata": len(cord),
+        "grid_institutes": len(grid["institutes"]),
+        "arxiv_article_institutes": len(inst),
+        "arxiv_article_categories": len(cats),
+        "cordis_projects": len(projs),
+        "cordis_organisations": len(orgs),
+        "specter_embeddings": len(specter),
+        "cordis_clustered_projects": sum(map(len, cordis_clusters[0].values())),
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Synthetic pipeline inputs")
+    parser.add_argument("project_dir", help="directory for the synthetic project")
+    parser.add_argument("--scale", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=123)
+    parser.add_argument("--dims", type=int, default=SPECTER_DIMS)
+    args = parser.parse_args()
+
+    sizes = write_synthetic_project(args.project_dir, args.scale, args.seed, args.dims)
+    for name, rows in sizes.items():
+        print(f"{name:30} {rows:>10}")
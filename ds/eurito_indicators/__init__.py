@@ -1,6 +1,7 @@
 """eurito_indicators."""
 import logging
 import logging.config
+import os
 from pathlib import Path
 from typing import Optional
 
@@ -15,8 +16,11 @@ def get_yaml_config(file_path: Path) -> Optional[dict]:
             return yaml.load(f.read(), Loader=yaml.FullLoader)
 
 
-# Define project base directory
-PROJECT_DIR = Path(__file__).resolve().parents[1]
+# Define project base directory (EURITO_PROJECT_DIR points the package to
+# another inputs / outputs tree, e.g. synthetic data for benchmarks)
+PROJECT_DIR = Path(
+    os.environ.get("EURITO_PROJECT_DIR", Path(__file__).resolve().parents[1])
+)
 
 # Define log output locations
 info_out = str(PROJECT_DIR / "info.log")
@@ -20,16 +20,18 @@ from eurito_indicators.getters.cordis_getters import (
 from eurito_indicators.pipeline.clustering_naming import (
     calculate_pairwise_distances,
     filter_pre_post_table,
-    get_closest_documents,
     make_distance_to_clusters,
     make_doc_comm_lookup,
     make_pre_post_table,
+    make_proximity_index,
     plot_participation_distance,
     plot_preparedness_response,
     plot_specialisation_robust,
+    query_proximity_index,
     rank_org_distances,
     specialisation_robust,
 )
+from eurito_indicators.pipeline.org_signatures import make_org_signatures
 from eurito_indicators.pipeline.processing_utils import (
     get_top_countries,
     make_bins,
@@ -215,12 +217,11 @@ def plot_distrs(dist_to_cluster, cluster_labels):
 # proximity analysis
 
 
-def make_document_relatedness(dist_to_clusters, cluster_assignments, cluster_labels):
+def make_document_relatedness(proximity_index, cluster_labels, sd_scale=2):
     """Gets documents which are closest to a Covid research cluster"""
-    close_to_clusters = {
-        cl: get_closest_documents(dist_to_clusters, cl, cluster_assignments, sd_scale=2)
-        for cl in range(len(cluster_labels.keys()))
-    }
+    close_to_clusters = query_proximity_index(
+        proximity_index, [sd_scale], clusters=range(len(cluster_labels.keys()))
+    )[sd_scale]
     cluster_proximity_lookup = make_doc_comm_lookup(close_to_clusters)
     return cluster_proximity_lookup
 
@@ -231,7 +232,12 @@ def make_prep_plot(reg_var="coordinator_country"):
     """
 
     combined_table = make_pre_post_table(
-        projs, cluster_assignments, dist_to_clusters, sd=2, reg_var=reg_var
+        projs,
+        cluster_assignments,
+        dist_to_clusters,
+        sd=2,
+        reg_var=reg_var,
+        proximity_index=proximity_index,
     )
 
     combined_table_focus = filter_pre_post_table(
@@ -269,33 +275,16 @@ def make_org_covid_representations(orgs, cluster_assignments, projs, doc_vectors
 
     covid_ids = get_covid_ids(projs)
 
-    recent_projects = (
-        set(
-            projs.query("start_date>'2018/01/01'").query("start_date < '2020/01/01'")[
-                "project_id"
-            ]
-        )
-        - covid_ids
-    )
-
     # Signature vector for all organisations excluding covid projects
-    vector_org_merged = (
-        doc_vectors.loc[doc_vectors.index.isin(recent_projects)]
-        .reset_index(drop=False)
-        .merge(orgs[["project_id", "id", "name"]], on=["project_id"], how="inner")
-    )
-
-    # %%
-    # %%time
-    org_signatures = (
-        vector_org_merged.drop(axis=1, labels=["project_id"])
-        .melt(id_vars=["id", "name"])
-        .groupby(["id", "name", "variable"])["value"]
-        .mean()
+    org_signatures_wide = make_org_signatures(
+        orgs,
+        doc_vectors,
+        projects=projs,
+        start_date="2018/01/01",
+        end_date="2020/01/01",
+        exclude_ids=covid_ids,
     )
 
-    org_signatures_wide = org_signatures.unstack()
-
     # Covid research cluster vector representations
     covid_sig = pd.concat(
         [
@@ -345,8 +334,10 @@ if __name__ == "__main__":
     )
 
     logging.info("Analysis of relatedness")
+    proximity_index = make_proximity_index(dist_to_clusters, cluster_assignments)
+
     cluster_proximity_lookup = make_document_relatedness(
-        dist_to_clusters, cluster_assignments, cluster_labels
+        proximity_index, cluster_labels
     )
 
     # Calculate robust specialisation
@@ -355,6 +346,7 @@ if __name__ == "__main__":
         [1.5, 2.5],
         cluster_assignments=cluster_assignments,
         projects=projs,
+        proximity_index=proximity_index,
     )
 
     # Plot specialisation robustness
@@ -366,6 +358,7 @@ if __name__ == "__main__":
         cluster_assignments=cluster_assignments,
         focus_countries=focus_countries,
         clean_var_lookup=clean_var_lookup,
+        proximity_index=proximity_index,
     )
 
     save_altair(sp_rob, "specialisation_robustness", driver=driv, path=VAL_PATH)
@@ -21,8 +21,9 @@ from eurito_indicators.getters.arxiv_getters import (
     get_covid_papers,
     query_arxiv_institute,
 )
+from eurito_indicators.pipeline.article_store import ArticleStore
+from eurito_indicators.pipeline.cluster_validation import k_check_runs
 from eurito_indicators.pipeline.clustering_naming import (
-    k_check_clusters,
     make_distance_to_clusters,
     make_doc_comm_lookup,
 )
@@ -124,18 +125,16 @@ def tag_covid_cluster(table, cluster_lookup, cluster_name):
     return t
 
 
-def tag_month_year(table, art):
-    return table["article_id"].map(art.set_index("article_id")["month_year"].to_dict())
+def tag_month_year(table, art_store):
+    return art_store.lookup(table["article_id"], "month_year")
 
 
-def make_temp_reg_table(inst_cov, all_arts, focus_countries):
+def make_temp_reg_table(inst_cov, art_store, focus_countries):
     """Creates a regression table to analyse the link
     between research nationality, topic and timeliness of Covid-19 response
     """
 
-    inst_cov["created"] = inst_cov["article_id"].map(
-        all_arts.set_index("article_id")["created"]
-    )
+    inst_cov["created"] = art_store.lookup(inst_cov["article_id"], "created")
 
     number_collabs = inst_cov.groupby("article_id")["country"].apply(
         lambda x: len(set(x))
@@ -277,10 +276,12 @@ if __name__ == "__main__":
 
     logging.info("K-check cluster outputs")
 
-    kmeans_validation_results = [
-        k_check_clusters(tm, n_clust=k, cluster_assignments=clust_assign)
-        for k in [23] * 5 + [15] * 5 + [30] * 5
-    ]
+    kmeans_validation_results = k_check_runs(
+        tm,
+        cluster_assignments=clust_assign,
+        n_clusts=[23] * 5 + [15] * 5 + [30] * 5,
+        sample_size=1000,
+    )
 
     heatmap, corr_shares, corr_distr = plot_k_check_outputs(
         kmeans_validation_results, cluster_names
@@ -382,7 +383,8 @@ if __name__ == "__main__":
     all_arts = get_arxiv_articles().query("article_source!='cord'")
     inst = query_arxiv_institute().query("is_multinational == 0").reset_index(drop=True)
     inst_cov = tag_covid_cluster(inst, paper_cluster_lookup, clean_names)
-    inst_cov["month_year"] = tag_month_year(inst_cov, all_arts)
+    art_store = ArticleStore.from_table(all_arts, ["created", "month_year"])
+    inst_cov["month_year"] = tag_month_year(inst_cov, art_store)
 
     inst_cov = (
         inst_cov.query("month_year>='2020-01-01'")
@@ -506,11 +508,9 @@ if __name__ == "__main__":
 
     logging.info("Regression analysis")
 
-    inst_cov["created"] = inst_cov["article_id"].map(
-        all_arts.set_index("article_id")["created"]
-    )
+    inst_cov["created"] = art_store.lookup(inst_cov["article_id"], "created")
 
-    reg_data = make_temp_reg_table(inst_cov, all_arts, focus_countries)
+    reg_data = make_temp_reg_table(inst_cov, art_store, focus_countries)
     reg_results = time_reg_comparison(reg_data)
     regression_coefficients = pd.concat(
         [
@@ -1,5 +1,6 @@
 # Get arxiv data
 
+import glob
 import json
 import logging
 import os
@@ -11,54 +12,175 @@ from zipfile import ZipFile
 
 import numpy as np
 import pandas as pd
-import requests
-from kaggle.api.kaggle_api_extended import KaggleApi
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 
 from eurito_indicators import PROJECT_DIR
-from eurito_indicators.pipeline.clustering_naming import make_doc_comm_lookup
 from eurito_indicators.pipeline.processing_utils import covid_getter
+from eurito_indicators.utils.instrumentation import instrument
 
 GRID_PATH = f"{PROJECT_DIR}/inputs/data/grid"
 CORD_META_PATH = f"{PROJECT_DIR}/inputs/data/metadata.csv.zip"
+CORD_DATES_PATH = f"{PROJECT_DIR}/inputs/data/cord_publish_dates.parquet"
 DISC_QUERY = f"{PROJECT_DIR}/inputs/data/arxiv_discipline.csv"
-COV_PAPERS_PATH = f"{PROJECT_DIR}/inputs/data/arxiv_papers_covid.csv"
+COV_PAPERS_PATH = f"{PROJECT_DIR}/inputs/data/arxiv_papers_covid"
+# Articles already checked for covid, by source (pyarrow ignores "_" files)
+COV_PAPERS_IDS = f"{COV_PAPERS_PATH}/_processed_ids.parquet"
+ARXIV_ARTICLES_PATH = f"{PROJECT_DIR}/inputs/data/arxiv_articles_v2.csv"
+INST_PATH = f"{PROJECT_DIR}/inputs/data/arxiv_article_institutes_updated.csv"
+INST_META_PATH = f"{PROJECT_DIR}/inputs/data/arxiv_article_institutes_meta.parquet"
+GRID_TABLES = ["institutes", "addresses", "types", "geonames"]
+
+ARTICLE_COLUMNS = [
+    "article_id",
+    "created",
+    "month_year",
+    "title",
+    "journal_ref",
+    "doi",
+    "authors",
+    "abstract",
+    "mag_id",
+    "citation_count",
+    "article_source",
+]
+TEXT_COLUMNS = ["title", "abstract"]
+INST_CATEGORICALS = [
+    "city",
+    "country",
+    "country_code",
+    "type",
+    "nuts_level1_code",
+    "nuts_level2_code",
+    "nuts_level3_code",
+]
+COV_PAPERS_STRINGS = [
+    "article_id",
+    "title",
+    "journal_ref",
+    "doi",
+    "authors",
+    "abstract",
+    "text",
+]
+# Columns of the covid papers store, for an empty table when it has no papers
+COV_PAPERS_DTYPES = {
+    "article_id": "string",
+    "created": "datetime64[us]",
+    "month_year": "datetime64[us]",
+    "title": "string",
+    "journal_ref": "string",
+    "doi": "string",
+    "authors": "string",
+    "abstract": "string",
+    "mag_id": "float64",
+    "citation_count": "float32",
+    "text": "string",
+    "year": "float64",
+    "article_source": "category",
+}
+
+
+def month_bucket(dates: pd.Series) -> pd.Series:
+    """Floors dates to the first day of their month (missing dates stay missing)"""
+
+    return dates.dt.to_period("M").dt.to_timestamp()
+
+
+def encode_article_ids(article_ids: pd.Series) -> tuple:
+    """Encodes article ids as dense integers
+
+    Args:
+        article_ids: article ids
+
+    Returns:
+        An array of int32 codes and the index of ids to decode them
+        (i.e. id_index[code] is the article id)
+    """
+
+    codes, id_index = pd.factorize(article_ids)
+    return codes.astype(np.int32), pd.Index(id_index, name="article_id")
 
 
-def get_arxiv_articles():
-    """Get arxiv - and cord - articles"""
+@instrument()
+def get_arxiv_articles(text: bool = True, code_ids: bool = False):
+    """Get arxiv - and cord - articles
+
+    Args:
+        text: whether to load the title and abstract (see `get_arxiv_article_text`
+            to load them later for a subset of articles)
+        code_ids: whether to replace article ids with integer codes
+
+    Returns:
+        The article table or, if code_ids, the table with an article_code column
+        and the index of article ids to decode it
+    """
+
+    columns = [c for c in ARTICLE_COLUMNS if text or c not in TEXT_COLUMNS]
+    usecols = ["id" if c == "article_id" else c for c in columns if c != "month_year"]
 
     art = pd.read_csv(
-        f"{PROJECT_DIR}/inputs/data/arxiv_articles_v2.csv",
-        dtype={"id": str},
+        ARXIV_ARTICLES_PATH,
+        usecols=usecols,
+        dtype={
+            **{c: "string[pyarrow]" for c in ["id", "doi", "authors"] + TEXT_COLUMNS},
+            "journal_ref": "category",
+            "article_source": "category",
+            "mag_id": "float64",
+            "citation_count": "float32",
+        },
         parse_dates=["created"],
     )
     art = art.rename(columns={"id": "article_id"})
-    art["month_year"] = [
-        datetime(x.year, x.month, 1) if pd.isnull(x) == False else np.nan
-        for x in art["created"]
-    ]
+    art["month_year"] = month_bucket(art["created"])
+    art = art[columns]
 
-    selected_columns = [
-        "article_id",
-        "created",
-        "month_year",
-        "title",
-        "journal_ref",
-        "doi",
-        "authors",
-        "abstract",
-        "mag_id",
-        "citation_count",
-        "article_source",
-    ]
-    return art[selected_columns]
+    logging.info(
+        f"arxiv articles: {len(art)} rows, "
+        f"{art.memory_usage(deep=True).sum() / 1e6:.0f}MB"
+    )
+
+    if code_ids is False:
+        return art
+
+    codes, id_index = encode_article_ids(art["article_id"])
+    art = art.drop(columns=["article_id"])
+    art.insert(0, "article_code", codes)
+
+    return art, id_index
+
+
+@instrument()
+def get_arxiv_article_text(article_ids: set = None) -> pd.DataFrame:
+    """Get the title and abstract of arxiv - and cord - articles
+
+    Args:
+        article_ids: articles to keep (all articles if None)
+
+    Returns:
+        A table with article ids, titles and abstracts
+    """
+
+    chunks = pd.read_csv(
+        ARXIV_ARTICLES_PATH,
+        usecols=["id"] + TEXT_COLUMNS,
+        dtype="string[pyarrow]",
+        chunksize=100000,
+    )
+    if article_ids is not None:
+        chunks = (chunk.loc[chunk["id"].isin(article_ids)] for chunk in chunks)
+
+    text = pd.concat(chunks, ignore_index=True)
+
+    return text.rename(columns={"id": "article_id"})
 
 
 def get_arxiv_institutes():
     """Lookup between paper ids and org id"""
 
     inst = pd.read_csv(
-        f"{PROJECT_DIR}/inputs/data/arxiv_article_institutes_updated.csv",
+        INST_PATH,
         dtype={"article_id": str, "institute_id": str},
     )
     return inst
@@ -74,9 +196,22 @@ def get_article_categories():
     return inst
 
 
-def get_arxiv_w2v():
-    with open(f"{PROJECT_DIR}/outputs/models/arxiv_w2v.p", "rb") as infile:
-        return pickle.load(infile)
+def get_arxiv_w2v(model: bool = False):
+    """Word vectors of the arXiv word2vec model
+
+    Args:
+        model: whether to load the trainable model instead of its word vectors
+
+    Returns:
+        The unit normalised word vectors (KeyedVectors), memory-mapped
+        read-only so that processes share one copy, or the Word2Vec model
+    """
+    from gensim.models import KeyedVectors, Word2Vec
+
+    if model:
+        return Word2Vec.load(f"{PROJECT_DIR}/outputs/models/arxiv_w2v.model")
+
+    return KeyedVectors.load(f"{PROJECT_DIR}/outputs/models/arxiv_w2v.kv", mmap="r")
 
 
 def fetch_grid():
@@ -84,6 +219,8 @@ def fetch_grid():
 
     if os.path.exists(GRID_PATH) is False:
         logging.info("Collecting Grid data")
+        import requests
+
         os.makedirs(GRID_PATH, exist_ok=True)
         g = requests.get("https://ndownloader.figshare.com/files/28431024")
         g_z = ZipFile(BytesIO(g.content))
@@ -94,6 +231,8 @@ def fetch_cord_meta():
     """Fetch the cord metadata"""
     if os.path.exists(CORD_META_PATH) is False:
         logging.info("Fetching cord data")
+        from kaggle.api.kaggle_api_extended import KaggleApi
+
         api = KaggleApi()
         api.authenticate()
         api.dataset_download_file(
@@ -103,100 +242,261 @@ def fetch_cord_meta():
         )
 
 
-def get_cord_metadata():
-    """Gets the cord metadata"""
+@instrument()
+def make_cord_publish_dates(chunksize: int = 200000) -> pd.DataFrame:
+    """Reads the CORD publication dates streaming the metadata in chunks
+
+    Args:
+        chunksize: number of rows to read at once
+
+    Returns:
+        A table indexed by article id with the publication year and whether we
+        know the exact date (some papers only have a year)
+    """
+
+    chunks = pd.read_csv(
+        CORD_META_PATH,
+        compression="zip",
+        usecols=["cord_uid", "publish_time"],
+        dtype=str,
+        chunksize=chunksize,
+    )
 
-    meta = pd.read_csv(f"{PROJECT_DIR}/inputs/data/metadata.csv.zip", compression="zip")
-    meta_has_date = meta.dropna(axis=0, subset=["publish_time"])
-    meta_bad_date = set(
+    dates = pd.concat(
         [
-            f"cord-{_id}"
-            for _id, date in zip(
-                meta_has_date["cord_uid"], meta_has_date["publish_time"]
+            pd.DataFrame(
+                {
+                    "article_id": "cord-" + chunk["cord_uid"],
+                    "year": chunk["publish_time"].str[:4].astype("int16"),
+                    "exact_date": chunk["publish_time"].str.contains("-"),
+                }
             )
-            if "-" not in date
-        ]
+            for chunk in (c.dropna(subset=["publish_time"]) for c in chunks)
+        ],
+        ignore_index=True,
+    )
+
+    # A paper can appear several times: we keep its last year and only
+    # consider its date exact if it is exact in all its records
+    return dates.groupby("article_id", sort=True).agg(
+        year=("year", "last"), exact_date=("exact_date", "all")
     )
-    meta_year = {
-        f"cord-{_id}": int(date.split("-")[0]) if "-" in date else int(date)
-        for _id, date in zip(meta_has_date["cord_uid"], meta_has_date["publish_time"])
-    }
-    return meta_bad_date, meta_year
 
 
-def get_covid_papers():
+def get_cord_metadata():
+    """Gets the cord publication years and the papers without an exact date
+
+    Returns:
+        The ids of papers without an exact publication date and a series with
+        the publication year of each paper (indexed by article id)
+    """
+
+    if os.path.exists(CORD_DATES_PATH) is False:
+        logging.info("Making cord publication dates")
+        make_cord_publish_dates().to_parquet(CORD_DATES_PATH)
+
+    dates = pd.read_parquet(CORD_DATES_PATH)
+
+    return dates.index[~dates["exact_date"]], dates["year"]
+
+
+@instrument()
+def make_covid_papers(arts: pd.DataFrame, known_titles: set = None) -> pd.DataFrame:
     """Make the papers table
     Includes:
         Removing duplicated papers in cord
         Creating month year variable missing for cord papers without detailed
             publication date
-    """
 
-    if os.path.exists(COV_PAPERS_PATH) is False:
-        logging.info("Making covid papers")
+    Args:
+        arts: articles to process (from `get_arxiv_articles`)
+        known_titles: titles of cord papers we already have
 
-        arts = get_arxiv_articles()
+    Returns:
+        A table with the covid papers
+    """
 
-        logging.info("processing arxiv papers")
-        arxiv_covid = (
-            arts.query("article_source!='cord'")
-            .dropna(axis=0, subset=["abstract","title"])
-            .assign(text = lambda df: [" ".join([x,y]) for x,y in zip(df['title'],df['abstract'])])
-            .assign(has_cov=lambda df: [covid_getter(text) for text in df["text"]])
-            .query("has_cov == True")
-        )
-        arxiv_covid["month_year"] = [
-            datetime(x.year, x.month, 1) for x in arxiv_covid["created"]
-        ]
-        arxiv_covid["year"] = [x.year for x in arxiv_covid["month_year"]]
-
-        logging.info("processing cord papers")
-        cord = (
-            arts.query("article_source=='cord'")
-            .dropna(axis=0, subset=["abstract"])
-            .assign(has_cov=lambda df: [covid_getter(text) for text in df["abstract"]])
-            .query("has_cov == True")
-            .assign(
-                journal_ref=lambda df: [
-                    x.lower() if type(x) == str else np.nan for x in df["journal_ref"]
-                ]
-            )
-        )
+    logging.info("processing arxiv papers")
+    arxiv_covid = (
+        arts.query("article_source!='cord'")
+        .dropna(axis=0, subset=["abstract", "title"])
+        .assign(text=lambda df: df["title"] + " " + df["abstract"])
+        .assign(has_cov=lambda df: [covid_getter(text) for text in df["text"]])
+        .query("has_cov == True")
+    )
+    arxiv_covid["month_year"] = month_bucket(arxiv_covid["created"])
+    arxiv_covid["year"] = arxiv_covid["month_year"].dt.year
+
+    logging.info("processing cord papers")
+    cord = (
+        arts.query("article_source=='cord'")
+        .dropna(axis=0, subset=["abstract"])
+        .assign(has_cov=lambda df: [covid_getter(text) for text in df["abstract"]])
+        .query("has_cov == True")
+        .assign(journal_ref=lambda df: df["journal_ref"].astype("string").str.lower())
+    )
 
-        cord = cord.loc[~cord["journal_ref"].isin(["biorxiv", "medrxiv"])]
-        cord = cord.drop_duplicates("title")
+    cord = cord.loc[~cord["journal_ref"].isin(["biorxiv", "medrxiv"])]
+    cord = cord.drop_duplicates("title")
+    if known_titles is not None:
+        cord = cord.loc[~cord["title"].isin(known_titles)]
 
+    if len(cord) > 0:
         meta_bad_date, meta_year = get_cord_metadata()
         cord["year"] = cord["article_id"].map(meta_year)
+        cord["month_year"] = month_bucket(cord["created"]).mask(
+            cord["article_id"].isin(meta_bad_date)
+        )
+
+    papers = (
+        pd.concat([arxiv_covid, cord], axis=0)
+        .reset_index(drop=True)
+        .drop(axis=1, labels=["has_cov"])
+    )
+
+    # Fixed types so that the batches in the papers store share a schema
+    return papers.astype(
+        {
+            **{c: "string[pyarrow]" for c in COV_PAPERS_STRINGS},
+            "article_source": "string[pyarrow]",
+            "year": "float64",
+            "mag_id": "float64",
+            "citation_count": "float32",
+        }
+    )
 
-        cord["month_year"] = [
-            datetime(d.year, d.month, 1)
-            if (_id not in meta_bad_date) & (not pd.isnull(d))
-            else np.nan
-            for _id, d in zip(cord["article_id"], cord["created"])
-        ]
 
-        papers = (
-            pd.concat([arxiv_covid, cord], axis=0)
-            .reset_index(drop=True)
-            .drop(axis=1, labels=["has_cov"])
+def read_covid_papers(columns: list = None) -> pd.DataFrame:
+    """Reads the papers in the store: only its part files (one directory per
+    article source), not the ids of the articles checked for covid
+
+    Args:
+        columns: columns to read (all if None)
+
+    Returns:
+        A table with the covid papers (empty if the store has none)
+    """
+
+    parts = sorted(glob.glob(f"{COV_PAPERS_PATH}/article_source=*/*.parquet"))
+
+    if len(parts) == 0:
+        dtypes = {
+            c: t
+            for c, t in COV_PAPERS_DTYPES.items()
+            if columns is None or c in columns
+        }
+        return pd.DataFrame({c: pd.Series(dtype=t) for c, t in dtypes.items()})
+
+    return (
+        ds.dataset(
+            parts,
+            format="parquet",
+            partitioning=ds.HivePartitioning.discover(infer_dictionary=True),
+            partition_base_dir=COV_PAPERS_PATH,
         )
-        papers.to_csv(COV_PAPERS_PATH, index=False)
-        return papers
+        .to_table(columns=columns)
+        .to_pandas()
+    )
+
+
+def read_covid_papers_ids() -> pd.DataFrame:
+    """Reads the source and id of the articles already checked for covid"""
+
+    if os.path.exists(COV_PAPERS_IDS) is True:
+        return pd.read_parquet(COV_PAPERS_IDS)
+
+    # Stores made before the ids were kept: only their papers are known
+    return read_covid_papers(columns=["article_source", "article_id"])
+
+
+def save_covid_papers_ids(ids: pd.DataFrame):
+    """Saves the source and id of the articles checked for covid (replacing the
+    previous file in one step so that an interrupted save keeps it whole)
+    """
+
+    ids.astype(str).reset_index(drop=True).to_parquet(f"{COV_PAPERS_IDS}.tmp")
+    os.replace(f"{COV_PAPERS_IDS}.tmp", COV_PAPERS_IDS)
+
+
+@instrument()
+def update_covid_papers():
+    """Finds covid papers in the articles that haven't been checked before
+    (all articles the first time) and appends them to the papers store.
+    Articles are matched by source and id, so late records with old creation
+    dates are also checked. Titles and abstracts are only read for the new
+    articles
+    """
+
+    arts = get_arxiv_articles(text=False)
+    keys = pd.MultiIndex.from_arrays(
+        [arts["article_source"].astype(str), arts["article_id"].astype(str)]
+    )
+
+    if os.path.exists(COV_PAPERS_PATH) is True:
+        processed = read_covid_papers_ids()
+        is_new = ~keys.isin(pd.MultiIndex.from_frame(processed.astype(str)))
     else:
-        return pd.read_csv(
+        logging.info("Making covid papers")
+        processed = None
+        is_new = np.ones(len(arts), dtype=bool)
+
+    logging.info(f"Processing {is_new.sum()} new articles")
+    if (processed is not None) and (is_new.sum() == 0):
+        return
+
+    new_arts = arts.loc[is_new]
+    new_arts = new_arts.merge(
+        get_arxiv_article_text(set(new_arts["article_id"])).drop_duplicates(
+            "article_id"
+        ),
+        on="article_id",
+        how="left",
+    )[ARTICLE_COLUMNS]
+
+    known_titles = (
+        set(read_covid_papers(columns=["title"])["title"].dropna())
+        if processed is not None
+        else None
+    )
+    papers = make_covid_papers(new_arts, known_titles)
+
+    if len(papers) > 0:
+        batch = datetime.now().strftime("%Y%m%d%H%M%S%f")
+        pq.write_to_dataset(
+            pa.Table.from_pandas(papers, preserve_index=False),
             COV_PAPERS_PATH,
-            dtype={"article_id": str},
-            parse_dates=["created", "month_year"],
+            partition_cols=["article_source"],
+            basename_template=f"batch-{batch}-{{i}}.parquet",
         )
 
+    os.makedirs(COV_PAPERS_PATH, exist_ok=True)
+    checked = keys[is_new].to_frame(index=False, name=["article_source", "article_id"])
+    save_covid_papers_ids(pd.concat([processed, checked]))
+    logging.info(f"Added {len(papers)} covid papers")
+
+
+def get_covid_papers(update: bool = False) -> pd.DataFrame:
+    """Get the covid papers table, making it if it doesn't exist
+
+    Args:
+        update: whether to add papers from the articles that haven't been checked
+
+    Returns:
+        A table with the covid papers
+    """
+
+    if (os.path.exists(COV_PAPERS_IDS) is False) or (update is True):
+        update_covid_papers()
+
+    return read_covid_papers()
 
+
+@instrument()
 def get_grid_meta():
     """Get relevant grid metadata"""
 
     name, address, org_type, geo = [
-        pd.read_csv(f"{GRID_PATH}/full_tables/{n}.csv")
-        for n in ["institutes", "addresses", "types", "geonames"]
+        pd.read_csv(f"{GRID_PATH}/full_tables/{n}.csv") for n in GRID_TABLES
     ]
 
     merged = (
@@ -224,15 +524,69 @@ def get_grid_meta():
     return grid_meta
 
 
-def query_arxiv_institute():
-    """Combine arXiv institute lookup with grid metadata"""
+@instrument()
+def make_arxiv_institutes_table() -> pd.DataFrame:
+    """Combines the arXiv institute lookup with grid metadata, sorted by article id"""
 
     inst = get_arxiv_institutes()
 
     grid_meta = get_grid_meta()
 
     inst_meta = inst.merge(grid_meta, left_on="institute_id", right_on="grid_id")
-    return inst_meta
+
+    return (
+        inst_meta.astype({c: "category" for c in INST_CATEGORICALS})
+        .sort_values("article_id", kind="stable")
+        .reset_index(drop=True)
+    )
+
+
+def arxiv_institutes_table_is_stale() -> bool:
+    """Whether the materialised institute table is missing or older than the
+    institute lookup or the grid tables it combines
+    """
+
+    if os.path.exists(INST_META_PATH) is False:
+        return True
+
+    sources = [INST_PATH] + [f"{GRID_PATH}/full_tables/{n}.csv" for n in GRID_TABLES]
+
+    return max(os.path.getmtime(f) for f in sources) > os.path.getmtime(INST_META_PATH)
+
+
+@instrument()
+def query_arxiv_institute(
+    article_ids: set = None, country_codes: set = None, columns: list = None
+) -> pd.DataFrame:
+    """Combine arXiv institute lookup with grid metadata.
+    The combined table is materialised the first time (or when the institute
+    lookup or the grid tables change) and later read filtering by article and
+    country
+
+    Args:
+        article_ids: articles to keep (all if None)
+        country_codes: institute country codes to keep (all if None)
+        columns: columns to read (all if None)
+
+    Returns:
+        A table with the institutes participating in each article
+    """
+
+    if arxiv_institutes_table_is_stale():
+        logging.info("Making arXiv institute table")
+        pq.write_table(
+            pa.Table.from_pandas(make_arxiv_institutes_table(), preserve_index=False),
+            INST_META_PATH,
+            row_group_size=100000,
+        )
+
+    filters = []
+    if article_ids is not None:
+        filters.append(("article_id", "in", list(article_ids)))
+    if country_codes is not None:
+        filters.append(("country_code", "in", list(country_codes)))
+
+    return pd.read_parquet(INST_META_PATH, columns=columns, filters=filters or None)
 
 
 def get_arxiv_tokenised():
@@ -1,6 +1,12 @@
 import json
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from eurito_indicators import PROJECT_DIR
 from eurito_indicators.utils.misc_utils import camel_to_snake
@@ -10,6 +16,16 @@ FRAMEWORK_PROGRAMMES = ['fp1', 'fp2', 'fp3', 'fp4', 'fp5', 'fp6', 'fp7', 'h2020'
 
 CORDIS_DIR = f'{PROJECT_DIR}/inputs/cordis'
 
+CORDIS_PROJECTS_CACHE = f'{CORDIS_DIR}/cordis_projects.parquet'
+
+CATEGORICAL_COLS = [
+    'status',
+    'programme',
+    'framework_programme',
+    'funding_scheme',
+    'coordinator_country',
+]
+
 
 def cordis_file_path(fp_name, resource_name):
     '''Create the file path for a CORDIS dataset given a Framework Programme 
@@ -39,12 +55,8 @@ def load_cordis_projects(fp_name):
     '''
     resource_name = 'projects'
     fin = cordis_file_path(fp_name, resource_name)
-    with open(f'{CORDIS_DIR}/cordis_parse_opts.json', 'r') as f:
-        parse_opts = json.load(f)[resource_name]
+    parse_opts, read_opts = _load_cordis_opts(resource_name)
 
-    with open(f'{CORDIS_DIR}/cordis_read_opts.json', 'r') as f:
-        read_opts = json.load(f)[resource_name]
-    
     df = pd.read_csv(fin, **read_opts)
     df = _parse_cordis_projects(df, **parse_opts)
 
@@ -53,21 +65,147 @@ def load_cordis_projects(fp_name):
     return df
 
 
-def load_all_cordis_projects():
+def load_all_cordis_projects(fps=None, columns=None, use_cache=True, n_jobs=None):
     '''load_all_cordis_projects
     Loads projects for all CORDIS Framework Programmes as a single DataFrame.
+    The first call reads the Framework Programme files concurrently and caches
+    the combined table as a parquet dataset partitioned by Framework Programme,
+    so that later calls only read the programmes and columns they need. The
+    cache is rebuilt when the source files change.
 
     Args:
-        resource_name (str): Entity type e.g., projects, organizations
+        fps (list): Framework Programmes to load (all if None)
+        columns (list): Columns to load (all if None)
+        use_cache (bool): Whether to read from (and create) the cache
+        n_jobs (int): Number of threads used to read the files
 
     Returns:
         (pd.DataFrame): Parsed CORDIS projects for all Framework Programmes
     '''
-    fps = ['h2020', 'fp7', 'fp6', 'fp5', 'fp4', 'fp3', 'fp2', 'fp1']
-    dfs = []
-    for fp in fps:
-        dfs.append(load_cordis_projects(fp))
-    return pd.concat(dfs)
+    if fps is None:
+        fps = ['h2020', 'fp7', 'fp6', 'fp5', 'fp4', 'fp3', 'fp2', 'fp1']
+
+    if use_cache is False:
+        df = _read_all_cordis_projects(fps, n_jobs)
+        return df if columns is None else df[columns]
+
+    if _cordis_projects_cache_is_stale():
+        save_cordis_projects_cache(
+            _read_all_cordis_projects(FRAMEWORK_PROGRAMMES[::-1], n_jobs)
+        )
+
+    return read_cordis_projects_cache(fps, columns)
+
+
+def _read_all_cordis_projects(fps, n_jobs=None):
+    '''_read_all_cordis_projects
+    Reads and parses the projects of several Framework Programmes concurrently.
+    '''
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        dfs = list(executor.map(load_cordis_projects, fps))
+
+    df = pd.concat(
+        [d.assign(fp_name=fp) for d, fp in zip(dfs, fps)], ignore_index=True
+    )
+    df['fp_name'] = pd.Categorical(df['fp_name'], categories=fps)
+
+    # Costs are only parsed for fp6, and Arrow needs a single type per column
+    for col in ['ec_max_contribution', 'total_cost']:
+        df[col] = pd.to_numeric(
+            df[col].astype(str).str.replace(',', '.').str.replace(' ', ''),
+            errors='coerce',
+        )
+
+    list_cols = set(
+        camel_to_snake(col)
+        for col in _load_cordis_opts('projects')[0]['list_cols']
+    )
+    for col in df.columns.difference(list_cols):
+        if col in CATEGORICAL_COLS:
+            df[col] = df[col].astype('category')
+        elif pd.api.types.infer_dtype(df[col], skipna=True).startswith('mixed'):
+            df[col] = df[col].where(df[col].isnull(), df[col].astype(str))
+    return df
+
+
+def _cordis_projects_cache_is_stale():
+    '''_cordis_projects_cache_is_stale
+    Whether the projects cache is missing or older than any of the files it is
+    made from (the projects CSVs and the parse and read options).
+    '''
+    if os.path.exists(CORDIS_PROJECTS_CACHE) is False:
+        return True
+
+    sources = [cordis_file_path(fp, 'projects') for fp in FRAMEWORK_PROGRAMMES] + [
+        f'{CORDIS_DIR}/cordis_parse_opts.json',
+        f'{CORDIS_DIR}/cordis_read_opts.json',
+    ]
+    cache_mtime = os.path.getmtime(CORDIS_PROJECTS_CACHE)
+    return any(
+        os.path.getmtime(f) > cache_mtime for f in sources if os.path.exists(f)
+    )
+
+
+def save_cordis_projects_cache(df):
+    '''save_cordis_projects_cache
+    Saves CORDIS projects as a parquet dataset partitioned by Framework
+    Programme. List columns are stored as Arrow lists. The dataset is written
+    to a temporary directory that then replaces the cache, so an interrupted
+    write never leaves a partial (or, as the writer appends files, duplicated)
+    cache behind.
+
+    Args:
+        df (pd.DataFrame): Output of `_read_all_cordis_projects`
+    '''
+    tmp_path = f'{CORDIS_PROJECTS_CACHE}.tmp'
+    old_path = f'{CORDIS_PROJECTS_CACHE}.old'
+    for path in [tmp_path, old_path]:
+        shutil.rmtree(path, ignore_errors=True)
+
+    pq.write_to_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        tmp_path,
+        partition_cols=['fp_name'],
+    )
+
+    # A directory can't replace a non-empty one, so the old cache is moved away
+    if os.path.exists(CORDIS_PROJECTS_CACHE):
+        os.replace(CORDIS_PROJECTS_CACHE, old_path)
+    os.replace(tmp_path, CORDIS_PROJECTS_CACHE)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def read_cordis_projects_cache(fps=None, columns=None):
+    '''read_cordis_projects_cache
+    Reads CORDIS projects from the parquet cache without touching the
+    partitions of other Framework Programmes.
+
+    Args:
+        fps (list): Framework Programmes to load (all if None)
+        columns (list): Columns to load (all if None)
+
+    Returns:
+        (pd.DataFrame): CORDIS projects. List columns use Arrow list dtypes
+    '''
+    filters = None if fps is None else [('fp_name', 'in', fps)]
+    table = pq.read_table(CORDIS_PROJECTS_CACHE, columns=columns, filters=filters)
+
+    return table.to_pandas(
+        types_mapper=lambda t: pd.ArrowDtype(t) if pa.types.is_list(t) else None
+    )
+
+
+@lru_cache()
+def _load_cordis_opts(resource_name):
+    '''_load_cordis_opts
+    Reads (once per process) the parse and read options for a CORDIS entity.
+    '''
+    with open(f'{CORDIS_DIR}/cordis_parse_opts.json', 'r') as f:
+        parse_opts = json.load(f)[resource_name]
+
+    with open(f'{CORDIS_DIR}/cordis_read_opts.json', 'r') as f:
+        read_opts = json.load(f)[resource_name]
+    return parse_opts, read_opts
 
 
 def _parse_cordis_projects(df, list_cols, list_sep, drop_cols):
@@ -7,10 +7,12 @@ import re
 import pandas as pd
 
 from eurito_indicators import config, PROJECT_DIR
+from eurito_indicators.utils.instrumentation import instrument
 
 LEVEL_LOOKUP = config["covid_level_names"]
 
 
+@instrument()
 def get_cordis_projects():
 
     projs = pd.read_csv(
@@ -23,6 +25,7 @@ def get_cordis_projects():
     return projs
 
 
+@instrument()
 def get_cordis_organisations():
 
     return pd.read_csv(f"{PROJECT_DIR}/inputs/data/cordis_organisations.csv")
@@ -54,6 +57,7 @@ def get_doc2vec():
         return pickle.load(infile)
 
 
+@instrument()
 def get_specter():
     return pd.read_csv(
         f"{PROJECT_DIR}/inputs/data/specter_embeddings.csv", index_col="project_id"
@@ -0,0 +1,169 @@
+# Registry of local snapshots of the reference data we use to label and filter
+# indicators. Snapshots are shared in inputs/data/reference (tracked in git) and
+# any that are missing are fetched from their pinned source on first use, or with
+# `python eurito_indicators/getters/reference_data.py`
+
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import sys
+import zipfile
+from functools import lru_cache
+
+import pandas as pd
+import yaml
+
+from eurito_indicators import config, PROJECT_DIR
+
+REFERENCE_PATH = f"{PROJECT_DIR}/inputs/data/reference"
+REFERENCE_SOURCES = config["reference_data"]
+
+
+def reference_path(name: str) -> str:
+    """Path to the local snapshot of a reference dataset"""
+
+    source = REFERENCE_SOURCES[name]
+    return f"{REFERENCE_PATH}/{name}_{source['version']}.{source['format']}"
+
+
+def is_pinned(name: str) -> bool:
+    """Whether the source of a reference dataset can't change: either we know
+    the sha256 of its content or its version is a commit sha that is also in
+    its url
+    """
+
+    source = REFERENCE_SOURCES[name]
+    version = str(source["version"])
+
+    return ("sha256" in source) or (
+        (re.fullmatch(r"[0-9a-f]{7,40}", version) is not None)
+        and (version in source["url"])
+    )
+
+
+def fetch_reference_snapshot(name: str, overwrite: bool = False):
+    """Downloads a reference dataset from its pinned source. Sources with a
+    `member` are zip archives (e.g. wheels) with the dataset inside
+
+    Args:
+        name: dataset name in the reference_data config
+        overwrite: whether to download snapshots we already have
+    """
+
+    path = reference_path(name)
+
+    if (os.path.exists(path) is True) and (overwrite is False):
+        return
+
+    source = REFERENCE_SOURCES[name]
+    if is_pinned(name) is False:
+        raise ValueError(
+            f"The source of {name} is not pinned: set a commit url and version "
+            "or the sha256 of the content in `reference_data` in base.yaml"
+        )
+
+    logging.info(f"Fetching {name}")
+    import requests
+
+    response = requests.get(source["url"])
+    response.raise_for_status()
+    content = response.content
+
+    if ("sha256" in source) and (
+        hashlib.sha256(content).hexdigest() != source["sha256"]
+    ):
+        raise ValueError(f"The content of {source['url']} doesn't match its sha256")
+
+    if "member" in source:
+        content = zipfile.ZipFile(io.BytesIO(content)).read(source["member"])
+
+    os.makedirs(REFERENCE_PATH, exist_ok=True)
+    with open(f"{path}.tmp", "wb") as outfile:
+        outfile.write(content)
+    os.replace(f"{path}.tmp", path)
+
+
+@lru_cache()
+def load_reference(name: str):
+    """Reads the local snapshot of a reference dataset (once per process)
+
+    Args:
+        name: dataset name in the reference_data config
+
+    Returns:
+        A table for csv snapshots, the parsed content for json and yaml snapshots
+    """
+
+    path = reference_path(name)
+
+    if os.path.exists(path) is False:
+        fetch_reference_snapshot(name)
+
+    source_format = REFERENCE_SOURCES[name]["format"]
+    if source_format == "csv":
+        return pd.read_csv(path, keep_default_na=False)
+
+    with open(path, "r") as infile:
+        return json.load(infile) if source_format == "json" else yaml.safe_load(infile)
+
+
+def get_iso_country_lookup() -> dict:
+    """Creates a country name - iso code lookup.
+    Takes into account that some EU ISO country names are different from the standard.
+    """
+
+    country_names = {
+        country["alpha_2"]: country["name"]
+        for country in load_reference("iso_countries")["3166-1"]
+    }
+
+    country_names["EL"] = "Greece"
+    country_names["UK"] = "United Kingdom"
+
+    return country_names
+
+
+@lru_cache()
+def get_nuts_countries() -> frozenset:
+    """Countries (ISO-2 / NUTS codes) in the NUTS country lists for any year"""
+
+    return frozenset(
+        country
+        for countries in load_reference("nuts_countries").values()
+        for country in countries
+    )
+
+
+def in_countries(regions: pd.Series, countries=None) -> pd.Series:
+    """Checks if region codes start with a country code in a set of countries
+
+    Args:
+        regions: region codes (e.g. NUTS ids)
+        countries: country codes (NUTS countries if None)
+
+    Returns:
+        A boolean series
+    """
+
+    if countries is None:
+        countries = get_nuts_countries()
+
+    return regions.astype(str).str[:2].isin(countries)
+
+
+if __name__ == "__main__":
+
+    # A source that fails doesn't stop us fetching the others
+    failed = []
+    for name in REFERENCE_SOURCES.keys():
+        try:
+            fetch_reference_snapshot(name)
+        except Exception as e:
+            logging.error(f"Couldn't fetch {name}: {e}")
+            failed.append(name)
+
+    if len(failed) > 0:
+        sys.exit(f"Failed to fetch: {', '.join(failed)}")
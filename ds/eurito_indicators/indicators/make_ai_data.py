@@ -6,119 +6,135 @@ import pickle
 
 import pandas as pd
 import numpy as np
-import tomotopy as tp
-from numpy.random import choice
-import yaml
 
 from eurito_indicators import PROJECT_DIR
 from eurito_indicators.getters.arxiv_getters import (
-    query_arxiv_institute,
     get_ai_results,
     get_article_categories,
     get_arxiv_tokenised,
     get_arxiv_w2v,
-    get_arxiv_articles,
     get_cluster_ids,
 )
-from eurito_indicators.indicators.make_article_indicators import (
-    reverse_geocode_table,
-    get_nuts_year_spec,
-    make_indicator,
-    country_filter,
-    make_table_aggr,
-)
-from eurito_indicators.pipeline.processing_utils import make_bins, make_lq
-from eurito_indicators.pipeline.topic_utils import make_topic_mix
 
 
-def make_ai_ids():
+def make_ai_ids(paper_results: dict = None, cats=None):
     """Function to extract AI Ids from the categories and expanded paper
     list files
+
+    Args:
+        paper_results: lookup between AI categories and expanded paper ids
+            (read from the `find_ai_papers` outputs if None)
+        cats: article - category table (read if None)
     """
-    ai = get_ai_results()
+    if paper_results is None:
+        paper_results = get_ai_results()[0]
 
-    cats = get_article_categories()
+    if cats is None:
+        cats = get_article_categories()
 
     ai_cats = set(["cs.AI", "cs.NE", "stat.ML", "cs.LG"])
 
     ai_core_papers = set(cats.loc[cats["category_id"].isin(ai_cats)]["article_id"])
 
-    ai_papers_expanded = set(chain(*ai[0].values()))
+    ai_papers_expanded = set(chain(*paper_results.values()))
 
     all_ai_ids = ai_core_papers.union(ai_papers_expanded)
 
     return all_ai_ids
 
 
-#if __name__ == "__main__":
-logging.info("Reading data")
-arts = get_arxiv_articles()
-ai_ids = make_ai_ids()
-tok = get_arxiv_tokenised()
-arx_w2v = get_arxiv_w2v()
-covid_ids = get_cluster_ids()
-
-# Get dict with tokenised AI abstracts
-ai_tok = {k: v for k, v in tok.items() if (k in ai_ids) & (len(v) > 0)}
-ai_tok_text = list(ai_tok.values())
-
-logging.info("Train and fit topic model")
-v = 150
-mdl = tp.LDAModel(k=v, seed=123)
-
-for t in ai_tok_text:
-    mdl.add_doc(t)
-
-for i in range(0, 150, 10):
-    mdl.train(10)
-    print("Iteration: {}\tLog-likelihood: {}".format(i, mdl.ll_per_word))
-
-for k in range(mdl.k):
-    # print('Top 10 words of topic #{}'.format(k))
-    print(mdl.get_topic_words(k, top_n=10))
-
-topic_names = [[x[0] for x in mdl.get_topic_words(k, top_n=5)] for k in range(v)]
-
-logging.info("Identify deep learning papers")
-sims = (
-    pd.DataFrame(
-        [
-            np.mean(
-                arx_w2v.wv.similarity(
-                    [el for el in t if el in arx_w2v.wv], "artificial_neural"
-                )
-            )
-            for t in topic_names
-        ],
-        index=["_".join(t) for t in topic_names],
+def find_dl_papers(
+    ai_tok: dict,
+    w2v,
+    num_topics: int = 150,
+    reference_term: str = "artificial_neural",
+    exclude_topics: list = None,
+) -> set:
+    """Finds deep learning papers with a topic model of AI abstracts: papers
+    with high weights in topics whose top words are close to a reference term
+
+    Args:
+        ai_tok: lookup between AI article ids and token lists
+        w2v: word vectors (from `get_arxiv_w2v`)
+        num_topics: number of topics
+        reference_term: term that represents deep learning
+        exclude_topics: topics to ignore (named by their top 5 words,
+            network_neuron_neural_brain_learning if None)
+
+    Returns:
+        The ids of deep learning papers
+    """
+    import tomotopy as tp
+
+    from eurito_indicators.pipeline.topic_utils import make_topic_mix
+
+    if exclude_topics is None:
+        exclude_topics = ["network_neuron_neural_brain_learning"]
+
+    logging.info("Train and fit topic model")
+    mdl = tp.LDAModel(k=num_topics, seed=123)
+
+    for t in ai_tok.values():
+        mdl.add_doc(t)
+
+    for i in range(0, 150, 10):
+        mdl.train(10)
+        logging.info("Iteration: {}\tLog-likelihood: {}".format(i, mdl.ll_per_word))
+
+    topic_names = [
+        [x[0] for x in mdl.get_topic_words(k, top_n=5)] for k in range(num_topics)
+    ]
+
+    logging.info("Identify deep learning papers")
+    sims = (
+        pd.DataFrame(
+            [
+                np.mean(w2v.similarity([el for el in t if el in w2v], reference_term))
+                for t in topic_names
+            ],
+            index=["_".join(t) for t in topic_names],
+        )
+        .reset_index(drop=False)
+        .rename(columns={0: "mean_similarity"})
     )
-    .reset_index(drop=False)
-    .rename(columns={0: "mean_similarity"})
-)
 
-dl_topics = sims.loc[
-    sims["mean_similarity"]
-    > sims["mean_similarity"].mean() + 1.5 * (sims["mean_similarity"].std())
-]["index"].tolist()
-
-dl_topics.remove("network_neuron_neural_brain_learning")
-logging.info(dl_topics)
-
-topic_mix = make_topic_mix(mdl, doc_indices=ai_tok.keys(), num_topics=150)
-
-# Identify AI papers
-dl_paper = set(
-    chain(
-        *[
-            topic_mix.loc[
-                topic_mix[t] > (topic_mix[t].mean() + topic_mix[t].std() * 2)
-            ].index
-            for t in dl_topics
-        ]
+    dl_topics = sims.loc[
+        sims["mean_similarity"]
+        > sims["mean_similarity"].mean() + 1.5 * (sims["mean_similarity"].std())
+    ]["index"].tolist()
+
+    dl_topics = [t for t in dl_topics if t not in exclude_topics]
+    logging.info(dl_topics)
+
+    topic_mix = make_topic_mix(mdl, doc_indices=ai_tok.keys(), num_topics=num_topics)
+
+    # Identify AI papers
+    return set(
+        chain(
+            *[
+                topic_mix.loc[
+                    topic_mix[t] > (topic_mix[t].mean() + topic_mix[t].std() * 2)
+                ].index
+                for t in dl_topics
+            ]
+        )
     )
-)
 
-with open(f"{PROJECT_DIR}/inputs/data/ai_lookups.p",'wb') as outfile:
-    outputs = [ai_ids, dl_paper, covid_ids]
-    
-    pickle.dump(outputs,outfile)
+
+if __name__ == "__main__":
+
+    logging.info("Reading data")
+    ai_ids = make_ai_ids()
+    tok = get_arxiv_tokenised()
+    arx_w2v = get_arxiv_w2v()
+    covid_ids = get_cluster_ids()
+
+    # Get dict with tokenised AI abstracts
+    ai_tok = {k: v for k, v in tok.items() if (k in ai_ids) & (len(v) > 0)}
+
+    dl_paper = find_dl_papers(ai_tok, arx_w2v)
+
+    with open(f"{PROJECT_DIR}/inputs/data/ai_lookups.p", "wb") as outfile:
+        outputs = [ai_ids, dl_paper, covid_ids]
+
+        pickle.dump(outputs, outfile)
@@ -1,11 +1,8 @@
 import logging
 from itertools import chain
 
-import altair as alt
-import geopandas as gp
 import numpy as np
 import pandas as pd
-import tomotopy as tp
 import yaml
 
 from eurito_indicators import PROJECT_DIR
@@ -44,6 +41,8 @@ def make_ai_ids():
 
 
 def make_institutes_rev_geocoded():
+    import geopandas as gp
+
     inst = (
         query_arxiv_institute()
         .query("is_multinational==False")
@@ -63,7 +62,7 @@ def make_institutes_rev_geocoded():
     )
     inst_nuts_geo.crs = 4326
 
-    inst_table = gp.sjoin(inst_nuts_geo, all_nuts, op="within")
+    inst_table = gp.sjoin(inst_nuts_geo, all_nuts, predicate="within")
     inst_nuts_lookup = (
         inst_table.pivot_table(
             index="grid_id", columns="LEVL_CODE", values="NUTS_ID", aggfunc="max"
@@ -324,6 +323,10 @@ def specialisation_indicator(inst, variable, nuts_level, years=range(2015, 2021)
 
 
 if __name__ == "__main__":
+
+    import altair as alt
+    import tomotopy as tp
+
     logging.info("Getting data")
 
     arts = get_arxiv_articles()
@@ -356,8 +359,8 @@ if __name__ == "__main__":
         pd.DataFrame(
             [
                 np.mean(
-                    arx_w2v.wv.similarity(
-                        [el for el in t if el in arx_w2v.wv], "artificial_neural"
+                    arx_w2v.similarity(
+                        [el for el in t if el in arx_w2v], "artificial_neural"
                     )
                 )
                 for t in topic_names
@@ -6,14 +6,13 @@ import logging
 import os
 import pickle
 import re
+from functools import lru_cache
 from io import BytesIO
 from zipfile import ZipFile
 
-import geopandas as gp
 import numpy as np
 import pandas as pd
 import requests
-import yaml
 
 from eurito_indicators import PROJECT_DIR
 from eurito_indicators.getters.arxiv_getters import (
@@ -21,26 +20,31 @@ from eurito_indicators.getters.arxiv_getters import (
     get_cluster_ids,
     query_arxiv_institute,
 )
+from eurito_indicators.getters.reference_data import get_nuts_countries, in_countries
+from eurito_indicators.pipeline.article_store import ArticleStore
 from eurito_indicators.pipeline.processing_utils import make_lq
+from eurito_indicators.utils.instrumentation import instrument
 
 # PATHS ETC
 NUTS_SHAPE_PATH = f"{PROJECT_DIR}/inputs/data/nuts"
 
-arx_clusters = get_cluster_ids()
-
 nuts_lookup = {
     "2010": set(range(2010, 2013)),
     "2013": set(range(2013, 2016)),
     "2016": set(range(2016, 2021)),
     "2021": [2021],
 }
+NUTS_VERSIONS = list(nuts_lookup.keys())
 
 # FUNCTIONS
 
+@lru_cache()
 def make_clean_clusters():
     '''Creates a lookup between data variable names and clean variable names
     '''
 
+    arx_clusters = get_cluster_ids()
+
     CLEAN_CLUSTERS = {
     n: " ".join([x.capitalize() for x in re.sub("_", " ", n).split(" ")])
     for n in set(arx_clusters.values())}
@@ -54,10 +58,6 @@ def make_clean_clusters():
     return CLEAN_CLUSTERS,AI_CLUSTERS
 
 
-
-CLEAN_CLUSTERS, AI_CLUSTERS = make_clean_clusters()
-
-
 def fetch_nuts_shape():
     """Fetch NUTS shapes"""
 
@@ -70,8 +70,10 @@ def fetch_nuts_shape():
         ZipFile(BytesIO(content)).extractall(f"{NUTS_SHAPE_PATH}/{nuts_version}")
 
 
+@instrument()
 def reverse_geocode_table(table, nuts_version,vars_to_keep=['article_source','cluster','artificial_intelligence','deep_learning','ai_covid']):
     """Reverse geocodes a table of articles taking into account what nuts version was available when it was published"""
+    import geopandas as gp
 
     # Filter the table by year
     table_in_year = table.loc[
@@ -90,7 +92,7 @@ def reverse_geocode_table(table, nuts_version,vars_to_keep=['article_source','cl
     table_coord.crs = 4326
 
     logging.info("spatial join")
-    table_geo = gp.sjoin(table_coord, nuts_geoshape, op="within")[
+    table_geo = gp.sjoin(table_coord, nuts_geoshape, predicate="within")[
         ["article_id", "year", "NUTS_ID", "LEVL_CODE"]+vars_to_keep
     ]
 
@@ -127,23 +129,14 @@ def get_nuts_year_spec(year):
 
 def fetch_countries():
     """Fetch list of countries"""
-    country_yaml = yaml.safe_load(
-        requests.get(
-            "https://raw.githubusercontent.com/nestauk/svizzle_atlas_distro/cd24cad6af8dde3bc469ab7d4ae5f24df055e4b2/NUTS/countries_by_year.yaml"
-        ).text
-    )
 
-    return set([val for el in [x for x in country_yaml.values()] for val in el])
+    return set(get_nuts_countries())
 
 
 def country_filter(table, reg="region_id"):
     """Removes any categories which are not in the country categories"""
 
-    country_focus = fetch_countries()
-
-    table_ = table.loc[table[reg].apply(lambda x: x[:2] in country_focus)].reset_index(
-        drop=True
-    )
+    table_ = table.loc[in_countries(table[reg])].reset_index(drop=True)
 
     return table_
 
@@ -153,10 +146,19 @@ def get_ai_outputs():
     
     with open(f"{PROJECT_DIR}/inputs/data/ai_lookups.p","rb") as infile:
         ai_ids = pickle.load(infile)
-        
+
+    return make_ai_outputs(ai_ids)
+
+
+def make_ai_outputs(ai_ids):
+    """Creates a lookup between AI categories and article ids from the AI, DL and
+    covid article lists
+    """
+
     return {'ai':ai_ids[0],'dl':ai_ids[1],'ai_covid':set(ai_ids[0]) & set(ai_ids[2])}
 
 
+@instrument()
 def make_indicator(
     table,
     category,
@@ -224,6 +226,8 @@ def make_schema(indicator_type, category, suffix="count"):
     """Adds specific fields to the schema depending on the type of indicator
     we are constructing
     """
+    CLEAN_CLUSTERS, AI_CLUSTERS = make_clean_clusters()
+
     if indicator_type == "article_sources":
         schema = fetch_template_schema()
         #schema["date"] = str(datetime.date.today())
@@ -301,54 +305,67 @@ def make_schema(indicator_type, category, suffix="count"):
     return schema
 
 
-if __name__ == "__main__":
-    if os.path.exists(NUTS_SHAPE_PATH) is False:
-        fetch_nuts_shape()
+@instrument()
+def label_institutes(inst, arts, arx_clusters, ai_outputs):
+    """Labels the institute - article table with the year, source, cluster and
+    AI flags of each article
 
-    logging.info("Reading institute data")
-    inst = (
-        query_arxiv_institute()
-        .query("is_multinational==False")
-        .drop(
-            axis=1, labels=["nuts_level1_code", "nuts_level2_code", "nuts_level3_code"]
-        )
+    Args:
+        inst: institute - article table (from `query_arxiv_institute`)
+        arts: articles (from `get_arxiv_articles`)
+        arx_clusters: lookup between covid articles and their clusters
+        ai_outputs: lookup between AI categories and article ids
+
+    Returns:
+        The labelled table for articles published between 2000 and 2021
+    """
+    inst = inst.query("is_multinational==False").drop(
+        axis=1, labels=["nuts_level1_code", "nuts_level2_code", "nuts_level3_code"]
     )
-    logging.info("Reading articles")
-    arts = get_arxiv_articles()
 
     arts_sel = (
         arts.dropna(axis=0, subset=["month_year"])
-        .assign(year=lambda df: [int(x.year) for x in df["month_year"]])
+        .assign(year=lambda df: df["month_year"].dt.year)
         .query("year>=2000")
         .query("year <= 2021")
         .reset_index(drop=True)
     )
 
-    arts_lookup = arts_sel.set_index("article_id")[["article_source", "year"]].to_dict()
-    # -
-
-    ai_outputs = get_ai_outputs()
-
-    # +
-    # Label each article with its year, source and cluster
-    inst["year"], inst["article_source"] = [
-        inst["article_id"].map(arts_lookup[var]) for var in ["year", "article_source"]
-    ]
-    inst["cluster"] = inst["article_id"].map(arx_clusters)
-    inst['artificial_intelligence'] = inst['article_id'].isin(ai_outputs['ai'])
-    inst['deep_learning'] = inst['article_id'].isin(ai_outputs['dl'])
-    inst['ai_covid'] = inst['article_id'].isin(ai_outputs['ai_covid'])
+    # Label each article with its year, source, cluster and AI flags
+    store = ArticleStore.from_table(arts_sel, ["year", "article_source"])
+    store.add("cluster", arx_clusters)
+    for var, ai_output in zip(
+        ["artificial_intelligence", "deep_learning", "ai_covid"], ["ai", "dl", "ai_covid"]
+    ):
+        store.add_flag(var, ai_outputs[ai_output])
 
+    inst = store.join(
+        inst,
+        [
+            "year",
+            "article_source",
+            "cluster",
+            "artificial_intelligence",
+            "deep_learning",
+            "ai_covid",
+        ],
+    )
 
     inst = inst.dropna(axis=0, subset=["year"]).reset_index(drop=True)
     inst["year"] = inst["year"].astype(int)
 
-    # Reverse geocode
-    all_tables_geo = [
-        reverse_geocode_table(inst, nuts) for nuts in ["2010", "2013", "2016", "2021"]
-    ]
+    return inst
+
+
+@instrument()
+def make_article_indicators(all_tables_geo):
+    """Makes the article source, cluster and AI indicators
+
+    Args:
+        all_tables_geo: reverse geocoded institute tables (one per NUTS version)
+    """
+    CLEAN_CLUSTERS, _ = make_clean_clusters()
 
-    # +
     logging.info("Making article - category counts")
     # Combine all tables into a single one and split by category
     all_tables_source = pd.concat(
@@ -432,3 +449,22 @@ if __name__ == "__main__":
     make_indicator(
         table=all_tables_covid_ai, category="ai_covid", suffix="count", table_type="ai_counts", categories=["ai_covid"])
 
+
+if __name__ == "__main__":
+    arx_clusters = get_cluster_ids()
+
+    if os.path.exists(NUTS_SHAPE_PATH) is False:
+        fetch_nuts_shape()
+
+    logging.info("Reading institute data")
+    inst = query_arxiv_institute()
+
+    logging.info("Reading articles")
+    arts = get_arxiv_articles(text=False)
+
+    inst = label_institutes(inst, arts, arx_clusters, get_ai_outputs())
+
+    # Reverse geocode
+    all_tables_geo = [reverse_geocode_table(inst, nuts) for nuts in NUTS_VERSIONS]
+
+    make_article_indicators(all_tables_geo)
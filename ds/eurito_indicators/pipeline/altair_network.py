@@ -1,8 +1,9 @@
 # Plot network data using altair
 import pandas as pd
-import altair as alt
 import networkx as nx
 
+from eurito_indicators.pipeline.network_layout import get_layout
+
 
 def node_layer(
     node_df,
@@ -15,6 +16,7 @@ def node_layer(
     **kwargs
 ):
     """Creates node_layer in the plot"""
+    import altair as alt
 
     x_range = [min(node_df['x'])-0.03, max(node_df['x'])+0.03]
     y_range = [min(node_df['y'])-0.03, max(node_df['y'])+0.03]
@@ -105,6 +107,8 @@ def calculate_edge_positions(graph, node_pos_lookup, edge_scale):
 
 def edge_layer(edges_pos_df, weighted, edge_opacity, **kwargs):
     """Creates edge layer in the plot"""
+    import altair as alt
+
     edge_chart = (
         alt.Chart(edges_pos_df)
         .mark_line()
@@ -143,14 +147,21 @@ def plot_altair_network(
         show_neighbours (bool): if we want neighbours to be extracted and showed in a tooltip
         edge_scale (float): scale for weight value
         edge_opacity (float): weight opacity
+        If node_df doesn't have x and y positions we calculate them with a
+        (cached) layout of the graph
     """
 
     # Node chart
     node_df_ = node_df.copy()
 
+    if ("x" not in node_df_.columns) or ("y" not in node_df_.columns):
+        pos = get_layout(graph)
+        node_df_["x"] = node_df_["node"].map(lambda n: pos[n][0])
+        node_df_["y"] = node_df_["node"].map(lambda n: pos[n][1])
+
     # Make node name - label lookup
     node_label_lookup = node_df_.set_index("node")["node_name"].to_dict()
-    node_pos_lookup = {r["node"]: (r["x"], r["y"]) for _id, r in node_df_.iterrows()}
+    node_pos_lookup = dict(zip(node_df_["node"], zip(node_df_["x"], node_df_["y"])))
 
     # Plot nodes
     node_plot = node_layer(
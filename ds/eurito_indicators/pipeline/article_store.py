@@ -0,0 +1,139 @@
+# A store of article attributes aligned by dense integer article codes, so that
+# labelling tables with article attributes is array indexing
+
+import numpy as np
+import pandas as pd
+
+
+class ArticleStore:
+    """Article attributes stored as arrays aligned with a dense integer code
+    (the position of each article id in the store)
+
+    Args:
+        article_ids: unique article ids
+    """
+
+    def __init__(self, article_ids):
+
+        self.ids = pd.Index(article_ids, name="article_id")
+
+        if self.ids.is_unique is False:
+            raise ValueError("Article ids in the store must be unique")
+
+        self.attributes = {}
+        self.fill_values = {}
+
+    @classmethod
+    def from_table(cls, table: pd.DataFrame, columns: list, id_var="article_id"):
+        """Creates a store from an article table
+
+        Args:
+            table: article table (one row per article)
+            columns: columns to store
+            id_var: variable with the article ids
+        """
+
+        store = cls(table[id_var])
+        for col in columns:
+            store.add(col, table[col].array)
+
+        return store
+
+    def __len__(self):
+        return len(self.ids)
+
+    def codes(self, article_ids) -> np.ndarray:
+        """Codes for a list of article ids (-1 for articles not in the store)"""
+
+        return self.ids.get_indexer(article_ids)
+
+    def mask(self, article_ids) -> np.ndarray:
+        """Boolean mask over the store for the articles in a set of ids"""
+
+        return self.ids.isin(article_ids)
+
+    def add(self, name: str, values, fill_value=None):
+        """Adds an attribute to the store
+
+        Args:
+            name: attribute name
+            values: an array aligned with the store or a lookup (dict or series)
+                between article ids and values
+            fill_value: value for articles without the attribute (missing if None)
+        """
+
+        if isinstance(values, dict):
+            values = pd.Series(values)
+
+        if isinstance(values, pd.Series):
+            values = values.reindex(self.ids)
+            if fill_value is not None:
+                values = values.fillna(fill_value)
+        elif len(values) != len(self):
+            raise ValueError(
+                f"{name} has {len(values)} values for {len(self)} articles"
+            )
+
+        self.attributes[name] = pd.Series(values).array
+        self.fill_values[name] = fill_value
+
+    def add_flag(self, name: str, article_ids):
+        """Adds a boolean attribute flagging the articles in a set of ids"""
+
+        self.attributes[name] = self.mask(article_ids)
+        self.fill_values[name] = False
+
+    def gather(self, name: str, codes: np.ndarray):
+        """Gets the values of an attribute for an array of codes
+
+        Args:
+            name: attribute name
+            codes: article codes (-1 for articles not in the store)
+
+        Returns:
+            An array with the values (missing or the fill value for code -1)
+        """
+
+        return pd.api.extensions.take(
+            self.attributes[name],
+            codes,
+            allow_fill=True,
+            fill_value=self.fill_values[name],
+        )
+
+    def lookup(self, article_ids: pd.Series, names) -> pd.DataFrame:
+        """Gets attributes for a series of article ids
+
+        Args:
+            article_ids: article ids (e.g. the article_id column of a table)
+            names: attribute name or list of attribute names
+
+        Returns:
+            A series (for a single name) or table aligned with article_ids
+        """
+
+        codes = self.codes(article_ids)
+
+        if isinstance(names, str):
+            return pd.Series(
+                self.gather(names, codes), index=article_ids.index, name=names
+            )
+
+        return pd.DataFrame(
+            {name: self.gather(name, codes) for name in names},
+            index=article_ids.index,
+        )
+
+    def join(self, table: pd.DataFrame, names: list, id_var="article_id"):
+        """Adds store attributes to a table with article ids
+
+        Args:
+            table: table to label
+            names: attributes to add
+            id_var: variable with the article ids in the table
+
+        Returns:
+            The table with the attributes as new columns
+        """
+
+        return table.assign(**self.lookup(table[id_var], names))
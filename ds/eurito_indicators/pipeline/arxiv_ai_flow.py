@@ -0,0 +1,189 @@
+# Metaflow flow for the arXiv AI indicators: tokenisation -> word2vec -> AI paper
+# search (one branch per AI category) -> deep learning papers -> article
+# indicators (one reverse geocoding branch per NUTS version). Intermediate
+# outputs are passed between steps as flow artifacts.
+#
+# Usage:
+#   python eurito_indicators/pipeline/arxiv_ai_flow.py run [--test True]
+
+import os
+
+# Loads .env.shared, which sets the project's metaflow profile
+from eurito_indicators import config
+
+# The flow runs on the local runtime even where metaflow is configured for AWS:
+# the profile is dropped (it may not exist on this machine) and the local
+# datastore and metadata are forced
+os.environ.pop("METAFLOW_PROFILE", None)
+os.environ["METAFLOW_DEFAULT_DATASTORE"] = "local"
+os.environ["METAFLOW_DEFAULT_METADATA"] = "local"
+
+from metaflow import FlowSpec, Parameter, step
+
+from eurito_indicators.getters.arxiv_getters import (
+    TEXT_COLUMNS,
+    get_article_categories,
+    get_arxiv_articles,
+    get_cluster_ids,
+    query_arxiv_institute,
+)
+from eurito_indicators.indicators.make_ai_data import find_dl_papers, make_ai_ids
+from eurito_indicators.indicators.make_articles_final import (
+    NUTS_SHAPE_PATH,
+    NUTS_VERSIONS,
+    fetch_nuts_shape,
+    label_institutes,
+    make_ai_outputs,
+    make_article_indicators,
+    reverse_geocode_table,
+)
+from eurito_indicators.pipeline.arxiv_tokenise import tokenise_articles
+from eurito_indicators.pipeline.arxiv_train_w2v import fit_word2vec, normalise_vectors
+from eurito_indicators.pipeline.find_ai_papers import (
+    AI_CATEGORIES,
+    find_category_papers,
+    make_ai_corpus,
+)
+
+
+class ArxivAIFlow(FlowSpec):
+    test = Parameter(
+        "test",
+        help="Runs on a sample of 10000 articles if True",
+        default=False,
+        type=bool,
+    )
+    min_count = Parameter(
+        "min_count",
+        help="Minimum number of occurrences of a word in the word2vec vocabulary",
+        default=config["finding_ai"]["min_count"],
+        type=int,
+    )
+    num_topics = Parameter(
+        "num_topics",
+        help="Number of topics in the model used to find deep learning papers",
+        default=150,
+        type=int,
+    )
+
+    @step
+    def start(self):
+        """Starts the flow."""
+        self.next(self.tokenise)
+
+    @step
+    def tokenise(self):
+        """Tokenises arXiv abstracts."""
+        arts = get_arxiv_articles()
+        # All the articles are labelled later, so their metadata is kept
+        self.articles = arts.drop(columns=TEXT_COLUMNS)
+
+        if self.test:
+            arts = arts.sample(min(len(arts), 10000), random_state=123)
+
+        self.tokenised = tokenise_articles(arts)
+        self.abstracts = arts.loc[
+            arts["article_id"].isin(self.tokenised.keys()), ["article_id", "abstract"]
+        ]
+        self.next(self.train_w2v)
+
+    @step
+    def train_w2v(self):
+        """Trains word2vec on the tokenised abstracts and keeps its word vectors."""
+        self.w2v = normalise_vectors(fit_word2vec(self.tokenised, self.min_count))
+        self.next(self.prepare_ai_corpus)
+
+    @step
+    def prepare_ai_corpus(self):
+        """Combines abstracts, tokens and categories and splits by AI category."""
+        # Only the articles that were tokenised (a sample in test mode)
+        cats = get_article_categories()
+        self.cats = cats.loc[cats["article_id"].isin(self.tokenised.keys())]
+
+        self.text, self.arx, self.cat_sets = make_ai_corpus(
+            self.cats, self.abstracts, self.tokenised
+        )
+
+        self.ai_categories = list(AI_CATEGORIES.keys())
+        self.next(self.search_category, foreach="ai_categories")
+
+    @step
+    def search_category(self):
+        """Finds the papers in an AI category with its expanded vocabulary."""
+        self.category = self.input
+
+        self.vocabulary, self.paper_ids, self.term_counts = find_category_papers(
+            self.category, self.text, self.arx, self.cat_sets, self.cats, self.w2v
+        )
+        self.next(self.join_ai_papers)
+
+    @step
+    def join_ai_papers(self, inputs):
+        """Joins the papers and vocabularies of all AI categories."""
+        # cat_sets is not needed downstream and its sets of ids pickle differently
+        # in each branch, so metaflow would see conflicting values
+        self.merge_artifacts(
+            inputs,
+            exclude=["category", "vocabulary", "paper_ids", "term_counts", "cat_sets"],
+        )
+
+        self.ai_vocabularies = {i.category: i.vocabulary for i in inputs}
+        self.paper_results = {i.category: i.paper_ids for i in inputs}
+        self.term_counts = {i.category: i.term_counts for i in inputs}
+        self.next(self.find_deep_learning_papers)
+
+    @step
+    def find_deep_learning_papers(self):
+        """Finds deep learning papers within the AI papers."""
+        self.ai_ids = make_ai_ids(self.paper_results, self.cats)
+
+        ai_tok = {
+            k: v for k, v in self.tokenised.items() if (k in self.ai_ids) & (len(v) > 0)
+        }
+        self.dl_ids = find_dl_papers(ai_tok, self.w2v, self.num_topics)
+
+        self.arx_clusters = get_cluster_ids()
+        self.ai_outputs = make_ai_outputs([self.ai_ids, self.dl_ids, self.arx_clusters])
+        self.next(self.label_articles)
+
+    @step
+    def label_articles(self):
+        """Labels article institutes with article years, clusters and AI flags."""
+        self.inst = label_institutes(
+            query_arxiv_institute(),
+            self.articles,
+            self.arx_clusters,
+            self.ai_outputs,
+        )
+
+        if os.path.exists(NUTS_SHAPE_PATH) is False:
+            fetch_nuts_shape()
+
+        self.nuts_versions = NUTS_VERSIONS
+        self.next(self.reverse_geocode, foreach="nuts_versions")
+
+    @step
+    def reverse_geocode(self):
+        """Reverse geocodes the institutes of the articles published in the
+        years of a NUTS version."""
+        self.nuts_version = self.input
+        self.table_geo = reverse_geocode_table(self.inst, self.nuts_version)
+        self.next(self.make_indicators)
+
+    @step
+    def make_indicators(self, inputs):
+        """Makes and saves the article indicators."""
+        self.merge_artifacts(inputs, exclude=["nuts_version", "table_geo"])
+
+        tables_geo = {i.nuts_version: i.table_geo for i in inputs}
+        make_article_indicators([tables_geo[v] for v in NUTS_VERSIONS])
+        self.next(self.end)
+
+    @step
+    def end(self):
+        """Ends the flow."""
+        pass
+
+
+if __name__ == "__main__":
+    ArxivAIFlow()
@@ -3,54 +3,95 @@ import logging
 import os
 from itertools import chain
 
-import numpy as np
-
 from eurito_indicators import PROJECT_DIR
 from eurito_indicators.getters.arxiv_getters import get_arxiv_articles
 from eurito_indicators.pipeline.text_processing import make_engram, pre_process
 
 TOK_PATH = f"{PROJECT_DIR}/inputs/data/arxiv_tokenised.json"
+# The same tokens as a word2vec training corpus: one abstract per line
+CORPUS_PATH = f"{PROJECT_DIR}/inputs/data/arxiv_tokenised.txt"
 
 
-def arxiv_tokenise():
+def tokenise_articles(arxiv_articles) -> dict:
+    """Cleans, tokenises and extracts ngrams from the abstracts of arXiv articles
 
-    if os.path.exists(TOK_PATH) is True:
+    Args:
+        arxiv_articles: articles (from `get_arxiv_articles`)
 
-        logging.info("Already tokenised data")
+    Returns:
+        A lookup between article ids and token lists
+    """
 
-    else:
-        logging.info("Reading data")
-        arxiv_articles = get_arxiv_articles().query("article_source!='cord'")
+    arxiv_articles = arxiv_articles.query("article_source!='cord'")
+
+    # Remove papers without abstracts
+    arxiv_w_abst = arxiv_articles.dropna(axis=0, subset=["abstract"])
+
+    # Shuffle articles
+    arxiv_w_abst = arxiv_w_abst.sample(frac=1)
+
+    logging.info("Cleaning and tokenising")
+    arxiv_tokenised = [
+        pre_process(x, count=n) for n, x in enumerate(arxiv_w_abst["abstract"])
+    ]
+
+    half_arx = int(len(arxiv_tokenised) / 2)
+
+    logging.info("Making ngrams")
+    ngrammed = []
+
+    for mini_arx in [arxiv_tokenised[:half_arx], arxiv_tokenised[half_arx:]]:
+        logging.info("Extracting ngrams")
+        sample_ngram = make_engram(mini_arx, n=3)
+        ngrammed.append(sample_ngram)
 
-        # Remove papers without abstracts
-        arxiv_w_abst = arxiv_articles.dropna(axis=0, subset=["abstract"])
+    all_ngrams = chain(*ngrammed)
 
-        # Shuffle articles
-        arxiv_w_abst = arxiv_w_abst.sample(frac=1)
+    # Turn into dictionary mapping ids to token lists
+    return {i: t for i, t in zip(arxiv_w_abst["article_id"], all_ngrams)}
 
-        logging.info("Cleaning and tokenising")
-        arxiv_tokenised = [
-            pre_process(x, count=n) for n, x in enumerate(arxiv_w_abst["abstract"])
-        ]
 
-        half_arx = int(len(arxiv_tokenised) / 2)
+def write_corpus_file(arxiv_tokenised: dict, path: str = CORPUS_PATH):
+    """Writes token lists in gensim's LineSentence format (one abstract per line,
+    tokens separated by spaces) so that word2vec can stream them from disk
 
-        logging.info("Making ngrams")
-        ngrammed = []
+    Args:
+        arxiv_tokenised: lookup between article ids and token lists
+        path: path of the corpus file
+    """
 
-        for mini_arx in [arxiv_tokenised[:half_arx], arxiv_tokenised[half_arx:]]:
-            logging.info("Extracting ngrams")
-            sample_ngram = make_engram(mini_arx, n=3)
-            ngrammed.append(sample_ngram)
+    # Written to a temporary file first so that an interrupted write doesn't
+    # leave a truncated corpus behind
+    with open(f"{path}.tmp", "w") as outfile:
+        for tokens in arxiv_tokenised.values():
+            outfile.write(" ".join(tokens) + "\n")
+    os.replace(f"{path}.tmp", path)
 
-        all_ngrams = chain(*ngrammed)
 
-        # Turn into dictionary mapping ids to token lists
-        out = {i: t for i, t in zip(arxiv_w_abst["article_id"], all_ngrams)}
+def is_outdated(path: str, source: str = TOK_PATH) -> bool:
+    """Whether a file derived from the tokenised abstracts is missing or older
+    than them
+    """
+
+    return (os.path.exists(path) is False) or (
+        os.path.getmtime(path) < os.path.getmtime(source)
+    )
+
+
+def arxiv_tokenise():
+
+    if os.path.exists(TOK_PATH) is True:
+
+        logging.info("Already tokenised data")
+
+    else:
+        logging.info("Reading data")
+        out = tokenise_articles(get_arxiv_articles())
 
         logging.info("Saving")
         with open(TOK_PATH, "w") as outfile:
             json.dump(out, outfile)
+        write_corpus_file(out)
 
 
 if __name__ == "__main__":
@@ -1,33 +1,94 @@
 import logging
 import os
-import pickle
-from numpy.random import choice
 
-from gensim.models import Word2Vec
+from gensim.models import KeyedVectors, Word2Vec
 
 from eurito_indicators import config, PROJECT_DIR
 from eurito_indicators.getters.arxiv_getters import get_arxiv_tokenised
+from eurito_indicators.pipeline.arxiv_tokenise import (
+    CORPUS_PATH,
+    is_outdated,
+    write_corpus_file,
+)
 
 min_count = config["finding_ai"]["min_count"]
-MOD_PATH = f"{PROJECT_DIR}/outputs/models/arxiv_w2v.p"
+MOD_PATH = f"{PROJECT_DIR}/outputs/models/arxiv_w2v.model"
+KV_PATH = f"{PROJECT_DIR}/outputs/models/arxiv_w2v.kv"
+
+# gensim trains with 3 workers by default
+WORKERS = os.cpu_count() or 3
+
+
+def fit_word2vec(
+    arxiv_tokenised: dict, min_count: int = min_count, workers: int = WORKERS
+) -> Word2Vec:
+    """Trains word2vec on tokenised arXiv abstracts
+
+    Args:
+        arxiv_tokenised: lookup between article ids and token lists
+        min_count: minimum number of occurrences of a word in the vocabulary
+        workers: number of training threads
+    """
+
+    logging.info("Training model")
+    # The values view can be iterated over once per epoch without copying the lists
+    return Word2Vec(arxiv_tokenised.values(), min_count=min_count, workers=workers)
+
+
+def fit_word2vec_file(
+    corpus_path: str = CORPUS_PATH, min_count: int = min_count, workers: int = WORKERS
+) -> Word2Vec:
+    """Trains word2vec streaming the abstracts from a corpus file (see
+    `write_corpus_file`), so they are never all held in memory. Each worker
+    reads its own chunk of the file, which scales better with cores than
+    training from python lists
+
+    Args:
+        corpus_path: path of the corpus file
+        min_count: minimum number of occurrences of a word in the vocabulary
+        workers: number of training threads
+    """
+
+    logging.info(f"Training model with {workers} workers")
+    return Word2Vec(corpus_file=corpus_path, min_count=min_count, workers=workers)
+
+
+def normalise_vectors(w2v: Word2Vec) -> KeyedVectors:
+    """Scales the word vectors of a model to unit length (in place), so that
+    similarities don't need to compute norms. The model can't be trained further
+
+    Returns:
+        The normalised word vectors
+    """
+
+    w2v.wv.unit_normalize_all()
+    return w2v.wv
+
+
+def save_word2vec(w2v: Word2Vec):
+    """Saves the trainable model and its normalised word vectors in gensim's
+    format. The vectors are saved in their own .npy files so that
+    `get_arxiv_w2v` can memory-map them
+    """
+
+    w2v.save(MOD_PATH)
+    normalise_vectors(w2v).save(KV_PATH, separately=["vectors", "norms"])
 
 
 def train_word2vec():
 
-    if os.path.exists(MOD_PATH) is True:
+    if is_outdated(KV_PATH) is False:
         logging.info("Already trained model")
     else:
-        logging.info("loading and processing data")
-        arxiv_tokenised = get_arxiv_tokenised()
-
-        tok = list(arxiv_tokenised.values())
+        # The corpus is rebuilt if the abstracts were tokenised again
+        if is_outdated(CORPUS_PATH) is True:
+            logging.info("Making corpus file")
+            write_corpus_file(get_arxiv_tokenised())
 
-        logging.info("Training model")
-        w2v = Word2Vec(tok, min_count=min_count)
+        w2v = fit_word2vec_file()
 
-        # Save model
-        with open(MOD_PATH, "wb") as outfile:
-            pickle.dump(w2v, outfile)
+        logging.info("Saving model")
+        save_word2vec(w2v)
 
 
 if __name__ == "__main__":
@@ -12,9 +12,14 @@ from eurito_indicators.getters.cordis_getters import (
 )
 from eurito_indicators.pipeline.clustering_naming import (
     build_cluster_graph,
-    check_community_consensus,
-    extract_name_communities,
+    community_consensus_shares,
     make_doc_comm_lookup,
+    name_communities,
+)
+from eurito_indicators.pipeline.community_detection import (
+    best_partition,
+    make_comm_assignments,
+    sweep_communities,
 )
 from eurito_indicators.pipeline.processing_utils import (
     filter_by_length,
@@ -46,17 +51,17 @@ if __name__ == "__main__":
     logging.info("Building clusters")
     cluster_graph, index_lookup = build_cluster_graph(covid_vectors, clustering_options)
 
+    logging.info("Detecting communities")
+    partitions, nodes, partition_stats = sweep_communities(
+        cluster_graph, resolutions=[0.65, 0.8], n_seeds=20
+    )
+    logging.info(partition_stats)
+
     logging.info("Checking clusters")
     comms = [
-        make_doc_comm_lookup(
-            extract_name_communities(
-                cluster_graph=cluster_graph,
-                resolution=0.65,
-                index_lookup=index_lookup,
-                text_table=projs,
-            )[0]
-        )
-        for _ in range(20)
+        make_doc_comm_lookup(make_comm_assignments(labels, nodes, index_lookup))
+        for (res, _), labels in partitions.items()
+        if res == 0.65
     ]
 
     covid_project_ids = list(
@@ -66,33 +71,33 @@ if __name__ == "__main__":
             text_var="objective",
         )["project_id"]
     )
-    cons_df = check_community_consensus(covid_project_ids, comms)
-
-    has_match = cons_df.sum(axis=1) > 1
+    doc_consensus_means = (
+        community_consensus_shares(covid_project_ids, comms, min_matches=1)
+        .dropna(axis=0, subset=["consensus_share"])
+        .reset_index(drop=False)
+        .assign(project_type=lambda df: df["doc_id"].map(covid_level_lookup))
+    )
 
-    cons_df.loc[has_match > 0].mean(axis=1).plot.hist()
+    doc_consensus_means["consensus_share"].plot.hist()
     save_matplot("consensus_histogram")
 
-    logging.info(cons_df.loc[has_match].mean(axis=1).mean())
-
-    doc_consensus_means = (
-        cons_df.loc[has_match]
-        .stack()
-        .reset_index(drop=False)
-        .groupby("doc1")[0]
-        .mean()
-        .reset_index(name="consensus_share")
-        .assign(project_type=lambda df: df["doc1"].map(covid_level_lookup))
+    logging.info(
+        np.average(
+            doc_consensus_means["consensus_share"],
+            weights=doc_consensus_means["n_pairs"],
+        )
     )
 
     doc_consensus_means.boxplot("consensus_share", by="project_type")
     save_matplot("consensus_boxplot")
 
-    project_clusters = extract_name_communities(
-        cluster_graph=cluster_graph,
-        resolution=0.8,
-        index_lookup=index_lookup,
-        text_table=projs,
+    # The final clustering is the best of the seeds at the chosen resolution
+    comm_assignments = make_comm_assignments(
+        best_partition(cluster_graph, partitions, 0.8), nodes, index_lookup
+    )
+    project_clusters = (
+        comm_assignments,
+        name_communities(comm_assignments, text_table=projs),
     )
 
     logging.info("Saving outputs")
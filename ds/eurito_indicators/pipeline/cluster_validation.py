@@ -0,0 +1,182 @@
+# Utilities to validate cluster assignments against a KMeans baseline
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+
+
+def encode_cluster_assignments(index, cluster_assignments: dict) -> np.ndarray:
+    """Encodes a lookup between clusters and documents as an array
+    Args:
+        index: document ids
+        cluster_assignments: lookup between clusters and document lists
+    Returns:
+        The position of each document's cluster in the lookup keys
+            (-1 for documents without a cluster)
+    """
+    doc_cluster_lookup = {
+        doc: n for n, docs in enumerate(cluster_assignments.values()) for doc in docs
+    }
+    return pd.Index(index).map(doc_cluster_lookup).fillna(-1).astype(int).to_numpy()
+
+
+def make_contingency_table(
+    ref_labels: np.ndarray, k_labels: np.ndarray, n_ref: int, n_k: int
+) -> np.ndarray:
+    """Counts documents by reference cluster (rows) and KMeans cluster (columns)"""
+
+    return np.bincount(ref_labels * n_k + k_labels, minlength=n_ref * n_k).reshape(
+        n_ref, n_k
+    )
+
+
+def cluster_cooccurrences(contingency: np.ndarray) -> np.ndarray:
+    """Counts the pairs of documents assigned to the same KMeans cluster
+    Args:
+        contingency: reference cluster x KMeans cluster counts
+    Returns:
+        A (symmetric) matrix with the number of document pairs from each pair of
+            reference clusters that KMeans puts together
+    """
+    co_occ = contingency @ contingency.T
+    # Remove pairs between a document and itself, and count within pairs once
+    np.fill_diagonal(co_occ, (co_occ.diagonal() - contingency.sum(axis=1)) // 2)
+
+    return co_occ
+
+
+def k_check_run(
+    vectors: pd.DataFrame,
+    cluster_assignments: dict,
+    n_clust: int = 25,
+    sample_size: int = 1000,
+    random_state: int = None,
+) -> list:
+    """Checks the robustness of a cluster assignment using a Kmeans baseline
+    Args:
+        vectors: docs to assess
+        cluster_assignments: lookup between clusters and document lists that we are validating
+        n_clust: number of clusters to use in the test
+        sample_size: number of documents used to count co-occurrences
+            (all documents if None)
+        random_state: random state for KMeans and the sample
+    Returns:
+        a df with number of cluster co-occurrences and a df with cluster distribution co-occurrences
+    """
+    clusters = list(cluster_assignments.keys())
+    ref_labels = encode_cluster_assignments(vectors.index, cluster_assignments)
+
+    logging.info("fitting cluster")
+    k_labels = KMeans(n_clusters=n_clust, random_state=random_state).fit_predict(
+        vectors
+    )
+    has_cluster = ref_labels >= 0
+
+    logging.info("Calculating co-occurrences")
+    in_sample = has_cluster.copy()
+    if sample_size is not None and sample_size < has_cluster.sum():
+        rng = np.random.default_rng(random_state)
+        in_sample[:] = False
+        in_sample[
+            rng.choice(np.flatnonzero(has_cluster), size=sample_size, replace=False)
+        ] = True
+
+    co_occ = cluster_cooccurrences(
+        make_contingency_table(
+            ref_labels[in_sample], k_labels[in_sample], len(clusters), n_clust
+        )
+    )
+    co_occ_df = (
+        pd.DataFrame(
+            co_occ,
+            index=pd.Index(clusters, name="c1"),
+            columns=pd.Index(clusters, name="c2"),
+        )
+        .stack()
+        .astype(float)
+    )
+
+    logging.info("Calculating share similarities")
+    contingency = make_contingency_table(
+        ref_labels[has_cluster], k_labels[has_cluster], len(clusters), n_clust
+    )
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        shares = contingency / contingency.sum(axis=1, keepdims=True)
+        corrs = np.corrcoef(shares)
+
+    c1, c2 = np.triu_indices(len(clusters), k=1)
+    corr_df = pd.DataFrame(
+        {"share_corr": corrs[c1, c2]},
+        index=pd.MultiIndex.from_arrays(
+            [np.array(clusters)[c1], np.array(clusters)[c2]], names=["c1", "c2"]
+        ),
+    )
+
+    return [co_occ_df, corr_df]
+
+
+_worker_state = {}
+
+
+def _init_worker(vectors, cluster_assignments, n_threads):
+    """Keeps the vectors and cluster assignments in a worker so they aren't sent
+    with each task, and caps the BLAS / OpenMP threads KMeans uses so that the
+    workers don't oversubscribe the cores
+    """
+    from threadpoolctl import threadpool_limits
+
+    _worker_state.update(
+        vectors=vectors,
+        cluster_assignments=cluster_assignments,
+        limits=threadpool_limits(limits=n_threads),
+    )
+
+
+def _k_check_task(args: tuple) -> list:
+    """Runs a KMeans check in a worker"""
+
+    n_clust, sample_size, seed = args
+
+    return k_check_run(
+        _worker_state["vectors"],
+        _worker_state["cluster_assignments"],
+        n_clust,
+        sample_size,
+        seed,
+    )
+
+
+def k_check_runs(
+    vectors: pd.DataFrame,
+    cluster_assignments: dict,
+    n_clusts: list,
+    sample_size: int = None,
+    n_jobs: int = None,
+) -> list:
+    """Runs several KMeans checks in parallel
+    Args:
+        vectors: docs to assess
+        cluster_assignments: lookup between clusters and document lists that we are validating
+        n_clusts: number of clusters to use in each run
+        sample_size: number of documents used to count co-occurrences
+            (all documents if None)
+        n_jobs: number of processes (all available cores if None). The cores
+            are split between them
+    Returns:
+        A list with the outputs of `k_check_run` for each run
+    """
+    tasks = [(n_clust, sample_size, seed) for seed, n_clust in enumerate(n_clusts)]
+    n_jobs = max(min(n_jobs or os.cpu_count() or 1, len(tasks)), 1)
+    n_threads = max((os.cpu_count() or 1) // n_jobs, 1)
+
+    with ProcessPoolExecutor(
+        max_workers=n_jobs,
+        initializer=_init_worker,
+        initargs=(vectors, cluster_assignments, n_threads),
+    ) as executor:
+        return list(executor.map(_k_check_task, tasks))
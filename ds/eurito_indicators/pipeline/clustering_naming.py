@@ -2,17 +2,18 @@
 
 import logging
 from collections import Counter
-from itertools import chain, combinations
+from functools import reduce
+from itertools import combinations
 
-import altair as alt
 import networkx as nx
 import numpy as np
 import pandas as pd
 from community import community_louvain
+from scipy import sparse
 from scipy.spatial.distance import cityblock, cosine
-from sklearn.cluster import KMeans
-from sklearn.feature_extraction.text import TfidfTransformer, TfidfVectorizer
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
 
+from eurito_indicators.pipeline.cluster_validation import k_check_run
 from eurito_indicators.pipeline.processing_utils import clean_table_names, make_lq
 
 
@@ -82,39 +83,124 @@ def build_cluster_graph(
     return cluster_graph, index_to_id_lookup
 
 
-def name_categories_tokenised(table, category, tokenised, top_terms=3000, top_words=10):
-    """Analyses a tokenised variable to extract salient terms"""
+def _identity(tokens):
+    """Returns pre-tokenised documents as they are"""
+    return tokens
 
-    docterm_matrix = (
-        table.groupby(category)[tokenised]
-        .apply(lambda x: pd.Series(chain(*list(x))).value_counts())
-        .unstack(level=1)
-        .fillna(0)
-    )
 
-    pop_words = (
-        docterm_matrix.sum().sort_values(ascending=False)[:top_terms].index.tolist()
+def make_category_term_matrix(
+    docs: pd.Series,
+    categories: pd.Series,
+    tokenised: bool = False,
+    **vectorizer_kwargs,
+) -> tuple:
+    """Counts terms by category
+    Args:
+        docs: documents (strings or lists of tokens)
+        categories: category of each document (documents without one are ignored)
+        tokenised: whether the documents are already tokenised
+        vectorizer_kwargs: parametres for the CountVectorizer used with raw text
+    Returns:
+        A sparse category-term matrix, the categories in its rows and the terms
+            in its columns
+    """
+    has_cat = np.asarray(pd.notnull(categories))
+    docs = np.asarray(docs, dtype=object)[has_cat]
+
+    if tokenised is True:
+        vectorizer = CountVectorizer(analyzer=_identity)
+    else:
+        vectorizer = CountVectorizer(**vectorizer_kwargs)
+    doc_term = vectorizer.fit_transform(docs)
+
+    cat_codes, cat_names = pd.factorize(np.asarray(categories)[has_cat], sort=True)
+    cat_indicator = sparse.csr_matrix(
+        (np.ones(len(cat_codes)), (cat_codes, np.arange(len(cat_codes)))),
+        shape=(len(cat_names), len(cat_codes)),
     )
 
-    docterm_popular = docterm_matrix[pop_words]
+    return cat_indicator @ doc_term, cat_names, vectorizer.get_feature_names_out()
+
+
+def top_terms_by_row(matrix, terms: np.ndarray, top_words: int) -> list:
+    """Extracts the terms with the highest values in each row of a sparse matrix
+    Args:
+        matrix: sparse (csr) matrix
+        terms: terms in the matrix columns
+        top_words: number of terms to extract
+    Returns:
+        A list with the top terms of each row, sorted by their value
+    """
+    top_terms = []
+
+    for row in range(matrix.shape[0]):
+        row_slice = slice(matrix.indptr[row], matrix.indptr[row + 1])
+        values, indices = matrix.data[row_slice], matrix.indices[row_slice]
+
+        if len(values) > top_words:
+            selected = np.argpartition(-values, top_words)[:top_words]
+        else:
+            selected = np.arange(len(values))
+        selected = selected[np.argsort(-values[selected], kind="stable")]
+
+        top_terms.append(terms[indices[selected]].tolist())
 
-    tf = TfidfTransformer()
+    return top_terms
 
-    tfidf_df = pd.DataFrame(
-        tf.fit_transform(docterm_popular).todense(),
-        columns=docterm_popular.columns,
-        index=docterm_popular.index,
+
+def salient_terms(
+    docs: pd.Series,
+    categories: pd.Series,
+    top_words: int = 10,
+    tokenised: bool = False,
+    max_features: int = None,
+    max_df: float = 1.0,
+    **vectorizer_kwargs,
+) -> dict:
+    """Extracts the terms with the highest tfidf in each category, treating all the
+    documents in a category as a single document. The matrices stay sparse.
+    Args:
+        docs: documents (strings or lists of tokens)
+        categories: category of each document
+        top_words: number of terms to extract for each category
+        tokenised: whether the documents are already tokenised
+        max_features: keep the most frequent terms (all if None)
+        max_df: ignore terms present in a higher share of categories
+        vectorizer_kwargs: parametres for the CountVectorizer used with raw text
+    Returns:
+        lookup between categories and lists of salient terms
+    """
+
+    cat_term, cat_names, terms = make_category_term_matrix(
+        docs, categories, tokenised=tokenised, **vectorizer_kwargs
     )
 
-    names = {}
+    doc_freq = np.asarray((cat_term > 0).sum(axis=0)).ravel()
+    max_doc_freq = max_df * cat_term.shape[0] if isinstance(max_df, float) else max_df
+    keep = np.flatnonzero(doc_freq <= max_doc_freq)
 
-    for _id, row in tfidf_df.iterrows():
-        salient = "_".join(
-            tfidf_df.loc[_id].sort_values(ascending=False)[:top_words].index.tolist()
-        )
-        names[_id] = salient
+    if max_features is not None and len(keep) > max_features:
+        term_totals = np.asarray(cat_term[:, keep].sum(axis=0)).ravel()
+        keep = keep[np.argsort(-term_totals, kind="stable")[:max_features]]
+
+    tfidf = TfidfTransformer().fit_transform(cat_term[:, keep]).tocsr()
+
+    return dict(zip(cat_names, top_terms_by_row(tfidf, terms[keep], top_words)))
 
-    return names
+
+def name_categories_tokenised(table, category, tokenised, top_terms=3000, top_words=10):
+    """Analyses a tokenised variable to extract salient terms"""
+
+    return {
+        cat: "_".join(terms)
+        for cat, terms in salient_terms(
+            table[tokenised],
+            table[category],
+            top_words=top_words,
+            tokenised=True,
+            max_features=top_terms,
+        ).items()
+    }
 
 
 def extract_name_communities(
@@ -139,20 +225,46 @@ def extract_name_communities(
     """
     logging.info("Extracting communities")
     comms = community_louvain.best_partition(cluster_graph, resolution=resolution)
-    ids_to_comms = {index_lookup[k]: v for k, v in comms.items()}
 
     comm_assignments = {
         comm: [index_lookup[k] for k, v in comms.items() if v == comm]
         for comm in set(comms.values())
     }
 
+    return comm_assignments, name_communities(
+        comm_assignments, text_table, doc_id=doc_id, doc_text=doc_text
+    )
+
+
+def name_communities(
+    comm_assignments: dict,
+    text_table: pd.DataFrame,
+    doc_id: str = "project_id",
+    doc_text: str = "title",
+) -> dict:
+    """Names communities with the salient terms in their documents
+    Args:
+        comm_assignments: lookup between communities and document ids
+        text_table: table with variable names
+        doc_id: document id in the text table
+        doc_text: text variable in the text table
+    Returns:
+        a lookup between community indices and names
+    """
     logging.info("Naming communities")
-    comm_names = name_category(
-        (text_table.assign(community=lambda df: df[doc_id].map(ids_to_comms))),
+
+    ids_to_comms = make_doc_comm_lookup(comm_assignments)
+
+    # Documents outside the communities are dropped and names are keyed by the
+    # original community ids so that they don't become floats or numpy scalars
+    names = name_category(
+        text_table.loc[text_table[doc_id].isin(set(ids_to_comms))].assign(
+            community=lambda df: df[doc_id].map(ids_to_comms)
+        ),
         text_var=doc_text,
     )
 
-    return comm_assignments, comm_names
+    return {comm: names[comm] for comm in comm_assignments if comm in names}
 
 
 def name_category(
@@ -173,28 +285,18 @@ def name_category(
         lookup between category indices and names
     """
 
-    grouped_names = text_table.groupby(cat_var)[text_var].apply(
-        lambda x: " ".join(list(x))
-    )
-
-    tfidf = TfidfVectorizer(
-        stop_words="english",
-        ngram_range=[2, 3],
-        max_features=max_features,
-        max_df=max_df,
-    )
-    tfidf_fit = tfidf.fit_transform(grouped_names)
-    tfidf_df = pd.DataFrame(tfidf_fit.todense(), columns=tfidf.vocabulary_)
-
-    cluster_salient = {}
-
-    for ind, _ in tfidf_df.iterrows():
-
-        salient_words = tfidf_df.loc[ind].sort_values(ascending=False).index[:top_words]
-
-        cluster_salient[ind] = "_".join(salient_words)
-
-    return cluster_salient
+    return {
+        cat: "_".join(terms)
+        for cat, terms in salient_terms(
+            text_table[text_var],
+            text_table[cat_var],
+            top_words=top_words,
+            max_features=max_features,
+            max_df=max_df,
+            stop_words="english",
+            ngram_range=(2, 3),
+        ).items()
+    }
 
 
 def make_distance_to_clusters(
@@ -242,6 +344,22 @@ def make_distance_to_clusters(
     return dist_df
 
 
+def encode_partitions(doc_ids: list, communities: list) -> np.ndarray:
+    """Encodes community assignments as integer arrays aligned with doc ids
+    Args:
+        doc_ids: list of doc ids
+        communities: list of lookups between doc ids and communities
+    Returns:
+        An array with a row per partition and a column per document.
+        Documents missing from a partition are encoded as -1
+    """
+    doc_series = pd.Series(doc_ids)
+
+    return np.array(
+        [pd.factorize(doc_series.map(comm))[0] for comm in communities], dtype=int
+    )
+
+
 def check_community_consensus(doc_ids: list, communities: list) -> pd.DataFrame:
     """Checks if project ids are allocated to the same communities by our approach
     Args:
@@ -251,21 +369,90 @@ def check_community_consensus(doc_ids: list, communities: list) -> pd.DataFrame:
         A dataframe with pairs of projects and the number of times they are assigned together
     """
 
-    id_consensus = []
+    labels = encode_partitions(doc_ids, communities)
+    doc_array = np.array(doc_ids, dtype=object)
 
-    doc_pairs = combinations(doc_ids, 2)
+    doc1, doc2 = np.triu_indices(len(doc_ids), k=1)
+    matches = (labels[:, doc1] == labels[:, doc2]) & (labels[:, doc1] >= 0)
 
-    for c in doc_pairs:
+    return pd.DataFrame(
+        matches.T.astype(int),
+        index=pd.MultiIndex.from_arrays(
+            [doc_array[doc1], doc_array[doc2]], names=["doc1", "doc2"]
+        ),
+    )
 
-        match = [1 if comm[c[0]] == comm[c[1]] else 0 for comm in communities]
 
-        matches_id = pd.Series(
-            list(c) + match, index=["doc1", "doc2"] + list(range(len(communities)))
-        )
-        id_consensus.append(matches_id)
+def community_consensus_shares(
+    doc_ids: list,
+    communities: list,
+    min_matches: int = 1,
+    chunk_size: int = 1000,
+) -> pd.DataFrame:
+    """Calculates, for each document, the share of partitions that assign it
+    to the same community as the documents it is usually clustered with.
+    Documents with the same assignments in all partitions are processed together,
+    and we count pair agreements with the product of the sparse community
+    indicator matrices in chunks, so we never build the table of all pairs.
+    Args:
+        doc_ids: list of doc ids
+        communities: list of community assignments
+        min_matches: minimum number of partitions where a pair has to be
+            together (exclusive) for it to count towards the consensus share
+        chunk_size: number of distinct assignment patterns to process at once
+    Returns:
+        A dataframe with the consensus share and number of pairs considered
+            for each document
+    """
+
+    labels = encode_partitions(doc_ids, communities)
+    n_parts = labels.shape[0]
+
+    signatures, inverse, sizes = np.unique(
+        labels.T, axis=0, return_inverse=True, return_counts=True
+    )
+    n_sigs = len(signatures)
+
+    # Stack the partitions' label indicators so that indicator @ indicator.T
+    # counts the partitions where two documents are together
+    n_comms = labels.max(axis=1) + 1
+    offsets = np.concatenate([[0], np.cumsum(n_comms)[:-1]])
+    sig_idx, part_idx = np.nonzero(signatures >= 0)
+    indicator = sparse.csr_matrix(
+        (
+            np.ones(len(sig_idx), dtype=np.int32),
+            (sig_idx, signatures[sig_idx, part_idx] + offsets[part_idx]),
+        ),
+        shape=(n_sigs, n_comms.sum()),
+    )
+    indicator_t = indicator.T.tocsr()
 
-    id_consensus_df = pd.DataFrame(id_consensus).set_index(["doc1", "doc2"])
-    return id_consensus_df
+    match_totals = np.zeros(n_sigs)
+    pair_counts = np.zeros(n_sigs)
+
+    for start in range(0, n_sigs, chunk_size):
+        agreement = (indicator[start : start + chunk_size] @ indicator_t).toarray()
+        selected = agreement > min_matches
+
+        match_totals[start : start + chunk_size] = (agreement * selected) @ sizes
+        pair_counts[start : start + chunk_size] = selected @ sizes
+
+    # Remove the pair between each document and itself
+    self_matches = (signatures >= 0).sum(axis=1)
+    self_selected = self_matches > min_matches
+    match_totals -= self_matches * self_selected
+    pair_counts -= self_selected
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        shares = match_totals / (pair_counts * n_parts)
+
+    return pd.DataFrame(
+        {
+            "consensus_share": shares[inverse.ravel()],
+            "n_pairs": pair_counts[inverse.ravel()].astype(int),
+        },
+        index=pd.Index(doc_ids, name="doc_id"),
+    )
 
 
 def make_doc_comm_lookup(comm_doc_lookup: dict, method: str = "single") -> dict:
@@ -293,6 +480,68 @@ def make_doc_comm_lookup(comm_doc_lookup: dict, method: str = "single") -> dict:
         return assign_dict
 
 
+def make_proximity_index(
+    dist_df: pd.DataFrame,
+    cluster_assignments: dict,
+    exclude_in_cluster: bool = True,
+) -> dict:
+    """Standardises the distances to each cluster and sorts documents by them,
+    so that we can query the documents close to a cluster for any threshold
+    Args:
+        dist_df: dataframe with distances (columns are clusters)
+        cluster assignments: lookup between cluster ids and project ids
+        exclude_in_cluster: whether we want to exclude docs already in a cluster from the results
+    Returns:
+        A lookup between clusters and a tuple with the document ids sorted by
+            distance and their (sorted) z-scores
+    """
+
+    proximity_index = {}
+
+    for cluster in dist_df.columns:
+
+        dists = dist_df[cluster].to_numpy(dtype=float)
+
+        if exclude_in_cluster is True:
+            dists = np.where(
+                dist_df.index.isin(cluster_assignments[cluster]), np.nan, dists
+            )
+
+        z_scores = (dists - np.nanmean(dists)) / np.nanstd(dists)
+        # NaNs (excluded documents) are sorted last
+        order = np.argsort(z_scores, kind="stable")
+
+        proximity_index[cluster] = (dist_df.index[order], z_scores[order])
+
+    return proximity_index
+
+
+def query_proximity_index(
+    proximity_index: dict, sd_thres: list, clusters: list = None
+) -> dict:
+    """Gets the documents close to clusters for a list of thresholds
+    Args:
+        proximity_index: output of `make_proximity_index`
+        sd_thres: standard deviations below the mean distance that define proximity
+        clusters: clusters to query (all if None)
+    Returns:
+        A lookup between thresholds and lookups between clusters and the
+            list of documents close to them (sorted by distance)
+    """
+
+    clusters = proximity_index.keys() if clusters is None else clusters
+
+    return {
+        sd: {
+            cl: proximity_index[cl][0][
+                : np.searchsorted(proximity_index[cl][1], -sd, side="left")
+            ].tolist()
+            for cl in clusters
+        }
+        for sd in sd_thres
+    }
+
+
 def get_closest_documents(
     dist_df: pd.DataFrame,
     cluster: int,
@@ -311,19 +560,10 @@ def get_closest_documents(
         A list of project ids
     """
 
-    dist_copy = dist_df.copy()
-
-    if exclude_in_cluster is True:
-
-        dist_copy = dist_copy.loc[~dist_copy.index.isin(cluster_assignments[cluster])]
-
-    sd = np.std(dist_copy[cluster])
-
-    selected = (
-        dist_copy.sort_values(cluster, ascending=True)
-        .loc[dist_copy[cluster] < (np.mean(dist_copy[cluster]) - sd_scale * sd)]
-        .index.tolist()
+    proximity_index = make_proximity_index(
+        dist_df[[cluster]], cluster_assignments, exclude_in_cluster
     )
+    selected = query_proximity_index(proximity_index, [sd_scale])[sd_scale][cluster]
 
     logging.info(cluster)
     logging.info(len(selected))
@@ -394,32 +634,34 @@ def specialisation_robust(
     cluster_assignments,
     pre_covid_date="2019/01/01",
     reg_var="coordinator_country",
+    proximity_index=None,
+    thres_names=None,
 ):
     """Extract activity levels based on different thresholds of "distance"
-    from a cluster centroid
+    from a cluster centroid. We can pass a proximity index (see
+    `make_proximity_index`) to reuse it across calls. Thresholds are named
+    low / high unless we pass other names (or more than two thresholds)
     """
 
     docs = projects.copy().query(f"start_date<'{pre_covid_date}'")
     # Get project lists under different threshold
 
+    if proximity_index is None:
+        proximity_index = make_proximity_index(doc_distances, cluster_assignments)
+
+    if thres_names is None:
+        thres_names = ["low", "high"] if len(sd_thres) <= 2 else sd_thres
+
     close_to_clusters = [
-        make_doc_comm_lookup(
-            {
-                cl: get_closest_documents(
-                    doc_distances, cl, cluster_assignments, sd_scale=sd
-                )
-                for cl in doc_distances.columns
-            },
-            method="multiple",
-        )
-        for sd in sd_thres
+        make_doc_comm_lookup(close_docs, method="multiple")
+        for close_docs in query_proximity_index(proximity_index, sd_thres).values()
     ]
 
     # Assign projects to categories
 
     results = []
 
-    for thres, assign in zip(["low", "high"], close_to_clusters):
+    for thres, assign in zip(thres_names, close_to_clusters):
 
         docs_ = docs.copy()
         docs_["cluster_covid"] = docs_["project_id"].map(assign)
@@ -436,11 +678,10 @@ def specialisation_robust(
         act = act.rename(columns={"value": f"value_{str(thres)}"})
         results.append(act)
 
-    if len(results) > 1:
-        merged = results[0].merge(results[1], on=[reg_var, "cluster_covid", "variable"])
-        return merged
-    else:
-        return results[0]
+    return reduce(
+        lambda left, right: left.merge(right, on=[reg_var, "cluster_covid", "variable"]),
+        results,
+    )
 
 
 def plot_specialisation_robust(
@@ -452,15 +693,18 @@ def plot_specialisation_robust(
     focus_countries,
     clean_var_lookup,
     thres=[1.5, 2.5],
+    proximity_index=None,
 ):
     """Plot level of preparedness in a covid cluster"""
+    import altair as alt
 
     specialisation_related = specialisation_robust(
         dist_to_clusters,
-        [1.5, 2.5],
+        thres,
         projects=projs,
         reg_var=reg_var,
         cluster_assignments=cluster_assignments,
+        proximity_index=proximity_index,
     )
 
     specialisation_long = (
@@ -516,6 +760,7 @@ def make_pre_post_table(
     distance_to_clusters,
     reg_var="coordinator_country",
     sd=1.5,
+    proximity_index=None,
 ):
     """Extracts activity levels before and after covid-19"""
 
@@ -541,6 +786,7 @@ def make_pre_post_table(
         projects=projs,
         reg_var=reg_var,
         cluster_assignments=cluster_groups,
+        proximity_index=proximity_index,
     ).rename(columns={"value_low": "value_pre"})
 
     print(sp_related.head())
@@ -582,6 +828,7 @@ def filter_pre_post_table(
 
 def plot_preparedness_response(data, clean_var_lookup, reg_var):
     """Plots a comparison between preparedness and response"""
+    import altair as alt
 
     data_clean = clean_table_names(data, [reg_var, "cluster_covid"], clean_var_lookup)
     clean_country_name = reg_var + "_clean"
@@ -674,6 +921,7 @@ def rank_org_distances(org_cluster_dist, cluster, orgs_in_cluster, cluster_label
 
 def plot_participation_distance(org_distances, focus_countries, clean_variable_lookup):
     """Plots level of participation by country and cluster at different levels of distance"""
+    import altair as alt
 
     org_distances_mean = (
         org_distances.groupby(["country", "cluster", "ranking"])["is_participant"]
@@ -724,55 +972,11 @@ def k_check_clusters(vectors, cluster_assignments, n_clust=25, sample_size=1000)
         vectors: docs to assess
         cluster_assignment: lookup between clusters and document lists that we are validating
         n_cluster: number of clusters to use in the test
-        sample_size: sample_size for comparing pairs
+        sample_size: sample_size for comparing pairs (all documents if None)
     Returns:
         a df with number of cluster co-occurrences and a df with cluster distribution co-occurrences
     """
 
-    doc_cluster_lookup = make_doc_comm_lookup(cluster_assignments)
-
-    logging.info("fitting cluster")
-    k = KMeans(n_clusters=n_clust)
-    fit = k.fit_predict(vectors)
-    k_labs = {i: k for i, k in zip(vectors.index, fit)}
-
-    samp = vectors.sample(n=1000).index.tolist()
-
-    pairs = combinations(samp, 2)
-
-    matches = []
-
-    logging.info("Calculating co-occurrences")
-    for p in pairs:
-
-        if k_labs[p[0]] == k_labs[p[1]]:
-            matches.append([doc_cluster_lookup[p[0]], doc_cluster_lookup[p[1]]])
-
-    co_occ_df = (
-        pd.DataFrame(matches, columns=["c1", "c2"])
-        .pivot_table(index="c1", columns="c2", aggfunc="size")
-        .fillna(0)
-        .stack()
+    return k_check_run(
+        vectors, cluster_assignments, n_clust=n_clust, sample_size=sample_size
     )
-
-    logging.info("Calculating share similarities")
-
-    reclassify = {
-        clust: pd.Series(
-            [v for k, v in k_labs.items() if k in cluster_assignments[clust]]
-        ).value_counts(normalize=True)
-        for clust in cluster_assignments.keys()
-    }
-
-    corrs = []
-
-    for p in combinations(reclassify.keys(), 2):
-
-        comb = pd.concat([reclassify[p[0]], reclassify[p[1]]], axis=1).fillna(0).corr()
-        corrs.append([p[0], p[1], comb.iloc[0, 1]])
-
-    corr_df = pd.DataFrame(corrs, columns=["c1", "c2", "share_corr"]).set_index(
-        ["c1", "c2"]
-    )
-
-    return [co_occ_df, corr_df]
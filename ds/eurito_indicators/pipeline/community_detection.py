@@ -0,0 +1,214 @@
+# Utilities to detect communities in cluster graphs over a sweep of
+# resolutions and random seeds
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, product
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from community import community_louvain
+from scipy import sparse
+from sklearn.metrics import adjusted_rand_score
+
+
+def graph_to_csr(graph: nx.Graph, weight: str = "weight") -> tuple:
+    """Creates a CSR copy of a graph
+    Args:
+        graph: network object
+        weight: edge attribute with weights
+    Returns:
+        A sparse adjacency matrix and the list of nodes aligned with its rows
+    """
+    nodes = list(graph.nodes())
+    adj = nx.to_scipy_sparse_array(graph, nodelist=nodes, weight=weight, format="csr")
+
+    return adj, nodes
+
+
+def detect_communities(
+    adj, resolution: float, seed: int, method: str = "louvain"
+) -> np.ndarray:
+    """Detects communities in a sparse adjacency matrix
+    Args:
+        adj: sparse adjacency matrix
+        resolution: resolution for community detection
+        seed: random seed
+        method: louvain or leiden
+    Returns:
+        An array with the community of each row in the matrix
+    """
+    if method == "louvain":
+        graph = nx.from_scipy_sparse_array(adj)
+        comms = community_louvain.best_partition(
+            graph, resolution=resolution, random_state=seed
+        )
+        return np.array([comms[n] for n in range(adj.shape[0])])
+
+    elif method == "leiden":
+        import igraph as ig
+        import leidenalg
+
+        upper = sparse.triu(adj, k=1).tocoo()
+        graph = ig.Graph(
+            n=adj.shape[0],
+            edges=list(zip(upper.row.tolist(), upper.col.tolist())),
+            edge_attrs={"weight": upper.data.tolist()},
+        )
+        part = leidenalg.find_partition(
+            graph,
+            leidenalg.RBConfigurationVertexPartition,
+            weights="weight",
+            resolution_parameter=resolution,
+            seed=seed,
+        )
+        return np.array(part.membership)
+
+    else:
+        raise ValueError(f"Unknown community detection method: {method}")
+
+
+def partition_modularity(adj, labels: np.ndarray, resolution: float = 1) -> float:
+    """Calculates the modularity of a partition of a sparse adjacency matrix
+    Args:
+        adj: sparse adjacency matrix
+        labels: community of each row in the matrix
+        resolution: resolution used to detect the communities
+    Returns:
+        modularity
+    """
+    indicator = sparse.csr_matrix(
+        (np.ones(len(labels)), (np.arange(len(labels)), labels)),
+        shape=(len(labels), labels.max() + 1),
+    )
+    total_weight = adj.sum()
+
+    within = (indicator.T @ adj @ indicator).diagonal().sum() / total_weight
+    degrees = indicator.T @ np.asarray(adj.sum(axis=1)).ravel() / total_weight
+
+    return within - resolution * (degrees**2).sum()
+
+
+# Adjacency matrix of the graph being swept, set once in each worker process
+_worker_state = {}
+
+
+def _init_worker(adj):
+    """Keeps the adjacency matrix in a worker so it isn't sent with each task"""
+
+    _worker_state["adj"] = adj
+
+
+def _run_partition(args: tuple) -> tuple:
+    """Runs one community detection in a worker"""
+
+    resolution, seed, method = args
+    adj = _worker_state["adj"]
+    labels = detect_communities(adj, resolution, seed, method)
+
+    return resolution, seed, labels, partition_modularity(adj, labels, resolution)
+
+
+def partition_stability(partitions: list) -> float:
+    """Mean adjusted rand index between all pairs of partitions"""
+
+    if len(partitions) < 2:
+        return np.nan
+
+    return np.mean(
+        [adjusted_rand_score(p1, p2) for p1, p2 in combinations(partitions, 2)]
+    )
+
+
+def sweep_communities(
+    cluster_graph: nx.Graph,
+    resolutions: list,
+    n_seeds: int = 20,
+    method: str = "louvain",
+    n_jobs: int = None,
+) -> tuple:
+    """Detects communities in a graph over a sweep of resolutions and seeds
+    Args:
+        cluster_graph: network object
+        resolutions: resolutions for community detection
+        n_seeds: number of random seeds to run for each resolution
+        method: louvain or leiden
+        n_jobs: number of processes (all available cores if None)
+    Returns:
+        A lookup between (resolution, seed) and community arrays,
+        the list of graph nodes the arrays are aligned with
+        and a table with modularity and stability statistics by resolution
+    """
+    adj, nodes = graph_to_csr(cluster_graph)
+
+    tasks = [(res, seed, method) for res, seed in product(resolutions, range(n_seeds))]
+
+    logging.info(f"Running {len(tasks)} community detections")
+    with ProcessPoolExecutor(
+        max_workers=n_jobs, initializer=_init_worker, initargs=(adj,)
+    ) as executor:
+        results = list(executor.map(_run_partition, tasks))
+
+    partitions = {(res, seed): labels for res, seed, labels, _ in results}
+
+    stats = (
+        pd.DataFrame(
+            [[res, seed, mod, len(set(labels))] for res, seed, labels, mod in results],
+            columns=["resolution", "seed", "modularity", "n_communities"],
+        )
+        .groupby("resolution")
+        .agg(
+            modularity_mean=("modularity", "mean"),
+            modularity_std=("modularity", "std"),
+            n_communities_mean=("n_communities", "mean"),
+        )
+    )
+    stats["stability"] = [
+        partition_stability([v for k, v in partitions.items() if k[0] == res])
+        for res in stats.index
+    ]
+
+    return partitions, nodes, stats
+
+
+def best_partition(
+    cluster_graph: nx.Graph, partitions: dict, resolution: float
+) -> np.ndarray:
+    """Selects the highest modularity partition at a resolution of a sweep
+    Args:
+        cluster_graph: network object the sweep was run on
+        partitions: lookup between (resolution, seed) and community arrays
+            (from `sweep_communities`)
+        resolution: resolution to select the partition from
+    Returns:
+        The community array of the partition
+    """
+    adj, _ = graph_to_csr(cluster_graph)
+
+    candidates = [
+        labels for (res, _), labels in partitions.items() if res == resolution
+    ]
+    if len(candidates) == 0:
+        raise ValueError(f"No partitions at resolution {resolution}")
+
+    return max(
+        candidates, key=lambda labels: partition_modularity(adj, labels, resolution)
+    )
+
+
+def make_comm_assignments(labels: np.ndarray, nodes: list, index_lookup: dict) -> dict:
+    """Creates a lookup between communities and the ids of the documents in them
+    Args:
+        labels: community of each node
+        nodes: nodes aligned with the labels
+        index_lookup: lookup between node indices and document ids
+    Returns:
+        A lookup between communities and document ids
+    """
+    comm_assignments = {}
+
+    for node, comm in zip(nodes, labels.tolist()):
+        comm_assignments.setdefault(comm, []).append(index_lookup[node])
+
+    return comm_assignments
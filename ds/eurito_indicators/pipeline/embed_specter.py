@@ -1,13 +1,13 @@
 # Embed cordis abstracts using the specter language transformer
 
 import pandas as pd
-from sentence_transformers import SentenceTransformer
 
 from eurito_indicators import PROJECT_DIR
 from eurito_indicators.getters.cordis_getters import get_cordis_projects
 from eurito_indicators.pipeline.processing_utils import filter_by_length
 
 if __name__ == "__main__":
+    from sentence_transformers import SentenceTransformer
 
     model = SentenceTransformer("allenai-specter")
 
@@ -6,10 +6,15 @@ import os
 from dotenv import find_dotenv, load_dotenv
 
 from eurito_indicators import config, PROJECT_DIR
-from eurito_indicators.pipeline.fetch_utils import fetch_daps_table, get_engine
+from eurito_indicators.pipeline.fetch_utils import (
+    export_daps_tables,
+    fetch_daps_table,
+    get_engine,
+)
 
 DATA_PATH = f"{PROJECT_DIR}/inputs/data"
 COLUMNS = config["fetch_columns"]
+FETCH_OPTIONS = config["fetch_options"]
 
 load_dotenv(find_dotenv())
 
@@ -18,13 +23,17 @@ config_path = os.getenv("MYSQL_CONFIG")
 if __name__ == "__main__":
 
     # Connect to db
-    con = get_engine(f"{config_path}")
+    con = get_engine(
+        f"{config_path}",
+        pool_size=FETCH_OPTIONS["max_workers"],
+        max_overflow=0,
+    )
 
     logging.info("Downloading data")
 
     # Read tables
 
-    for t in [
+    tables = [
         "nih_projects",
         "nih_abstracts",
         "arxiv_articles",
@@ -36,19 +45,35 @@ if __name__ == "__main__":
         'arxiv_article_categories',
         'arxiv_article_fields_of_study',
         'mag_fields_of_study'
-    ]:
-
-        if os.path.exists(f"{DATA_PATH}/{t}.csv") is False:
-            logging.info(f"Donwloading table: {t}")
-
-            if t in COLUMNS.keys():
-                daps_t = fetch_daps_table(
-                    t,
-                    con,
-                    cols=COLUMNS[t],
-                    chunks=1000,
-                )
-            else:
-                daps_t = fetch_daps_table(t, con, chunks=1000)
-
-            daps_t.to_csv(f"{DATA_PATH}/{t}.csv", index=False)
+    ]
+
+    if FETCH_OPTIONS["format"] == "parquet":
+        fetch_report = export_daps_tables(
+            [t for t in tables if os.path.exists(f"{DATA_PATH}/{t}/_SUCCESS") is False],
+            con,
+            DATA_PATH,
+            cols=COLUMNS,
+            max_workers=FETCH_OPTIONS["max_workers"],
+            retries=FETCH_OPTIONS["retries"],
+            fetch_size=FETCH_OPTIONS["fetch_size"],
+            rows_per_file=FETCH_OPTIONS["rows_per_file"],
+        )
+        fetch_report.to_csv(f"{DATA_PATH}/daps_fetch_report.csv", index=False)
+
+    else:
+        for t in tables:
+
+            if os.path.exists(f"{DATA_PATH}/{t}.csv") is False:
+                logging.info(f"Donwloading table: {t}")
+
+                if t in COLUMNS.keys():
+                    daps_t = fetch_daps_table(
+                        t,
+                        con,
+                        cols=COLUMNS[t],
+                        chunks=1000,
+                    )
+                else:
+                    daps_t = fetch_daps_table(t, con, chunks=1000)
+
+                daps_t.to_csv(f"{DATA_PATH}/{t}.csv", index=False)
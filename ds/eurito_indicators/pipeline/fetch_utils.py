@@ -1,13 +1,40 @@
 # Utilities to fetch data from DAPS
 
-from sqlalchemy import create_engine
+import datetime
+import decimal
+import glob
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, func, MetaData, select, Table, table, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.engine.url import URL
 from configparser import ConfigParser
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+ARROW_TYPES = {
+    int: pa.int64(),
+    float: pa.float64(),
+    decimal.Decimal: pa.float64(),
+    bool: pa.bool_(),
+    str: pa.string(),
+    bytes: pa.binary(),
+    datetime.datetime: pa.timestamp("us"),
+    datetime.date: pa.date32(),
+}
 
 
 def get_engine(config_path, database="production", **engine_kwargs):
-    '''Get a SQL alchemy engine from config'''
+    '''Get a SQL alchemy engine from config (or from a database URL
+    such as sqlite:///local.db, which is useful for testing)'''
+    if "://" in str(config_path):
+        return create_engine(config_path, **engine_kwargs)
+
     cp = ConfigParser()
     cp.read(config_path)
     cp = cp["client"]
@@ -23,4 +50,264 @@ def fetch_daps_table(table, con, cols='all',chunks=1000):
     else:
         ch = pd.read_sql_table(table, con, chunksize=chunks, columns=cols)
 
-    return pd.concat(ch).reset_index(drop=True)
\ No newline at end of file
+    return pd.concat(ch).reset_index(drop=True)
+
+
+def _arrow_type(column):
+    '''Arrow type for a SQL alchemy column (strings if we can't tell)'''
+    try:
+        return ARROW_TYPES.get(column.type.python_type, pa.string())
+    except NotImplementedError:
+        return pa.string()
+
+
+def _to_arrow(values, arrow_type):
+    '''Converts a list of values from the database into an arrow array'''
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        if arrow_type == pa.string():
+            return pa.array([v if v is None else str(v) for v in values])
+        return pa.array(values).cast(arrow_type)
+
+
+def _last_exported_key(path, primary_key):
+    '''Returns the highest primary key in the completed parts of an export'''
+    parts = sorted(glob.glob(f"{path}/part-*.parquet"))
+    if len(parts) == 0:
+        return None, 0
+
+    last_keys = [
+        pc.max(pq.read_table(part, columns=[primary_key])[primary_key]).as_py()
+        for part in parts
+    ]
+    return max(last_keys), len(parts)
+
+
+def export_daps_table(
+    table,
+    con,
+    path,
+    cols='all',
+    fetch_size=50000,
+    rows_per_file=1000000,
+    primary_key=None,
+    resume=True,
+):
+    '''Streams a DAPS table into a folder of parquet files. Rows are read with a
+    server-side cursor and each fetch is written as a row group when it arrives.
+    Parts are renamed to part-N.parquet when they are complete so that an
+    interrupted export can resume after the last exported primary key, and
+    we add a _SUCCESS file to the folder when the export finishes.
+
+    Args:
+        table (str): table name
+        con (engine): SQL alchemy engine
+        path (str): folder for the parquet files
+        cols (list): columns to fetch (or 'all')
+        fetch_size (int): number of rows per fetch / row group
+        rows_per_file (int): rows per parquet file
+        primary_key (str): column to order and resume the export by.
+            Defaults to the table's (single column) primary key
+        resume (bool): whether to continue an existing export
+
+    Returns:
+        (int): number of rows exported in this run
+    '''
+    sql_table = Table(table, MetaData(), autoload_with=con)
+
+    if primary_key is None and len(sql_table.primary_key.columns) == 1:
+        primary_key = list(sql_table.primary_key.columns)[0].name
+
+    columns = (
+        list(sql_table.columns)
+        if cols == 'all'
+        else [sql_table.columns[c] for c in cols]
+    )
+    if primary_key is not None and primary_key not in [c.name for c in columns]:
+        columns.append(sql_table.columns[primary_key])
+
+    schema = pa.schema([(c.name, _arrow_type(c)) for c in columns])
+
+    os.makedirs(path, exist_ok=True)
+    # Unfinished parts, and previous exports we can't resume from
+    can_resume = (primary_key is not None) and (resume is True)
+    for old_file in glob.glob(f"{path}/*.tmp") + glob.glob(f"{path}/_SUCCESS") + (
+        [] if can_resume else glob.glob(f"{path}/part-*.parquet")
+    ):
+        os.remove(old_file)
+
+    query = select(*columns)
+    last_key, part_number = (None, 0)
+
+    if primary_key is not None:
+        if can_resume is True:
+            last_key, part_number = _last_exported_key(path, primary_key)
+        if last_key is not None:
+            logging.info(f"Resuming {table} after {primary_key}={last_key}")
+            query = query.where(sql_table.columns[primary_key] > last_key)
+        query = query.order_by(sql_table.columns[primary_key])
+
+    n_rows, file_rows, writer = 0, 0, None
+
+    def close_part(writer, part_number):
+        writer.close()
+        tmp_path = f"{path}/part-{part_number:05d}.parquet.tmp"
+        os.rename(tmp_path, tmp_path[: -len(".tmp")])
+
+    with con.connect().execution_options(
+        stream_results=True, yield_per=fetch_size
+    ) as conn:
+        result = conn.execute(query)
+
+        for rows in result.partitions(fetch_size):
+
+            if writer is None:
+                writer = pq.ParquetWriter(
+                    f"{path}/part-{part_number:05d}.parquet.tmp", schema
+                )
+
+            values = list(zip(*rows))
+            writer.write_table(
+                pa.Table.from_arrays(
+                    [_to_arrow(list(v), f.type) for v, f in zip(values, schema)],
+                    schema=schema,
+                )
+            )
+            n_rows += len(rows)
+            file_rows += len(rows)
+            logging.info(f"{table}: exported {n_rows} rows")
+
+            if file_rows >= rows_per_file:
+                close_part(writer, part_number)
+                writer, file_rows, part_number = None, 0, part_number + 1
+
+    if writer is not None:
+        close_part(writer, part_number)
+
+    open(f"{path}/_SUCCESS", "w").close()
+
+    return n_rows
+
+
+def get_table_sizes(con, tables):
+    '''Gets the size of DAPS tables (bytes in MySQL, rows in other databases)
+
+    Args:
+        con (engine): SQL alchemy engine
+        tables (list): table names
+
+    Returns:
+        (dict): lookup between tables and their sizes
+    '''
+    with con.connect() as conn:
+        if con.dialect.name == "mysql":
+            sizes = dict(
+                conn.execute(
+                    text(
+                        "SELECT table_name, data_length FROM information_schema.tables "
+                        "WHERE table_schema = DATABASE()"
+                    )
+                ).all()
+            )
+        else:
+            sizes = {}
+            for t in tables:
+                try:
+                    sizes[t] = conn.execute(
+                        select(func.count()).select_from(table(t))
+                    ).scalar()
+                except SQLAlchemyError:
+                    # Missing tables fail (and are reported) when we export them
+                    conn.rollback()
+    return {t: sizes.get(t) or 0 for t in tables}
+
+
+def _exported_rows(path):
+    '''Number of rows in the completed parts of an export'''
+    return sum(
+        pq.ParquetFile(part).metadata.num_rows
+        for part in glob.glob(f"{path}/part-*.parquet")
+    )
+
+
+def _export_with_retries(table, con, path, retries, backoff=5, **export_kwargs):
+    '''Exports a table, retrying (and resuming) if the export fails. Rows and
+    seconds add up over the attempts (without the waits between them): a failed
+    attempt counts the rows it saved in completed parts'''
+    attempt_rows, attempt_seconds = [], []
+
+    for attempt in range(1, retries + 2):
+        start, rows_before = time.time(), _exported_rows(path)
+        try:
+            attempt_rows.append(export_daps_table(table, con, path, **export_kwargs))
+            attempt_seconds.append(time.time() - start)
+            status, error = "done", None
+            break
+        except Exception as e:
+            attempt_seconds.append(time.time() - start)
+            attempt_rows.append(max(_exported_rows(path) - rows_before, 0))
+            logging.warning(f"{table}: attempt {attempt} failed ({e})")
+            status, error = "failed", repr(e)
+            if attempt <= retries:
+                time.sleep(backoff * attempt)
+
+    n_rows, seconds = sum(attempt_rows), sum(attempt_seconds)
+    n_bytes = sum(os.path.getsize(f) for f in glob.glob(f"{path}/part-*.parquet"))
+
+    return {
+        "table": table,
+        "status": status,
+        "attempts": attempt,
+        "rows": n_rows,
+        "seconds": seconds,
+        "rows_per_sec": n_rows / seconds if seconds > 0 else None,
+        "attempt_rows": attempt_rows,
+        "attempt_seconds": attempt_seconds,
+        "bytes": n_bytes,
+        "error": error,
+    }
+
+
+def export_daps_tables(
+    tables, con, data_path, cols=None, max_workers=4, retries=2, **export_kwargs
+):
+    '''Exports several DAPS tables concurrently, largest tables first.
+    The engine's pool should have at least max_workers connections.
+
+    Args:
+        tables (list): table names
+        con (engine): SQL alchemy engine
+        data_path (str): folder where we create a folder for each table
+        cols (dict): lookup between tables and the columns to fetch (all if missing)
+        max_workers (int): number of tables to export at the same time
+        retries (int): times to retry a failed table
+        export_kwargs: other arguments for `export_daps_table`
+
+    Returns:
+        (pd.DataFrame): report with rows, rows/sec and bytes for each table
+    '''
+    cols = {} if cols is None else cols
+    sizes = get_table_sizes(con, tables)
+    tables = sorted(tables, key=lambda t: sizes[t], reverse=True)
+
+    logging.info(f"Exporting {len(tables)} tables with {max_workers} workers")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        report = list(
+            executor.map(
+                lambda t: _export_with_retries(
+                    t,
+                    con,
+                    f"{data_path}/{t}",
+                    retries,
+                    cols=cols.get(t, "all"),
+                    **export_kwargs,
+                ),
+                tables,
+            )
+        )
+
+    report = pd.DataFrame(report).assign(size=lambda df: df["table"].map(sizes))
+    logging.info(report[["table", "status", "rows", "rows_per_sec", "bytes"]])
+
+    return report
@@ -18,6 +18,9 @@ from eurito_indicators.getters.arxiv_getters import (
 
 AI_VOC_PATH = f"{PROJECT_DIR}/inputs/data/ai_vocabularies_test.json"
 
+# AI categories and the broader category (corpus) they sit in
+AI_CATEGORIES = {"cs.AI": "cs.", "cs.NE": "cs.", "stat.ML": "stat.", "cs.LG": "cs."}
+
 
 def flatten_freq(_list, normalised=False):
     """Flatten a nested list and return element frequencies"""
@@ -56,17 +59,18 @@ def get_salient_terms(
     )
 
     # Top terms in the corpus (all papers in category)
-    corpus_salient = flatten_freq(text.loc[corpus]["tokenised"])
+    corpus_salient = flatten_freq(text.loc[list(corpus)]["tokenised"])
 
     # Top terms in the category
     logging.info(f"making {category} salient")
-    category_salient = flatten_freq(text.loc[(cat_set[category])]["tokenised"])
+    category_salient = flatten_freq(text.loc[list(cat_set[category])]["tokenised"])
 
     # Extract terms
     logging.info("normalising")
     category_norm = (
-        pd.concat([category_salient, corpus_salient], axis=1)
-        .rename(columns={0: "category", 1: "corpus"})
+        pd.concat(
+            [category_salient, corpus_salient], axis=1, keys=["category", "corpus"]
+        )
         .assign(norm=lambda x: x["category"] / x["corpus"])
         .query(f"category>{occurrences}")
         .sort_values("norm", ascending=False)[:number]
@@ -82,7 +86,7 @@ def count_terms(arx_df, paper_ids, terms):
         paper_ids: AI paper IDs
         terms: terms for which we want frequencies
     """
-    subset = arx_df.loc[paper_ids]
+    subset = arx_df.loc[list(paper_ids)]
 
     terms_n = {
         _id: sum(x in row["tokenised"] for x in terms) for _id, row in subset.iterrows()
@@ -108,7 +112,7 @@ def get_expanded_vocabulary(
         cats: ids to categories lookup
         category: the arXiv category for which we want to expand terms
         corpus_category: the broader category where the category sits
-        w2v: model used for keyword expansion
+        w2v: word vectors used for keyword expansion
         expansion_thres: minimum distance to salient term for inclusion
         expansion_n: size of the expansion
     """
@@ -124,13 +128,13 @@ def get_expanded_vocabulary(
 
     expanded = []
 
-    sal_filtered = [term for term in sal.index if term in w2v.wv.key_to_index.keys()]
+    sal_filtered = [term for term in sal.index if term in w2v.key_to_index.keys()]
     logging.info(sal_filtered)
 
     expanded = set(
         [
             x[0]  # This is the term
-            for x in w2v.wv.most_similar(sal_filtered, topn=expansion_n)
+            for x in w2v.most_similar(sal_filtered, topn=expansion_n)
             if x[1] > expansion_thres
         ]
         + list(sal.index)  # Plus the salient terms
@@ -200,14 +204,86 @@ def get_expanded_papers(
     return (sel_ids, [in_terms, out_terms])
 
 
+def make_ai_corpus(cats, text, tokenised) -> tuple:
+    """Combines arXiv abstracts, tokens and AI categories
+
+    Args:
+        cats: article - category table
+        text: article ids and abstracts
+        tokenised: lookup between article ids and token lists
+
+    Returns:
+        The abstracts and tokens indexed by article id, the same table with AI
+        category dummies (for papers with categories) and the paper ids
+        in each category
+    """
+
+    text = text.assign(tokenised=lambda df: df["article_id"].map(tokenised))
+
+    # Create category sets
+    ai_cats = list(AI_CATEGORIES.keys())
+    cat_sets = cats.groupby("category_id")["article_id"].apply(lambda x: set(x))
+
+    # Create one hot encodings
+    ai_binary = pd.DataFrame(index=list(set(cats["article_id"])), columns=ai_cats)
+
+    for c in ai_binary.columns:
+        ai_binary[c] = [x in cat_sets[c] for x in ai_binary.index]
+
+    text = text.set_index("article_id")
+
+    # We remove papers without abstracts and arXiv categories
+    # Note: we are using cs.AI as an example - if it is missing then all other
+    # categories will be missing too
+    arx = pd.concat([ai_binary, text], axis=1).dropna(
+        axis=0, subset=["abstract", "cs.AI"]
+    )
+
+    return text, arx, cat_sets
+
+
+def find_category_papers(category, text, arx, cat_sets, cats, w2v) -> tuple:
+    """Finds the papers in an AI category and papers outside it that use its
+    (expanded) vocabulary
+
+    Args:
+        category: AI category (a key in AI_CATEGORIES)
+        text, arx, cat_sets: outputs of `make_ai_corpus`
+        cats: article - category table
+        w2v: word vectors used for keyword expansion
+
+    Returns:
+        The expanded vocabulary, the expanded paper ids and the term counts in
+        and outside the category
+    """
+    expansion_dict = config["finding_ai"]["expansion_dict"]
+
+    logging.info(category)
+
+    logging.info("Expanding vocabulary")
+    ev = get_expanded_vocabulary(
+        text, cat_sets, cats, category, AI_CATEGORIES[category], w2v
+    )
+    logging.info(ev)
+
+    logging.info("Extracting papers")
+    ep = get_expanded_papers(
+        arx,
+        category,
+        cat_sets,
+        ev,
+        expansion_value=expansion_dict[category],
+        random_sample=[False, None],
+    )
+
+    return list(ev), ep[0], ep[1]
+
+
 def find_ai_papers():
 
     if os.path.exists(AI_VOC_PATH) is True:
         logging.info("Already found AI papers")
     else:
-        # This dict contains values to expand search in different categories
-        expansion_dict = config["finding_ai"]["expansion_dict"]
-
         logging.info("Read data")
 
         cats = get_article_categories()
@@ -215,28 +291,8 @@ def find_ai_papers():
         tokenised = get_arxiv_tokenised()
         w2v = get_arxiv_w2v()
 
-        text["tokenised"] = text["article_id"].map(tokenised)
-
         logging.info("Processing data")
-        # Create category sets
-        ai_cats = ["cs.AI", "cs.NE", "stat.ML", "cs.LG"]
-        cat_sets = cats.groupby("category_id")["article_id"].apply(lambda x: set(x))
-
-        # Create one hot encodings
-        ai_binary = pd.DataFrame(index=set(cats["article_id"]), columns=ai_cats)
-
-        for c in ai_binary.columns:
-            print(c)
-            ai_binary[c] = [x in cat_sets[c] for x in ai_binary.index]
-
-        text = text.set_index("article_id")
-
-        # We remove papers without abstracts and arXiv categories
-        # Note: we are using cs.AI as an example - if it is missing then all other
-        # categories will be missing too
-        arx = pd.concat([ai_binary, text], axis=1).dropna(
-            axis=0, subset=["abstract", "cs.AI"]
-        )
+        text, arx, cat_sets = make_ai_corpus(cats, text, tokenised)
 
         logging.info("Finding papers")
 
@@ -245,29 +301,10 @@ def find_ai_papers():
 
         ev_terms_dict = {"cs.AI": [], "cs.NE": [], "cs.LG": [], "stat.ML": []}
 
-        for cat, corp in zip(ai_cats, ["cs.", "cs.", "stat.", "cs."]):
-
-            logging.info(cat)
-
-            logging.info("Expanding vocabulary")
-            ev = get_expanded_vocabulary(text, cat_sets, cats, cat, corp, w2v)
-            logging.info(ev)
-
-            ev_terms_dict[cat] = list(ev)
-
-            logging.info("Extracting papers")
-            ep = get_expanded_papers(
-                arx,
-                cat,
-                cat_sets,
-                ev,
-                expansion_value=expansion_dict[cat],
-                random_sample=[False, None],
+        for cat in AI_CATEGORIES.keys():
+            ev_terms_dict[cat], paper_results[cat], term_counts[cat] = (
+                find_category_papers(cat, text, arx, cat_sets, cats, w2v)
             )
-            paper_results[cat] = ep[0]
-            term_counts[cat] = ep[1]
-
-            print("\n")
 
         logging.info("Saving results")
         with open(f"{PROJECT_DIR}/outputs/data/find_ai_outputs.p", "wb") as outfile:
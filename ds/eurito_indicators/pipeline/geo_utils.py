@@ -5,8 +5,6 @@ import os
 from io import BytesIO
 from zipfile import ZipFile
 
-import altair as alt
-import geopandas as gp
 import requests
 
 from eurito_indicators import PROJECT_DIR
@@ -27,6 +25,7 @@ def fetch_shapefile():
 
 def read_shape():
     """Read shapefile"""
+    import geopandas as gp
 
     shapef = (
         gp.read_file(
@@ -56,6 +55,7 @@ def make_shape(table):
 
 
 def plot_choro(shapef_json, variable, name):
+    import altair as alt
 
     base_map = (  # Base chart with outlines
         alt.Chart(alt.Data(values=shapef_json["features"]))
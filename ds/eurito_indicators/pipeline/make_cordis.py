@@ -3,6 +3,7 @@
 import logging
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from io import BytesIO
 from zipfile import ZipFile
@@ -14,8 +15,10 @@ import requests
 from eurito_indicators import config, PROJECT_DIR
 from eurito_indicators.getters.covid_getters import get_cordis_labelled
 from eurito_indicators.pipeline.processing_utils import covid_getter
+from eurito_indicators.utils.instrumentation import instrument
 
 POST_PATH = f"{PROJECT_DIR}/inputs/data/postcode_nuts_lookup"
+POST_INDEX_PATH = f"{PROJECT_DIR}/inputs/data/postcode_nuts_lookup.parquet"
 
 
 def camel_to_snake(text):
@@ -107,15 +110,25 @@ def fetch_postcode_nuts_lookup():
     post_zip.extractall(POST_PATH)
 
 
-def make_postcode_nuts_lookup() -> pd.DataFrame:
-    """Combines national postcode lookups into a EU wide one"""
+def normalise_postcodes(postcodes: pd.Series, countries: pd.Series) -> pd.Series:
+    """Normalises postcodes so that TERCET and CORDIS codes can be matched:
+    removes quotes, separators and country prefixes (e.g. LT-01100) and uppercases
 
-    country_lookups = os.listdir(POST_PATH)
-    postcode_nuts_lookup = pd.concat(
-        [read_clean_postcode_lookup(c) for c in country_lookups]
-    )
+    Args:
+        postcodes: postcodes
+        countries: ISO-2 country code for each postcode
+
+    Returns:
+        Normalised postcodes
+    """
+
+    postcodes = postcodes.astype("string").str.strip().str.upper()
+    countries = countries.astype("string").str.upper()
 
-    return postcode_nuts_lookup
+    has_prefix = (postcodes.str[:2] == countries) & postcodes.str[2].isin(["-", " "])
+    postcodes = postcodes.mask(has_prefix, postcodes.str[3:])
+
+    return postcodes.str.replace(r"[\s\-\.']", "", regex=True).replace("", pd.NA)
 
 
 def read_clean_postcode_lookup(table_path: str) -> pd.DataFrame:
@@ -128,19 +141,67 @@ def read_clean_postcode_lookup(table_path: str) -> pd.DataFrame:
         A cleaned table
     """
 
-    country_table = pd.read_csv(f"{POST_PATH}/{table_path}", delimiter=";")
-
-    for c in country_table.columns:
-        country_table[c] = [re.sub("'", "", x) for x in country_table[c]]
+    country_table = pd.read_csv(
+        f"{POST_PATH}/{table_path}", delimiter=";", quotechar="'", dtype=str
+    )
 
-    country_table.columns = [c.lower() for c in country_table.columns]
-    country_table["country"] = table_path.split("_")[1]
+    country_table.columns = [c.lower().strip("'") for c in country_table.columns]
     country_table = country_table.rename(columns={"code": "postcode"})
-    country_table["nuts3"] = [
-        n if len(n) > 0 else np.nan for n in country_table["nuts3"]
-    ]
+    country_table["country"] = table_path.split("_")[1]
+    country_table["nuts3"] = country_table["nuts3"].str.strip("'").replace("", np.nan)
+    country_table["postcode"] = normalise_postcodes(
+        country_table["postcode"], country_table["country"]
+    )
+
+    return country_table[["country", "postcode", "nuts3"]]
+
 
-    return country_table
+@instrument()
+def make_postcode_nuts_lookup(n_jobs: int = None) -> pd.DataFrame:
+    """Combines national postcode lookups into a EU wide one
+    indexed by country and (normalised) postcode
+
+    Args:
+        n_jobs: number of threads used to read the national tables
+
+    Returns:
+        A table with the nuts3, nuts2 and nuts1 code for each postcode
+    """
+
+    country_lookups = sorted(f for f in os.listdir(POST_PATH) if f.endswith(".csv"))
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        postcode_nuts_lookup = pd.concat(
+            executor.map(read_clean_postcode_lookup, country_lookups),
+            ignore_index=True,
+        )
+
+    return (
+        make_extra_nuts(postcode_nuts_lookup.dropna(subset=["postcode"]))
+        .drop_duplicates(subset=["country", "postcode"])
+        .astype({"country": "category"})
+        .set_index(["country", "postcode"])
+        .sort_index()
+    )
+
+
+def save_postcode_nuts_lookup(postcode_nuts_lookup: pd.DataFrame):
+    """Saves the postcode - nuts lookup (with its index) as parquet"""
+    logging.info("Saving postcode - nuts lookup")
+
+    postcode_nuts_lookup.to_parquet(POST_INDEX_PATH, row_group_size=100000)
+
+
+def get_postcode_nuts_lookup() -> pd.DataFrame:
+    """Reads the postcode - nuts lookup, building it if it doesn't exist"""
+
+    if os.path.exists(POST_INDEX_PATH) is False:
+        fetch_postcode_nuts_lookup()
+
+        logging.info("making postcode-nuts lookup")
+        save_postcode_nuts_lookup(make_postcode_nuts_lookup())
+
+    return pd.read_parquet(POST_INDEX_PATH)
 
 
 def fetch_cordis_organisations():
@@ -148,7 +209,9 @@ def fetch_cordis_organisations():
     logging.info("Fetching cordis organisations")
 
     orgs = pd.read_csv(
-        "https://cordis.europa.eu/data/cordis-h2020organizations.csv", delimiter=";"
+        "https://cordis.europa.eu/data/cordis-h2020organizations.csv",
+        delimiter=";",
+        dtype={"postCode": str},
     )
     orgs.columns = [camel_to_snake(c) for c in orgs.columns]
     orgs = orgs.rename(columns={"project_i_d": "project_id"})
@@ -160,32 +223,23 @@ def make_extra_nuts(cordis_orgs):
     """Adds extra nuts codes by slicing the nuts3 code we already obtained"""
 
     for n, name in enumerate(["nuts2", "nuts1"]):
-        cordis_orgs[name] = cordis_orgs["nuts3"].apply(
-            lambda x: x[: (-n - 1)] if pd.isnull(x) == False else np.nan
-        )
+        cordis_orgs[name] = cordis_orgs["nuts3"].str[: (-n - 1)]
 
     return cordis_orgs
 
 
+@instrument()
 def make_cordis_organisations():
-    """Fetch cordis organisations and postcode lookuo"""
+    """Fetch cordis organisations and geocode them with the postcode lookup"""
 
     cordis_orgs = fetch_cordis_organisations()
-    fetch_postcode_nuts_lookup()
+    postcode_nuts_lookup = get_postcode_nuts_lookup()
 
-    logging.info("making postcode-nuts lookup")
-    postcode_nuts_lookup = make_postcode_nuts_lookup()
-
-    orgs_geo = cordis_orgs.merge(
-        postcode_nuts_lookup,
-        left_on=["country", "post_code"],
-        right_on=["country", "postcode"],
-        how="left",
+    cordis_orgs["postcode"] = normalise_postcodes(
+        cordis_orgs["post_code"], cordis_orgs["country"]
     )
 
-    orgs_geo = make_extra_nuts(orgs_geo)
-
-    return orgs_geo
+    return cordis_orgs.join(postcode_nuts_lookup, on=["country", "postcode"])
 
 
 def save_cordis_organisations(cordis_orgs):
@@ -0,0 +1,167 @@
+# Utilities to calculate (and cache) network layouts
+
+import hashlib
+import logging
+import os
+import pickle
+
+import networkx as nx
+import numpy as np
+
+from eurito_indicators import PROJECT_DIR
+
+LAYOUT_PATH = f"{PROJECT_DIR}/outputs/models/layouts"
+
+
+def make_graph_key(graph: nx.Graph, **layout_kwargs) -> str:
+    """Creates a hash for a graph based on its nodes, edges, weights
+    and the parameters used to lay it out
+    Args:
+        graph: network object
+        layout_kwargs: layout parameters
+    Returns:
+        A hex digest identifying the graph and layout
+    """
+
+    edges = sorted(
+        tuple(sorted([str(e[0]), str(e[1])])) + (str(e[2].get("weight", 1)),)
+        for e in graph.edges(data=True)
+    )
+    nodes = sorted(str(n) for n in graph.nodes())
+    params = sorted((k, str(v)) for k, v in layout_kwargs.items())
+
+    return hashlib.sha256(repr([nodes, edges, params]).encode()).hexdigest()
+
+
+def _repulsion(pos: np.ndarray, others: np.ndarray, k: float, chunk_size: int):
+    """Sums the repulsive displacement between each node and a set of other nodes"""
+
+    disp = np.zeros_like(pos)
+    others_sq = (others**2).sum(axis=1)
+
+    for start in range(0, len(pos), chunk_size):
+        chunk = pos[start : start + chunk_size]
+        dist_sq = (chunk**2).sum(axis=1)[:, None] + others_sq - 2 * chunk @ others.T
+        force = k**2 / np.maximum(dist_sq, 0.0001)
+        disp[start : start + chunk_size] = (
+            chunk * force.sum(axis=1)[:, None] - force @ others
+        )
+
+    return disp
+
+
+def sparse_layout(
+    graph: nx.Graph,
+    iterations: int = 50,
+    seed: int = 123,
+    weight: str = "weight",
+    repulsion_sample: int = 1000,
+    chunk_size: int = 500,
+) -> dict:
+    """Calculates a Fruchterman-Reingold layout initialised with spectral positions.
+    Attractive forces are calculated over the sparse edge list and repulsive
+    forces against a random sample of nodes in large graphs, so that the
+    layout scales to thousands of nodes.
+    Args:
+        graph: network object
+        iterations: iterations of the force-directed algorithm
+        seed: random seed
+        weight: edge attribute with weights
+        repulsion_sample: max number of nodes used to calculate repulsion
+        chunk_size: number of nodes whose repulsion we calculate at once
+    Returns:
+        A lookup between nodes and their positions
+    """
+
+    nodes = list(graph.nodes())
+    n = len(nodes)
+
+    if n < 3:
+        return nx.circular_layout(graph)
+
+    adj = nx.to_scipy_sparse_array(graph, nodelist=nodes, weight=weight, format="coo")
+
+    # Without edges there is nothing to attract nodes nor a spectrum to start from
+    if adj.nnz == 0:
+        return nx.circular_layout(graph)
+
+    rng = np.random.default_rng(seed)
+    adj_weight = adj.data / adj.data.max()
+
+    # networkx uses a sparse eigensolver for large graphs
+    spectral = nx.spectral_layout(graph, weight=weight)
+    pos = np.array([spectral[node] for node in nodes], dtype=float)
+    pos = pos + rng.normal(scale=0.001, size=pos.shape)
+
+    k = np.sqrt(1 / n)
+    temp = 0.1
+    cooling = temp / (iterations + 1)
+
+    for _ in range(iterations):
+
+        if n > repulsion_sample:
+            others = pos[rng.choice(n, size=repulsion_sample, replace=False)]
+            disp = _repulsion(pos, others, k, chunk_size) * (n / repulsion_sample)
+        else:
+            disp = _repulsion(pos, pos, k, chunk_size)
+
+        delta = pos[adj.row] - pos[adj.col]
+        dist = np.sqrt((delta**2).sum(axis=1))
+        attraction = delta * (adj_weight * dist / k)[:, None]
+        for dim in range(2):
+            disp[:, dim] -= np.bincount(
+                adj.row, weights=attraction[:, dim], minlength=n
+            )
+
+        length = np.maximum(np.sqrt((disp**2).sum(axis=1)), 0.01)
+        pos += disp * (np.minimum(length, temp) / length)[:, None]
+        temp -= cooling
+
+    pos = nx.rescale_layout(pos)
+
+    return dict(zip(nodes, pos))
+
+
+def get_layout(
+    graph: nx.Graph,
+    method: str = "sparse",
+    cache: bool = True,
+    cache_path: str = LAYOUT_PATH,
+    **layout_kwargs,
+) -> dict:
+    """Gets the layout for a graph, reusing a cached layout if the same graph
+    has already been laid out
+    Args:
+        graph: network object
+        method: sparse (spectral initialised force-directed) or kamada_kawai
+        cache: whether to read / write layouts from disk
+        cache_path: folder where we store the layouts
+        layout_kwargs: parameters for the layout function
+    Returns:
+        A lookup between nodes and their positions
+    """
+
+    layout_funs = {
+        "sparse": sparse_layout,
+        "kamada_kawai": nx.kamada_kawai_layout,
+    }
+
+    if cache is False:
+        return layout_funs[method](graph, **layout_kwargs)
+
+    key = make_graph_key(graph, method=method, **layout_kwargs)
+    layout_file = f"{cache_path}/{key}.p"
+
+    if os.path.exists(layout_file) is True:
+        logging.info("Reading cached layout")
+        with open(layout_file, "rb") as infile:
+            return pickle.load(infile)
+
+    logging.info("Calculating layout")
+    pos = layout_funs[method](graph, **layout_kwargs)
+
+    os.makedirs(cache_path, exist_ok=True)
+    with open(layout_file, "wb") as outfile:
+        pickle.dump(pos, outfile)
+
+    return pos
@@ -1,61 +1,95 @@
 # Script to work with network data
 import logging
 import random
-from itertools import chain, combinations
+from typing import Union
 
 import networkx as nx
+import numpy as np
 import pandas as pd
 from community import community_louvain
+from scipy import sparse
 
 from eurito_indicators.pipeline.altair_network import plot_altair_network
+from eurito_indicators.pipeline.network_layout import get_layout
 
 
-def make_network_from_doc_term_matrix(mat, threshold, id_var):
-    """Create a network from a document term matrix.
-    Args
-        Document term matrix where the rows are documents and the columns are topics
-        threshold is the threshold to consider that a topic is present in a matrix.
+def make_cooccurrence_matrix(topic_array: np.ndarray, threshold: float):
+    """Calculates the upper triangle of a topic co-occurrence matrix
+    Args:
+        topic_array: array where the rows are documents and the columns topics
+        threshold: threshold to consider that a topic is present in a document
     Returns:
-        A network
+        A sparse (coo) matrix with the number of documents where each pair of
+            topics co-occur
     """
-    # Melt the topic mix and remove empty entries
-    cd = pd.melt(mat, id_vars=[id_var])
-
-    cd = cd.loc[cd["value"] > threshold]
+    presence = sparse.csr_matrix(topic_array > threshold, dtype=np.int32)
 
-    # This gives us the topic co-occurrence matrix
-    co_occurrence = cd.groupby(id_var)["variable"].apply(lambda x: list(x))
+    co_occurrence = presence.T @ presence
 
-    # Here the idea is to create a proximity matrix based on co-occurrences
+    return sparse.triu(co_occurrence, k=1).tocoo()
 
-    # Turn co-occurrences into combinations of pairs we can use to construct a
-    # similarity matrix
-    sector_combs = chain(*[sorted(list(combinations(x, 2))) for x in co_occurrence])
-    sector_combs = [x for x in sector_combs if len(x) > 0]
 
-    # Turn the sector combs into an edgelist
-    edge_list = pd.DataFrame(sector_combs, columns=["source", "target"])
+def make_network_from_cooccurrence(co_occurrence, node_names) -> nx.Graph:
+    """Creates a weighted network from a co-occurrence matrix
+    Args:
+        co_occurrence: sparse matrix with co-occurrence counts (upper triangle)
+        node_names: names of the rows / columns in the co-occurrence matrix
+    Returns:
+        A network
+    """
+    node_names = np.asarray(node_names, dtype=object)
+
+    net = nx.Graph()
+    net.add_weighted_edges_from(
+        zip(
+            node_names[co_occurrence.row],
+            node_names[co_occurrence.col],
+            co_occurrence.data.tolist(),
+        )
+    )
+    return net
 
-    edge_list["weight"] = 1
 
-    # Group over edge pairs to aggregate weights
-    edge_list_weighted = (
-        edge_list.groupby(["source", "target"])["weight"].sum().reset_index(drop=False)
-    )
+def make_networks_from_doc_term_matrix(
+    mat: pd.DataFrame, thresholds: list, id_var: str
+) -> dict:
+    """Create networks from a document term matrix for several thresholds
+    Args:
+        mat: Document term matrix where the rows are documents and the columns are topics
+        thresholds: thresholds to consider that a topic is present in a document
+        id_var: document id variable in the matrix
+    Returns:
+        A lookup between thresholds and networks
+    """
+    topics = mat.drop(axis=1, labels=[id_var])
+    topic_array = topics.to_numpy()
 
-    edge_list_weighted.sort_values("weight", ascending=False).head(n=10)
+    return {
+        thres: make_network_from_cooccurrence(
+            make_cooccurrence_matrix(topic_array, thres), topics.columns
+        )
+        for thres in thresholds
+    }
 
-    # Create network and extract communities
-    net = nx.from_pandas_edgelist(edge_list_weighted, edge_attr=True)
 
-    return net
+def make_network_from_doc_term_matrix(mat, threshold, id_var):
+    """Create a network from a document term matrix.
+    Args
+        Document term matrix where the rows are documents and the columns are topics
+        threshold is the threshold to consider that a topic is present in a matrix.
+    Returns:
+        A network
+    """
+    return make_networks_from_doc_term_matrix(mat, [threshold], id_var)[threshold]
 
 
-def process_network(net, extra_edges=100):
+def process_network(net, extra_edges=100, layout="sparse", cache_layout=True):
     """Creates the base for a sector space network
     Args:
         sector_space (network): nx network object
         extra_edges (int): extra edges to add to the maximum spanning tree
+        layout (str): layout method (see `network_layout.get_layout`)
+        cache_layout (bool): whether to reuse layouts already calculated for this graph
     """
     logging.info("making network")
 
@@ -79,7 +113,7 @@ def process_network(net, extra_edges=100):
     )
 
     logging.info("Getting positions")
-    pos = nx.kamada_kawai_layout(united_graph, dim=2)
+    pos = get_layout(united_graph, method=layout, cache=cache_layout)
 
     labs = {k: k for k, v in pos.items()}
 
@@ -89,46 +123,58 @@ def process_network(net, extra_edges=100):
 def make_topic_network(
     topic_df: pd.DataFrame,
     covid_ids,
-    threshold: float = 0.1,
+    threshold: Union[float, list] = 0.1,
     resolution: float = 0.7,
     seed=None,
+    layout: str = "sparse",
 ):
     """Plots a topic network
     Args:
         topic_df: topic mix
-        threshold: threshold for considering that a topic is present in a corpus
+        threshold: threshold for considering that a topic is present in a corpus.
+            If it is a list, we build the networks for all thresholds in one go
+        layout: layout method (see `network_layout.get_layout`)
+    Returns:
+        processed network, node table and communities. If threshold is a list,
+            a lookup between each threshold and these outputs
     """
+    thresholds = threshold if isinstance(threshold, list) else [threshold]
 
-    net = make_network_from_doc_term_matrix(
-        topic_df.reset_index(drop=False), threshold=threshold, id_var="index"
+    nets = make_networks_from_doc_term_matrix(
+        topic_df.reset_index(drop=False), thresholds=thresholds, id_var="index"
     )
-    net2 = process_network(net, extra_edges=100)
+    covid_topic_df = topic_df.loc[topic_df.index.isin(covid_ids)]
 
-    covid_topics = (
-        topic_df.loc[topic_df.index.isin(covid_ids)]
-        .applymap(lambda x: x > threshold)
-        .sum()
-    )
+    outputs = {}
 
-    keep_topics = covid_topics.loc[covid_topics > 1].index.tolist()
-    covid_size_dict = covid_topics.loc[keep_topics].to_dict()
+    for thres, net in nets.items():
+        net2 = process_network(net, extra_edges=100, layout=layout)
 
-    if seed is None:
-        comms = community_louvain.best_partition(net2[1], resolution=resolution)
-    else:
-        comms = community_louvain.best_partition(
-            net2[1], resolution=resolution, random_state=seed
-        )
+        covid_topics = (covid_topic_df > thres).sum()
 
-    node_df = (
-        pd.DataFrame(net2[0])
-        .T.reset_index(drop=False)
-        .rename(columns={0: "x", 1: "y", "index": "node"})
-        .assign(size=lambda df: df["node"].map(covid_size_dict))
-        .assign(node_name=lambda df: df["node"])
-    )
+        keep_topics = covid_topics.loc[covid_topics > 1].index.tolist()
+        covid_size_dict = covid_topics.loc[keep_topics].to_dict()
 
-    return net2, node_df, comms
+        if seed is None:
+            comms = community_louvain.best_partition(net2[1], resolution=resolution)
+        else:
+            comms = community_louvain.best_partition(
+                net2[1], resolution=resolution, random_state=seed
+            )
+
+        node_df = (
+            pd.DataFrame(net2[0])
+            .T.reset_index(drop=False)
+            .rename(columns={0: "x", 1: "y", "index": "node"})
+            .assign(size=lambda df: df["node"].map(covid_size_dict))
+            .assign(node_name=lambda df: df["node"])
+        )
+        outputs[thres] = (net2, node_df, comms)
+
+    if isinstance(threshold, list):
+        return outputs
+    else:
+        return outputs[threshold]
 
 
 def plot_topic_network(network, node_df):
@@ -0,0 +1,113 @@
+# Utilities to represent organisations in the vector space of their projects
+
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from eurito_indicators.utils.instrumentation import instrument
+
+
+def make_org_project_matrix(
+    orgs: pd.DataFrame,
+    project_ids: pd.Index,
+    org_vars: list = ["id", "name"],
+    weight_var: str = None,
+) -> tuple:
+    """Creates a sparse organisation - project incidence matrix
+    Args:
+        orgs: organisation - project table
+        project_ids: projects in the matrix columns (other projects are ignored)
+        org_vars: variables that identify an organisation
+        weight_var: variable to weight participations (e.g. ec_contribution).
+            If None all participations have the same weight
+    Returns:
+        A sparse matrix and a table with the organisations in its rows
+    """
+    project_codes = pd.Index(project_ids).get_indexer(orgs["project_id"])
+    orgs_in = orgs.loc[project_codes >= 0]
+
+    org_codes = orgs_in.groupby(org_vars, sort=True, dropna=False).ngroup().to_numpy()
+    org_table = orgs_in[org_vars].drop_duplicates().sort_values(org_vars)
+
+    if weight_var is None:
+        weights = np.ones(len(orgs_in))
+    else:
+        weights = (
+            pd.to_numeric(
+                orgs_in[weight_var].astype(str).str.replace(",", "."), errors="coerce"
+            )
+            .fillna(0)
+            .to_numpy()
+        )
+
+    incidence = sparse.csr_matrix(
+        (weights, (org_codes, project_codes[project_codes >= 0])),
+        shape=(len(org_table), len(project_ids)),
+    )
+
+    return incidence, org_table
+
+
+@instrument()
+def make_org_signatures(
+    orgs: pd.DataFrame,
+    doc_vectors: pd.DataFrame,
+    projects: pd.DataFrame = None,
+    start_date: str = None,
+    end_date: str = None,
+    exclude_ids: set = None,
+    org_vars: list = ["id", "name"],
+    weight_var: str = None,
+) -> pd.DataFrame:
+    """Calculates organisation signatures as the (weighted) mean of the
+    vectors of the projects they participate in
+    Args:
+        orgs: organisation - project table
+        doc_vectors: project vectors (indexed by project id)
+        projects: project table with start dates, needed for time windows
+        start_date: only use projects starting after this date
+        end_date: only use projects starting before this date
+        exclude_ids: project ids to ignore
+        org_vars: variables that identify an organisation
+        weight_var: variable to weight participations (e.g. ec_contribution)
+    Returns:
+        A table with a signature vector per organisation
+    """
+    project_ids = doc_vectors.index
+
+    if (start_date is not None) or (end_date is not None):
+        if projects is None:
+            raise ValueError("A projects table is needed to filter by start date")
+        window = projects
+        if start_date is not None:
+            window = window.query(f"start_date>'{start_date}'")
+        if end_date is not None:
+            window = window.query(f"start_date<'{end_date}'")
+        project_ids = project_ids[project_ids.isin(set(window["project_id"]))]
+
+    if exclude_ids is not None:
+        project_ids = project_ids[~project_ids.isin(exclude_ids)]
+
+    logging.info("Making organisation - project matrix")
+    incidence, org_table = make_org_project_matrix(
+        orgs, project_ids, org_vars=org_vars, weight_var=weight_var
+    )
+
+    totals = np.asarray(incidence.sum(axis=1)).ravel()
+    has_projects = totals > 0
+
+    logging.info("Calculating organisation signatures")
+    norm_incidence = sparse.diags(1 / totals[has_projects]) @ incidence[has_projects]
+    signatures = norm_incidence @ doc_vectors.loc[project_ids].to_numpy()
+
+    return pd.DataFrame(
+        signatures,
+        index=(
+            pd.MultiIndex.from_frame(org_table.loc[has_projects])
+            if len(org_vars) > 1
+            else pd.Index(org_table.loc[has_projects, org_vars[0]])
+        ),
+        columns=doc_vectors.columns,
+    )
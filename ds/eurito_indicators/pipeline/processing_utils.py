@@ -7,14 +7,13 @@ import numpy as np
 import pandas as pd
 
 from eurito_indicators import config, PROJECT_DIR
+from eurito_indicators.getters.reference_data import get_iso_country_lookup
+from eurito_indicators.utils.instrumentation import instrument
 
 covid_names = config["covid_names"]
 
 MOD_PATH = f"{PROJECT_DIR}/outputs/models"
 
-if os.path.exists(MOD_PATH) is False:
-    os.makedirs(MOD_PATH, exist_ok=True)
-
 
 def covid_getter(text: str, covid_terms: list = covid_names) -> bool:
     """Check if a string contains a covid related term
@@ -33,18 +32,7 @@ def make_iso_country_lookup() -> dict:
     Takes into account that some EU ISO country names are different from the standard.
     """
 
-    country_names = (
-        pd.read_csv(
-            "https://raw.githubusercontent.com/lukes/ISO-3166-Countries-with-Regional-Codes/master/all/all.csv"
-        )
-        .set_index("alpha-2")["name"]
-        .to_dict()
-    )
-
-    country_names["EL"] = "Greece"
-    country_names["UK"] = "United Kingdom"
-
-    return country_names
+    return get_iso_country_lookup()
 
 
 def get_top_countries(docs, reg_var="coordinator_country", top_n=15):
@@ -94,6 +82,7 @@ def filter_by_length(corpus, text_var, min_length=300):
     return filtered
 
 
+@instrument()
 def make_lq(table: pd.DataFrame) -> pd.DataFrame:
     """Calculate LQ for a category X in  population of categories Y
     Args:
@@ -106,6 +95,7 @@ def make_lq(table: pd.DataFrame) -> pd.DataFrame:
 
 
 def save_model(model, name):
+    os.makedirs(MOD_PATH, exist_ok=True)
     with open(f"{MOD_PATH}/{name}.p", "wb") as outfile:
         pickle.dump(model, outfile)
 
@@ -2,7 +2,6 @@ import joblib
 
 from eurito_indicators import PROJECT_DIR
 from metaflow import FlowSpec, step, Parameter
-from sentence_transformers import SentenceTransformer
 
 from eurito_indicators.getters.sdg import load_annotated
 from eurito_indicators.pipeline.sdg.classifier import make_sdg_pipeline
@@ -37,6 +36,8 @@ class SDGClassifierTrainFlow(FlowSpec):
     @step
     def train_sdg_model(self):
         """Encodes training data and fits models."""
+        from sentence_transformers import SentenceTransformer
+
         self.sdg = self.input
         data = load_annotated(self.sdg)
 
@@ -3,18 +3,32 @@
 import logging
 import re
 import string
+from functools import lru_cache
 from itertools import chain
 
 import pandas as pd
-from gensim.models import Phrases
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
 
-stem = WordNetLemmatizer()
-STOP = set(stopwords.words("english"))
+from eurito_indicators.utils.instrumentation import instrument
+
 BAD = set([x for x in string.punctuation + string.digits if x != "-"])
 
 
+@lru_cache()
+def get_stopwords() -> frozenset:
+    """English stopwords (the NLTK corpus is loaded on first use)"""
+    from nltk.corpus import stopwords
+
+    return frozenset(stopwords.words("english"))
+
+
+@lru_cache()
+def get_lemmatizer():
+    """WordNet lemmatizer (WordNet is loaded on first use)"""
+    from nltk.stem import WordNetLemmatizer
+
+    return WordNetLemmatizer()
+
+
 def pre_process(text, count=None, decs=1e4):
     """Removes stopwords and symbols and lemmatises"""
 
@@ -22,15 +36,19 @@ def pre_process(text, count=None, decs=1e4):
         if count % decs == 0:
             logging.info(count)
 
+    stop, stem = get_stopwords(), get_lemmatizer()
+
     lowercase = re.sub("\n", " ", text.lower())
     no_numbers_symbols = "".join([x for x in lowercase if x not in BAD])
-    tokenised = [x for x in no_numbers_symbols.split(" ") if x not in STOP]
+    tokenised = [x for x in no_numbers_symbols.split(" ") if x not in stop]
     lemmatised = [stem.lemmatize(x) for x in tokenised if len(x) > 2]
     return lemmatised
 
 
 def make_engram(corpus, n=3):
     """Makes engrams up to a desired level"""
+    from gensim.models import Phrases
+
     c = 2
     while c <= n:
         ngrammed = Phrases(corpus, min_count=3, threshold=100)
@@ -63,6 +81,7 @@ def remove_extr_freq(corpus, high=0.999, low=5):
     return corpus_filt
 
 
+@instrument()
 def text_pipeline(corpus, engram_max=3, high_freq=0.999):
     """Preprocesses, engrams and filters corpus"""
 
@@ -3,10 +3,6 @@ import logging
 
 import numpy as np
 import pandas as pd
-import statsmodels.api as sm
-import statsmodels.formula.api as smf
-import tomotopy as tp
-from statsmodels.regression.linear_model import OLS
 
 def get_topic_words(topic, top_words=5):
     """Extracts main words for a topic"""
@@ -39,6 +35,9 @@ def topic_regression(topic_mix, cat_vector, ref_class, log=True):
     predictors. Equivalent to a comparison of means between a category and the
     reference class
     """
+    import statsmodels.api as sm
+    import statsmodels.formula.api as smf
+    from statsmodels.regression.linear_model import OLS
 
     results = []
 
@@ -84,6 +83,8 @@ def topic_regression(topic_mix, cat_vector, ref_class, log=True):
 
 def train_topic_model(k, texts, ids):
     """Train topic model while grid searching"""
+    import tomotopy as tp
+
     logging.info(f"training model with {k} topics")
 
     mdl = tp.LDAModel(k=k)
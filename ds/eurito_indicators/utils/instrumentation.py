@@ -0,0 +1,299 @@
+# Per-stage timing and memory instrumentation for pipeline scripts.
+# Off by default: set EURITO_INSTRUMENT=1 (or call `enable`) to record the wall
+# time, CPU time, peak RSS and rows in / out of every instrumented stage in a
+# JSON run report, and EURITO_PROFILE_SECONDS to dump a cProfile of the stages
+# slower than that
+
+import atexit
+import cProfile
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+from eurito_indicators import PROJECT_DIR
+
+RUNS_PATH = f"{PROJECT_DIR}/outputs/runs"
+
+# ru_maxrss is in kilobytes in linux and in bytes in macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+# Seconds between the RSS samples of the open stages
+RSS_SAMPLE_SECONDS = float(os.environ.get("EURITO_RSS_SAMPLE_SECONDS", 0.01))
+
+_state = {
+    "enabled": os.environ.get("EURITO_INSTRUMENT", "0") not in ("", "0"),
+    "profile_seconds": (
+        float(os.environ["EURITO_PROFILE_SECONDS"])
+        if "EURITO_PROFILE_SECONDS" in os.environ
+        else None
+    ),
+    "report_path": os.environ.get("EURITO_INSTRUMENT_REPORT"),
+    "records": [],
+    # Open stages, innermost last
+    "stack": [],
+    "profiler": None,
+    "run": None,
+    "peak": 0,
+    "sampler": None,
+}
+# Guards the peaks of the open stages, which the sampler thread updates
+_lock = threading.Lock()
+
+
+def enable(report_path: str = None, profile_seconds: float = None):
+    """Turns instrumentation on for this process
+
+    Args:
+        report_path: path for the JSON run report (in outputs/runs if None)
+        profile_seconds: dump a cProfile of stages slower than this
+            (no profiling if None)
+    """
+
+    _state["enabled"] = True
+    _state["report_path"] = report_path or _state["report_path"]
+    _state["profile_seconds"] = profile_seconds
+
+
+def is_enabled() -> bool:
+    return _state["enabled"]
+
+
+def _read_proc_status(field: str) -> float:
+    """Reads a memory field (in MB) from /proc/self/status (None if unavailable)"""
+
+    try:
+        with open("/proc/self/status", "r") as infile:
+            for line in infile:
+                if line.startswith(field):
+                    return int(line.split()[1]) * 1024 / 1e6
+    except OSError:
+        return None
+
+
+def _current_rss() -> float:
+    """Resident memory (MB), falling back to the peak where /proc is missing"""
+
+    rss = _read_proc_status("VmRSS:")
+    return rss if rss is not None else _peak_rss()
+
+
+def _peak_rss() -> float:
+    """Peak resident memory of the process (MB)"""
+
+    hwm = _read_proc_status("VmHWM:")
+    if hwm is not None:
+        return hwm
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT / 1e6
+
+
+def _sample_rss():
+    """Raises the peaks of the open stages to the current RSS, every
+    RSS_SAMPLE_SECONDS. The process peak (VmHWM) can't tell us the peak of a
+    stage unless we reset it, which would also reset it for anyone else reading
+    it (e.g. a benchmark harness), so we sample instead. Peaks shorter than the
+    interval can be missed
+    """
+
+    while True:
+        time.sleep(RSS_SAMPLE_SECONDS)
+        if _state["stack"]:
+            rss = _current_rss()
+            with _lock:
+                for record in _state["stack"]:
+                    record["_peak"] = max(record["_peak"], rss)
+
+
+def _start_sampler():
+    """Starts the RSS sampler thread (once per process)"""
+
+    if _state["sampler"] is None:
+        _state["sampler"] = threading.Thread(target=_sample_rss, daemon=True)
+        _state["sampler"].start()
+
+
+def count_rows(obj):
+    """Number of rows of a table-like object (the first of a tuple), or None"""
+
+    if isinstance(obj, tuple) and len(obj) > 0:
+        obj = obj[0]
+
+    shape = getattr(obj, "shape", None)
+    if shape:
+        return int(shape[0])
+    if isinstance(obj, (list, dict, set)):
+        return len(obj)
+
+    return None
+
+
+class _NullRecord(dict):
+    """Record of a stage when instrumentation is off (ignores updates)"""
+
+    def __setitem__(self, key, value):
+        pass
+
+
+@contextmanager
+def stage(name: str, rows_in: int = None):
+    """Instruments a block of code as a pipeline stage
+
+    Args:
+        name: stage name
+        rows_in: number of rows the stage reads
+
+    Yields:
+        The record of the stage, where the block can set "rows_out"
+    """
+
+    if _state["enabled"] is False:
+        yield _NullRecord()
+        return
+
+    stack = _state["stack"]
+    record = {
+        "stage": name,
+        "parent": stack[-1]["stage"] if stack else None,
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "rows_in": rows_in,
+        "rows_out": None,
+    }
+    # The sampler raises the peak of every open stage, so open stages include
+    # the peaks of the stages they contain
+    _start_sampler()
+    rss_start = _current_rss()
+    record["_peak"] = rss_start
+
+    # Profilers can't be nested: only the outermost open stage is profiled
+    profiler = None
+    if (_state["profile_seconds"] is not None) and (_state["profiler"] is None):
+        profiler = _state["profiler"] = cProfile.Profile()
+        profiler.enable()
+
+    with _lock:
+        stack.append(record)
+    start, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        seconds = time.perf_counter() - start
+        cpu_seconds = time.process_time() - start_cpu
+        rss_end = _current_rss()
+        with _lock:
+            stack.pop()
+            stage_peak = max(record.pop("_peak"), rss_end)
+
+        if profiler is not None:
+            profiler.disable()
+            _state["profiler"] = None
+
+        _state["peak"] = max(_state["peak"], stage_peak)
+
+        record.update(
+            seconds=round(seconds, 4),
+            cpu_seconds=round(cpu_seconds, 4),
+            rss_start_mb=round(rss_start, 1),
+            peak_rss_delta_mb=round(max(stage_peak - rss_start, 0), 1),
+        )
+
+        if (profiler is not None) and (seconds > _state["profile_seconds"]):
+            record["profile"] = _dump_profile(profiler, name)
+
+        _state["records"].append(record)
+        logging.info(
+            f"{name}: {seconds:.2f}s, {cpu_seconds:.2f}s CPU, "
+            f"+{record['peak_rss_delta_mb']}MB peak RSS"
+        )
+
+
+def instrument(name: str = None):
+    """Decorator that instruments a function as a pipeline stage. Rows in are
+    counted on the first argument and rows out on the returned value
+
+    Args:
+        name: stage name (the function's qualified name if None)
+    """
+
+    def decorator(func):
+        stage_name = name or f"{func.__module__.split('.')[-1]}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _state["enabled"] is False:
+                return func(*args, **kwargs)
+
+            with stage(stage_name, count_rows(args[0]) if args else None) as rec:
+                result = func(*args, **kwargs)
+                rec["rows_out"] = count_rows(result)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _run_name() -> str:
+    """Name of this run: the script name and the time of the first call"""
+
+    if _state["run"] is None:
+        script = (
+            os.path.splitext(os.path.basename((sys.argv or [""])[0]))[0] or "python"
+        )
+        _state["run"] = f"{script}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+    return _state["run"]
+
+
+def _dump_profile(profiler: cProfile.Profile, name: str) -> str:
+    """Saves the stats of a profiled stage and returns their path"""
+
+    os.makedirs(RUNS_PATH, exist_ok=True)
+    path = f"{RUNS_PATH}/{_run_name()}_{name}.prof"
+    profiler.dump_stats(path)
+
+    return path
+
+
+def run_report() -> dict:
+    """The records of the stages run so far in this process"""
+
+    return {
+        "run": _run_name(),
+        "argv": sys.argv,
+        "peak_rss_mb": round(max(_state["peak"], _peak_rss()), 1),
+        "stages": list(_state["records"]),
+    }
+
+
+def save_run_report(path: str = None) -> str:
+    """Saves the run report as JSON
+
+    Args:
+        path: report path (EURITO_INSTRUMENT_REPORT or outputs/runs if None)
+
+    Returns:
+        The path of the report
+    """
+
+    report = run_report()
+    path = path or _state["report_path"] or f"{RUNS_PATH}/{report['run']}.json"
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as outfile:
+        json.dump(report, outfile, indent=2)
+    logging.info(f"Saved run report in {path}")
+
+    return path
+
+
+@atexit.register
+def _save_at_exit():
+    if _state["enabled"] and _state["records"]:
+        save_run_report()